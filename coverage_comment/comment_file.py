@@ -2,6 +2,14 @@ from __future__ import annotations
 
 import pathlib
 
+MARKER = (
+    """<!-- This comment was produced by python-coverage-comment-action{id_part} -->"""
+)
+
+
+def get_marker(marker_id: str | None):
+    return MARKER.format(id_part=f" (id: {marker_id})" if marker_id else "")
+
 
 def store_file(filename: pathlib.Path, content: str):
     filename.write_text(content)
@@ -1,16 +1,54 @@
 from __future__ import annotations
 
+import collections
+import concurrent.futures
+import contextlib
 import dataclasses
 import datetime
 import decimal
+import hashlib
+import os
 import pathlib
-from collections.abc import Sequence
-from typing import Any
+import shutil
+import sqlite3
+import tempfile
+from collections.abc import Callable, Collection, Generator, Iterable, Sequence
+from typing import Any, Self
 
-from coverage_comment import subprocess
+from coverage import __version__ as coverage_version
+from coverage import control, exceptions, numbits, results, sqldata
+
+from coverage_comment import log, subprocess, tracing
 
 from . import json
 
+# Below this number of data files per worker, starting more `coverage combine`
+# processes costs more than it saves.
+MIN_FILES_PER_COMBINE_WORKER = 16
+
+# Below this number of measured files per worker, starting more worker
+# processes costs more than it saves.
+MIN_FILES_PER_ANALYSIS_WORKER = 50
+
+# Bump when changing the format of the combine cache
+COMBINE_CACHE_VERSION = 1
+COMBINE_CACHE_DIR = ".coverage-combine-cache"
+# Name under which the cached combined data is put back among the data files
+# to combine
+COMBINE_CACHE_DATA_FILE = ".coverage.combine-cache"
+# Files that may hold the coverage configuration, which affects combining
+# (e.g. the [paths] setting)
+COVERAGE_CONFIG_FILES = [".coveragerc", "setup.cfg", "tox.ini", "pyproject.toml"]
+
+# Bytes of the per-file fingerprints stored in the data file
+FINGERPRINT_SIZE = 8
+# Above this share of files to analyse, incremental analysis isn't worth it
+MAX_INCREMENTAL_ANALYSIS_RATIO = 0.5
+
+
+# Whether to fully build the coverage of a file, given its path and summary
+type FileFilter = Callable[[pathlib.Path, CoverageInfo], bool]
+
 
 # The dataclasses in this module are accessible in the template, which is overridable by the user.
 # As a coutesy, we should do our best to keep the existing fields for backward compatibility,
@@ -47,6 +85,15 @@ class CoverageInfo:
     missing_branches: int = 0
 
 
+# The fields of a "summary" (or "totals") key that we read, in the order of
+# the summary rows
+SUMMARY_FIELDS = [
+    field.name
+    for field in dataclasses.fields(CoverageInfo)
+    if field.name != "percent_covered"
+]
+
+
 @dataclasses.dataclass(kw_only=True)
 class FileCoverage:
     path: pathlib.Path
@@ -63,6 +110,17 @@ class Coverage:
     meta: CoverageMetadata
     info: CoverageInfo
     files: dict[pathlib.Path, FileCoverage]
+    # Files for which only the summary is known, and that are not in `files`:
+    # in diff-only mode, the files that are irrelevant to the pull request,
+    # and all the files of a coverage read from the summary index.
+    file_summaries: dict[pathlib.Path, CoverageInfo] = dataclasses.field(
+        default_factory=dict
+    )
+
+    def get_file_info(self, path: pathlib.Path) -> CoverageInfo | None:
+        if file := self.files.get(path):
+            return file.info
+        return self.file_summaries.get(path)
 
 
 # The format for Diff Coverage objects may seem a little weird, because it
@@ -97,6 +155,32 @@ class DiffCoverage:
     files: dict[pathlib.Path, FileDiffCoverage]
 
 
+@dataclasses.dataclass(kw_only=True)
+class Fingerprints:
+    """
+    If a file has the same fingerprint in 2 runs (and the environment
+    fingerprint is the same), then its coverage report is the same: the
+    fingerprint covers the source of the file and its measured lines (or
+    arcs).
+    """
+
+    # Covers the coverage version & configuration, branch coverage and
+    # the coverage path
+    environment: str
+    # Path, as in the coverage report => fingerprint
+    files: dict[str, str]
+
+    def as_json(self) -> dict[str, Any]:
+        return dataclasses.asdict(self)
+
+    @classmethod
+    def from_json(cls, data: Any) -> Self | None:
+        try:
+            return cls(environment=data["environment"], files=dict(data["files"]))
+        except (TypeError, KeyError, ValueError):
+            return None
+
+
 def compute_coverage(
     num_covered: int,
     num_total: int,
@@ -111,33 +195,601 @@ def compute_coverage(
     return numerator / denominator
 
 
+def list_data_files(coverage_path: pathlib.Path) -> list[str]:
+    """
+    Names of the data files that `coverage combine` would combine.
+    """
+    return sorted(
+        path.name
+        for path in coverage_path.glob(".coverage.*")
+        # Same as coverage: SQLite may leave journal files around
+        if not path.name.endswith("-journal")
+    )
+
+
+def combine(coverage_path: pathlib.Path, workers: int | None = None) -> None:
+    """
+    Same as `coverage combine`. When there are many data files, they're split
+    in one chunk per worker, and each chunk is combined by its own `coverage
+    combine` process into a partial data file. A final `coverage combine`
+    then merges the partial files.
+
+    This is a single level of chunks rather than a tree of pairwise merges:
+    the final merge only has a handful of partial files, and each extra
+    level would cost another round of process startups. On a single CPU, the
+    chunks would only compete for it and the final merge is pure overhead, so
+    the files are combined in one go.
+    """
+    workers = workers or os.process_cpu_count() or 1
+    data_files = list_data_files(coverage_path=coverage_path)
+    num_chunks = min(workers, len(data_files) // MIN_FILES_PER_COMBINE_WORKER)
+    if num_chunks < 2 or os.cpu_count() == 1:
+        subprocess.run("coverage", "combine", path=coverage_path)
+        return
+
+    log.info(f"Combining {len(data_files)} coverage files with {num_chunks} workers")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        partials = [
+            str(pathlib.Path(tmp_dir) / f".coverage.partial-{i}")
+            for i in range(num_chunks)
+        ]
+
+        def combine_chunk(partial: str, chunk: list[str]) -> str:
+            return subprocess.run(
+                "coverage",
+                "combine",
+                f"--data-file={partial}",
+                *chunk,
+                path=coverage_path,
+            )
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=num_chunks) as executor:
+            # Consuming the results re-raises the errors, if any
+            list(
+                executor.map(
+                    combine_chunk,
+                    partials,
+                    [data_files[i::num_chunks] for i in range(num_chunks)],
+                )
+            )
+
+        subprocess.run("coverage", "combine", *partials, path=coverage_path)
+
+
+def combine_with_cache(coverage_path: pathlib.Path, workers: int | None = None) -> None:
+    """
+    Same as `combine`, but keeps a copy of the combined data in
+    COMBINE_CACHE_DIR, along with the hashes of the data files it holds. If
+    the cache directory is still there on the next run (e.g. when re-running
+    a failed job), only the new data files are combined with the cached data.
+
+    The cache is discarded if any of the data files it holds has disappeared
+    or changed, if the coverage configuration changed, or if the cached data
+    doesn't use the database schema of the installed coverage.
+    """
+    cache_dir = coverage_path / COMBINE_CACHE_DIR
+    hashes = {
+        name: hash_file(coverage_path / name)
+        for name in list_data_files(coverage_path=coverage_path)
+    }
+    config_hash = hash_coverage_config(coverage_path=coverage_path)
+    cached = read_combine_cache(cache_dir=cache_dir, config_hash=config_hash)
+
+    if cached is None:
+        log.info("No usable cache of combined coverage data")
+    elif not cached <= set(hashes.values()):
+        log.info("Coverage data files have changed since they were cached")
+    else:
+        new_files = [name for name, digest in hashes.items() if digest not in cached]
+        log.info(
+            "Reusing cached combined coverage data, "
+            f"combining {len(new_files)} new coverage files"
+        )
+        for name in set(hashes) - set(new_files):
+            (coverage_path / name).unlink()
+        shutil.copyfile(
+            cache_dir / ".coverage", coverage_path / COMBINE_CACHE_DATA_FILE
+        )
+
+    combine(coverage_path=coverage_path, workers=workers)
+
+    data_file = coverage_path / ".coverage"
+    # If data files are named differently in the coverage configuration, we
+    # cannot know what to cache.
+    if hashes and data_file.exists():
+        write_combine_cache(
+            cache_dir=cache_dir,
+            data_file=data_file,
+            hashes=set(hashes.values()),
+            config_hash=config_hash,
+        )
+
+
+def hash_file(path: pathlib.Path) -> str:
+    with path.open("rb") as file:
+        return hashlib.file_digest(file, "sha256").hexdigest()
+
+
+def hash_coverage_config(coverage_path: pathlib.Path) -> str:
+    digest = hashlib.sha256()
+    for name in COVERAGE_CONFIG_FILES:
+        path = coverage_path / name
+        if path.exists():
+            digest.update(f"{name}\0".encode())
+            digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def read_schema_version(path: pathlib.Path) -> int | None:
+    try:
+        with contextlib.closing(
+            sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True)
+        ) as connection:
+            row = connection.execute("select version from coverage_schema").fetchone()
+    except sqlite3.Error:
+        return None
+    return row[0] if row else None
+
+
+def read_combine_cache(cache_dir: pathlib.Path, config_hash: str) -> set[str] | None:
+    """
+    Return the hashes of the data files held in the cache, or None if the
+    cache cannot be used.
+    """
+    try:
+        manifest = json.loads_dict((cache_dir / "manifest.json").read_text())
+    except (OSError, json.JSONDecodeError, json.UnexpectedType):
+        return None
+
+    data_files = manifest.get("data_files")
+    if (
+        manifest.get("version") != COMBINE_CACHE_VERSION
+        or manifest.get("config_hash") != config_hash
+        or not isinstance(data_files, list)
+        or read_schema_version(cache_dir / ".coverage") != sqldata.SCHEMA_VERSION
+    ):
+        return None
+
+    return {str(hash) for hash in data_files}
+
+
+def write_combine_cache(
+    cache_dir: pathlib.Path,
+    data_file: pathlib.Path,
+    hashes: set[str],
+    config_hash: str,
+) -> None:
+    cache_dir.mkdir(exist_ok=True)
+    manifest_path = cache_dir / "manifest.json"
+    # If we're interrupted after this, the cache is just discarded next time
+    manifest_path.unlink(missing_ok=True)
+    shutil.copyfile(data_file, cache_dir / ".coverage")
+    manifest: json.Json = {
+        "version": COMBINE_CACHE_VERSION,
+        "config_hash": config_hash,
+        "data_files": [hash for hash in sorted(hashes)],
+    }
+    manifest_path.write_text(json.dumps(manifest))
+
+
+@tracing.span("coverage combine")
+def merge_coverage_files(
+    coverage_path: pathlib.Path, workers: int | None = None, cache: bool = False
+) -> None:
+    if cache:
+        combine_with_cache(coverage_path=coverage_path, workers=workers)
+    else:
+        combine(coverage_path=coverage_path, workers=workers)
+
+
+RELATIVE_FILES_NOTE = (
+    "Cannot read .coverage files because files are absolute. You need "
+    "to configure coverage to write relative paths by adding the following "
+    "option to your coverage configuration file:\n"
+    "[run]\n"
+    "relative_files = true\n\n"
+    "Note that the specific format can be slightly different if you're using "
+    "setup.cfg or pyproject.toml. See details in: "
+    "https://coverage.readthedocs.io/en/latest/config.html#config-run-relative-files"
+)
+
+
+@contextlib.contextmanager
+def explain_coverage_errors() -> Generator[None]:
+    try:
+        yield
+    except subprocess.SubProcessError as exc:
+        if "No source for code:" in exc.stderr:
+            exc.add_note(RELATIVE_FILES_NOTE)
+        raise
+    except exceptions.NoSource as exc:
+        # Raised by the analysis workers
+        exc.add_note(RELATIVE_FILES_NOTE)
+        raise
+
+
 def get_coverage_info(
-    merge: bool, coverage_path: pathlib.Path
+    merge: bool,
+    coverage_path: pathlib.Path,
+    merge_workers: int | None = None,
+    merge_cache: bool = False,
+    analysis_workers: int | None = None,
 ) -> tuple[dict[str, Any], Coverage]:
-    try:
+    with explain_coverage_errors():
         if merge:
-            subprocess.run("coverage", "combine", path=coverage_path)
+            merge_coverage_files(
+                coverage_path=coverage_path, workers=merge_workers, cache=merge_cache
+            )
+
+        json_coverage = generate_json_report(
+            coverage_path=coverage_path, workers=analysis_workers
+        )
+
+    return json_coverage, extract_info(data=json_coverage, coverage_path=coverage_path)
 
-        json_coverage = json.loads_dict(
+
+@tracing.span("coverage json")
+def generate_json_report(
+    coverage_path: pathlib.Path, workers: int | None = None
+) -> dict[str, Any]:
+    """
+    Same as `coverage json`. When there are many measured files, they're split
+    in chunks that are analysed in parallel (one worker process per chunk),
+    and the partial reports are then merged together.
+    """
+    chunks = get_analysis_chunks(coverage_path=coverage_path, workers=workers)
+    if not chunks:
+        return json.loads_dict(
             subprocess.run("coverage", "json", "-o", "-", path=coverage_path)
         )
-    except subprocess.SubProcessError as exc:
-        if "No source for code:" in exc.stderr:
-            exc.add_note(
-                "Cannot read .coverage files because files are absolute. You need "
-                "to configure coverage to write relative paths by adding the following "
-                "option to your coverage configuration file:\n"
-                "[run]\n"
-                "relative_files = true\n\n"
-                "Note that the specific format can be slightly different if you're using "
-                "setup.cfg or pyproject.toml. See details in: "
-                "https://coverage.readthedocs.io/en/latest/config.html#config-run-relative-files"
+    return analyse_in_parallel(coverage_path=coverage_path, chunks=chunks)
+
+
+@tracing.span("coverage report")
+def get_coverage(
+    coverage_path: pathlib.Path,
+    workers: int | None = None,
+    keep_file: FileFilter | None = None,
+    repository_path: pathlib.Path | None = None,
+) -> Coverage:
+    """
+    Same as `get_coverage_info` without merging, when the raw JSON report is
+    not needed: the report is read while coverage writes it, and each file's
+    coverage is built as soon as it's read, so the whole report is never in
+    memory.
+
+    If `keep_file` is given, only the files it accepts are fully built, the
+    others only get a summary (see `Coverage.file_summaries`).
+
+    The paths of the files start with `repository_path`, the coverage path
+    relative to the root of the repository, if it's not `coverage_path`
+    (see `settings.Config.REPOSITORY_COVERAGE_PATH`).
+    """
+    repository_path = repository_path or coverage_path
+    with explain_coverage_errors():
+        chunks = get_analysis_chunks(coverage_path=coverage_path, workers=workers)
+        if chunks:
+            return extract_info(
+                data=analyse_in_parallel(coverage_path=coverage_path, chunks=chunks),
+                coverage_path=repository_path,
+                keep_file=keep_file,
             )
-        raise
 
-    return json_coverage, extract_info(data=json_coverage, coverage_path=coverage_path)
+        files: dict[pathlib.Path, FileCoverage] = {}
+        file_summaries: dict[pathlib.Path, CoverageInfo] = {}
+
+        def add_file(path: str, file_data: Any) -> None:
+            _add_file_coverage(
+                files=files,
+                file_summaries=file_summaries,
+                path=repository_path / path,
+                data=file_data,
+                keep_file=keep_file,
+            )
 
+        with subprocess.stream(
+            "coverage", "json", "-o", "-", path=coverage_path
+        ) as stdout:
+            data: dict[str, Any] = json.load_streamed_dict(
+                stream=stdout, callbacks={"files": add_file}
+            )
 
+    return Coverage(
+        meta=_make_coverage_metadata(data["meta"]),
+        info=_make_coverage_info(data["totals"]),
+        files=files,
+        file_summaries=file_summaries,
+    )
+
+
+def get_diff_only_filter(
+    added_lines: Collection[pathlib.Path], previous_coverage: Coverage | None
+) -> FileFilter:
+    """
+    Files that `template.select_files` may pick: the files in the diff, and
+    the files whose summary changed since the previous coverage.
+    """
+
+    def keep_file(path: pathlib.Path, info: CoverageInfo) -> bool:
+        if path in added_lines:
+            return True
+        previous_info = previous_coverage and previous_coverage.get_file_info(path)
+        return previous_info is not None and previous_info != info
+
+    return keep_file
+
+
+def get_analysis_chunks(
+    coverage_path: pathlib.Path, workers: int | None = None
+) -> list[list[str]]:
+    """
+    How to split the measured files between analysis workers. Empty if a
+    single `coverage json` process should analyse them all.
+    """
+    workers = workers or os.process_cpu_count() or 1
+    measured_files = list_measured_files(coverage_path=coverage_path)
+    num_chunks = min(workers, len(measured_files) // MIN_FILES_PER_ANALYSIS_WORKER)
+    if num_chunks < 2:
+        return []
+
+    log.info(f"Analysing {len(measured_files)} files with {num_chunks} workers")
+    return [measured_files[i::num_chunks] for i in range(num_chunks)]
+
+
+def analyse_in_parallel(
+    coverage_path: pathlib.Path, chunks: list[list[str]]
+) -> dict[str, Any]:
+    # Workers change directory and may be reused for another chunk: a relative
+    # path would then be resolved from the wrong place.
+    coverage_path = coverage_path.resolve()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=len(chunks)) as executor:
+        reports = list(
+            executor.map(analyse_files, [coverage_path] * len(chunks), chunks)
+        )
+
+    return merge_json_reports(reports=reports)
+
+
+def list_measured_files(coverage_path: pathlib.Path) -> list[str]:
+    """
+    Files in the data file, as stored by coverage. Empty if the data file is
+    not where we expect it (which disables the parallel analysis).
+    """
+    data_file = coverage_path / ".coverage"
+    if not data_file.exists():
+        return []
+    data = sqldata.CoverageData(basename=str(data_file))
+    data.read()
+    return sorted(data.measured_files())
+
+
+def analyse_files(coverage_path: pathlib.Path, morfs: list[str]) -> dict[str, Any]:
+    """
+    Runs in a worker process: the JSON report of some of the measured files.
+    Same as `coverage json`, with the same configuration (including the
+    include and omit settings), which is why we change directory.
+    """
+    os.chdir(coverage_path)
+    cov = control.Coverage()
+    cov.load()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        outfile = pathlib.Path(tmp_dir) / "coverage.json"
+        cov.json_report(morfs=morfs, outfile=str(outfile))
+        return json.loads_dict(outfile.read_text())
+
+
+def merge_json_reports(reports: Sequence[dict[str, Any]]) -> dict[str, Any]:
+    """
+    Merge the JSON reports of distinct sets of files. The totals are computed
+    from the summed counters, the same way `coverage json` does.
+    """
+    files = {
+        path: file_data
+        for report in reports
+        for path, file_data in report["files"].items()
+    }
+    counters = collections.Counter[str]()
+    for report in reports:
+        counters.update(
+            {
+                key: value
+                for key, value in report["totals"].items()
+                if isinstance(value, int) and not isinstance(value, bool)
+            }
+        )
+    # The precision of the percentages isn't in the report, but the display
+    # strings are formatted with it
+    first_totals = reports[0]["totals"]
+    _, _, decimals = first_totals["percent_covered_display"].partition(".")
+    nums = results.Numbers(
+        precision=len(decimals),
+        n_statements=counters["num_statements"],
+        n_excluded=counters["excluded_lines"],
+        n_missing=counters["missing_lines"],
+        n_branches=counters["num_branches"],
+        n_partial_branches=counters["num_partial_branches"],
+        n_missing_branches=counters["missing_branches"],
+    )
+    # Same as coverage's JsonReporter.make_summary and make_branch_summary
+    totals = {
+        "covered_lines": nums.n_executed,
+        "num_statements": nums.n_statements,
+        "percent_covered": nums.pc_covered,
+        "percent_covered_display": nums.pc_covered_str,
+        "missing_lines": nums.n_missing,
+        "excluded_lines": nums.n_excluded,
+        "percent_statements_covered": nums.pc_statements,
+        "percent_statements_covered_display": nums.pc_statements_str,
+        "num_branches": nums.n_branches,
+        "num_partial_branches": nums.n_partial_branches,
+        "covered_branches": nums.n_executed_branches,
+        "missing_branches": nums.n_missing_branches,
+        "percent_branches_covered": nums.pc_branches,
+        "percent_branches_covered_display": nums.pc_branches_str,
+    }
+    return {
+        "meta": reports[0]["meta"],
+        "files": dict(sorted(files.items())),
+        # Only the fields this version of coverage writes
+        "totals": {key: totals[key] for key in first_totals},
+    }
+
+
+def read_measured_data(
+    data_file: pathlib.Path,
+) -> tuple[bool, dict[str, set[int] | set[tuple[int, int]]]]:
+    """
+    Read a coverage data file directly (without coverage's analysis of the
+    source files, which is what takes time). Returns whether arcs were
+    measured, and the lines (or arcs) measured in each file, all contexts
+    together. Paths are as stored by coverage: absolute, unless coverage is
+    configured with `relative_files`.
+    """
+    uri = f"{data_file.resolve().as_uri()}?mode=ro"
+    with contextlib.closing(sqlite3.connect(uri, uri=True)) as connection:
+        paths: dict[int, str] = dict(connection.execute("select id, path from file"))
+        measured: dict[str, set[Any]] = {path: set() for path in paths.values()}
+        for file_id, bits in connection.execute(
+            "select file_id, numbits from line_bits"
+        ):
+            measured[paths[file_id]].update(numbits.numbits_to_nums(bits))
+        for file_id, from_line, to_line in connection.execute(
+            "select file_id, fromno, tono from arc"
+        ):
+            measured[paths[file_id]].add((from_line, to_line))
+        row = connection.execute(
+            "select value from meta where key = 'has_arcs'"
+        ).fetchone()
+
+    has_arcs = bool(row and int(row[0]))
+    return has_arcs, measured
+
+
+def get_report_path(path: str, coverage_path: pathlib.Path) -> str:
+    """
+    Path of a measured file, as it appears in coverage reports (relative to
+    the directory coverage runs from, if the file is below it).
+    """
+    file_path = pathlib.Path(path)
+    if file_path.is_absolute():
+        with contextlib.suppress(ValueError):
+            return str(file_path.relative_to(coverage_path.resolve()))
+    return path
+
+
+@tracing.span("fingerprints")
+def compute_fingerprints(
+    coverage_path: pathlib.Path, repository_path: pathlib.Path | None = None
+) -> Fingerprints | None:
+    """
+    Returns None if the fingerprints cannot be computed: the data file is not
+    where we expect it, or some sources are missing. `repository_path` is as
+    in `get_coverage`.
+    """
+    data_file = coverage_path / ".coverage"
+    if not data_file.exists():
+        return None
+
+    has_arcs, measured = read_measured_data(data_file=data_file)
+
+    environment = hashlib.sha256()
+    for value in [
+        coverage_version,
+        hash_coverage_config(coverage_path=coverage_path),
+        str(repository_path or coverage_path),
+        str(has_arcs),
+    ]:
+        environment.update(f"{value}\0".encode())
+
+    fingerprints: dict[str, str] = {}
+    for path, lines_or_arcs in measured.items():
+        report_path = get_report_path(path=path, coverage_path=coverage_path)
+        try:
+            source = (coverage_path / report_path).read_bytes()
+        except OSError:
+            return None
+        digest = hashlib.blake2b(source, digest_size=FINGERPRINT_SIZE)
+        digest.update(repr(sorted(lines_or_arcs)).encode())
+        fingerprints[report_path] = digest.hexdigest()
+
+    return Fingerprints(environment=environment.hexdigest(), files=fingerprints)
+
+
+@tracing.span("incremental analysis")
+def get_incremental_coverage_info(
+    coverage_path: pathlib.Path,
+    previous_coverage: Coverage,
+    previous_fingerprints: Fingerprints,
+    added_files: Collection[pathlib.Path],
+    repository_path: pathlib.Path | None = None,
+) -> Coverage | None:
+    """
+    Build the coverage by only analysing the files that may have a different
+    coverage report than in the previous run: the files in the diff, and the
+    files with a different fingerprint. The other files are taken from the
+    previous coverage. `repository_path` is as in `get_coverage`.
+
+    Returns None when this isn't possible, or not worth it (too many files
+    to analyse anyway).
+    """
+    repository_path = repository_path or coverage_path
+    fingerprints = compute_fingerprints(
+        coverage_path=coverage_path, repository_path=repository_path
+    )
+    if fingerprints is None:
+        log.info("Cannot compute fingerprints of coverage data, analysing all files")
+        return None
+    if fingerprints.environment != previous_fingerprints.environment:
+        log.info("Coverage version or configuration changed, analysing all files")
+        return None
+
+    to_analyse = {
+        path
+        for path, fingerprint in fingerprints.files.items()
+        if previous_fingerprints.files.get(path) != fingerprint
+        or repository_path / path in added_files
+    }
+    if len(to_analyse) > len(fingerprints.files) * MAX_INCREMENTAL_ANALYSIS_RATIO:
+        log.info(f"{len(to_analyse)} files changed, analysing all files")
+        return None
+
+    log.info(
+        f"Analysing {len(to_analyse)} changed files out of {len(fingerprints.files)}"
+    )
+    files = {
+        repository_path / path: previous_coverage.files[repository_path / path]
+        for path in fingerprints.files
+        if path not in to_analyse and repository_path / path in previous_coverage.files
+    }
+    meta = dataclasses.replace(
+        previous_coverage.meta, timestamp=datetime.datetime.now()
+    )
+    if to_analyse:
+        # The files are passed to coverage's API rather than on the command
+        # line, which couldn't hold thousands of paths
+        with explain_coverage_errors():
+            data = analyse_in_parallel(
+                coverage_path=coverage_path, chunks=[sorted(to_analyse)]
+            )
+        partial_coverage = extract_info(data=data, coverage_path=repository_path)
+        files.update(partial_coverage.files)
+        meta = partial_coverage.meta
+
+    return Coverage(
+        meta=meta,
+        info=sum_coverage_info(file.info for file in files.values()),
+        files=dict(sorted(files.items())),
+    )
+
+
+def sum_coverage_info(infos: Iterable[CoverageInfo]) -> CoverageInfo:
+    totals = collections.Counter[str]()
+    for info in infos:
+        totals.update({field: getattr(info, field) for field in SUMMARY_FIELDS})
+    return _make_coverage_info({field: totals[field] for field in SUMMARY_FIELDS})
+
+
+@tracing.span("coverage html")
 def generate_coverage_html_files(
     destination: pathlib.Path, coverage_path: pathlib.Path
 ) -> None:
@@ -151,6 +803,7 @@ def generate_coverage_html_files(
     )
 
 
+@tracing.span("coverage markdown")
 def generate_coverage_markdown(coverage_path: pathlib.Path) -> str:
     return subprocess.run(
         "coverage",
@@ -161,6 +814,15 @@ def generate_coverage_markdown(coverage_path: pathlib.Path) -> str:
     )
 
 
+def summary_to_row(summary: dict[str, Any]) -> list[int]:
+    """A compact version of a "summary" (or "totals") key."""
+    return [summary.get(field, 0) for field in SUMMARY_FIELDS]
+
+
+def info_from_row(row: Sequence[int]) -> CoverageInfo:
+    return _make_coverage_info(dict(zip(SUMMARY_FIELDS, row, strict=True)))
+
+
 def _make_coverage_info(data: dict[str, Any]) -> CoverageInfo:
     """Build a CoverageInfo object from a "summary" or "totals" key."""
     return CoverageInfo(
@@ -181,7 +843,11 @@ def _make_coverage_info(data: dict[str, Any]) -> CoverageInfo:
     )
 
 
-def extract_info(data: dict[str, Any], coverage_path: pathlib.Path) -> Coverage:
+def extract_info(
+    data: dict[str, Any],
+    coverage_path: pathlib.Path,
+    keep_file: FileFilter | None = None,
+) -> Coverage:
     """
     {
         "meta": {
@@ -221,29 +887,81 @@ def extract_info(data: dict[str, Any], coverage_path: pathlib.Path) -> Coverage:
         },
     }
     """
+    files: dict[pathlib.Path, FileCoverage] = {}
+    file_summaries: dict[pathlib.Path, CoverageInfo] = {}
+    for path, file_data in data["files"].items():
+        _add_file_coverage(
+            files=files,
+            file_summaries=file_summaries,
+            path=coverage_path / path,
+            data=file_data,
+            keep_file=keep_file,
+        )
+
     return Coverage(
-        meta=CoverageMetadata(
-            version=data["meta"]["version"],
-            timestamp=datetime.datetime.fromisoformat(data["meta"]["timestamp"]),
-            branch_coverage=data["meta"]["branch_coverage"],
-            show_contexts=data["meta"]["show_contexts"],
-        ),
-        files={
-            coverage_path / path: FileCoverage(
-                path=coverage_path / path,
-                excluded_lines=file_data["excluded_lines"],
-                executed_lines=file_data["executed_lines"],
-                missing_lines=file_data["missing_lines"],
-                executed_branches=file_data.get("executed_branches"),
-                missing_branches=file_data.get("missing_branches"),
-                info=_make_coverage_info(file_data["summary"]),
-            )
-            for path, file_data in data["files"].items()
-        },
+        meta=_make_coverage_metadata(data["meta"]),
+        files=files,
         info=_make_coverage_info(data["totals"]),
+        file_summaries=file_summaries,
     )
 
 
+def extract_summaries(data: dict[str, Any], coverage_path: pathlib.Path) -> Coverage:
+    """
+    Build a Coverage object from a summary index (see
+    `files.compute_summary_index`): only the summary of each file is known.
+    """
+    return Coverage(
+        meta=_make_coverage_metadata(data["meta"]),
+        info=info_from_row(data["totals"]),
+        files={},
+        file_summaries={
+            coverage_path / path: info_from_row(row)
+            for path, row in data["files"].items()
+        },
+    )
+
+
+def _make_coverage_metadata(data: dict[str, Any]) -> CoverageMetadata:
+    """Build a CoverageMetadata object from the "meta" key."""
+    return CoverageMetadata(
+        version=data["version"],
+        timestamp=datetime.datetime.fromisoformat(data["timestamp"]),
+        branch_coverage=data["branch_coverage"],
+        show_contexts=data["show_contexts"],
+    )
+
+
+def _make_file_coverage(
+    path: pathlib.Path, data: dict[str, Any], info: CoverageInfo | None = None
+) -> FileCoverage:
+    """Build a FileCoverage object from an item of the "files" key."""
+    return FileCoverage(
+        path=path,
+        excluded_lines=data["excluded_lines"],
+        executed_lines=data["executed_lines"],
+        missing_lines=data["missing_lines"],
+        executed_branches=data.get("executed_branches"),
+        missing_branches=data.get("missing_branches"),
+        info=info or _make_coverage_info(data["summary"]),
+    )
+
+
+def _add_file_coverage(
+    files: dict[pathlib.Path, FileCoverage],
+    file_summaries: dict[pathlib.Path, CoverageInfo],
+    path: pathlib.Path,
+    data: dict[str, Any],
+    keep_file: FileFilter | None,
+) -> None:
+    info = _make_coverage_info(data["summary"])
+    if keep_file is None or keep_file(path, info):
+        files[path] = _make_file_coverage(path=path, data=data, info=info)
+    else:
+        file_summaries[path] = info
+
+
+@tracing.span("diff coverage")
 def get_diff_coverage_info(
     added_lines: dict[pathlib.Path, list[int]], coverage: Coverage
 ) -> DiffCoverage:
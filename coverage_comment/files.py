@@ -5,8 +5,11 @@ independently from storage specifics (storage.py)
 
 from __future__ import annotations
 
+import csv
 import dataclasses
 import decimal
+import hashlib
+import io
 import pathlib
 import shutil
 import tempfile
@@ -20,7 +23,24 @@ from . import json
 
 ENDPOINT_PATH = pathlib.Path("endpoint.json")
 DATA_PATH = pathlib.Path("data.json")
+SUMMARY_INDEX_PATH = pathlib.Path("summary-index.json")
 BADGE_PATH = pathlib.Path("badge.svg")
+CONTENT_HASH_PATH = pathlib.Path("content-hash.txt")
+HISTORY_PATH = pathlib.Path("history.csv")
+SNAPSHOTS_PATH = pathlib.Path("snapshots")
+
+# Bump when changing the format of the summary index
+SUMMARY_INDEX_VERSION = 1
+# Bump when changing the files we save, so that they're written again even if
+# the coverage didn't change
+CONTENT_HASH_VERSION = 2
+
+# Oldest entries are dropped from the history beyond this size
+HISTORY_MAX_ENTRIES = 1000
+# Number of entries of the history stored in the summary index, for the comment
+HISTORY_RECENT_ENTRIES = 20
+# Snapshots of the oldest commits are deleted beyond this number
+SNAPSHOTS_MAX_COUNT = 500
 
 
 class Operation(Protocol):
@@ -58,6 +78,51 @@ class ReplaceDir:
         shutil.move(self.source, self.path)
 
 
+@dataclasses.dataclass
+class WriteSnapshot:
+    """
+    Stores the summary index of a commit in the snapshots dir, sharded by the
+    first characters of the SHA. The index of the dir lists the commits in the
+    order they were saved, so that the snapshots of the oldest ones can be
+    deleted.
+    """
+
+    sha: str
+    contents: str
+    max_count: int = SNAPSHOTS_MAX_COUNT
+    path: pathlib.Path = SNAPSHOTS_PATH
+
+    def apply(self):
+        index_path = self.path / "index.json"
+        shas: list[str] = []
+        if index_path.exists():
+            shas = json.loads_dict(index_path.read_text())["snapshots"]  # pyright: ignore[reportAssignmentType]
+        shas = [sha for sha in shas if sha != self.sha] + [self.sha]
+        expired, shas = shas[: -self.max_count], shas[-self.max_count :]
+
+        snapshot_path = self.path / get_snapshot_path(sha=self.sha)
+        log.debug(f"Writing snapshot {snapshot_path}")
+        snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+        snapshot_path.write_text(self.contents)
+
+        for sha in expired:
+            expired_path = self.path / get_snapshot_path(sha=sha)
+            log.debug(f"Deleting expired snapshot {expired_path}")
+            expired_path.unlink(missing_ok=True)
+            if expired_path.parent.exists() and not any(expired_path.parent.iterdir()):
+                expired_path.parent.rmdir()
+
+        index: json.Json = {"snapshots": [sha for sha in shas]}
+        index_path.write_text(json.dumps(index))
+
+
+def get_snapshot_path(sha: str) -> pathlib.Path:
+    """
+    Path of the snapshot of a commit, relative to the snapshots dir.
+    """
+    return pathlib.Path(sha[:2]) / f"{sha}.json"
+
+
 def compute_files(
     line_rate: decimal.Decimal,
     raw_coverage_data: dict[str, Any],
@@ -65,6 +130,9 @@ def compute_files(
     minimum_green: decimal.Decimal,
     minimum_orange: decimal.Decimal,
     http_session: httpx.Client,
+    fingerprints: coverage.Fingerprints | None = None,
+    history: list[HistoryEntry] | None = None,
+    sha: str = "",
 ) -> list[Operation]:
     line_rate *= decimal.Decimal("100")
     color = badge.get_badge_color(
@@ -72,6 +140,20 @@ def compute_files(
         minimum_green=minimum_green,
         minimum_orange=minimum_orange,
     )
+    summary_index = compute_summary_index(
+        raw_coverage_data=raw_coverage_data,
+        line_rate=line_rate,
+        coverage_path=coverage_path,
+        history=history,
+    )
+    history_operations: list[Operation] = []
+    if history is not None:
+        history_operations.append(
+            WriteFile(path=HISTORY_PATH, contents=compute_history(entries=history))
+        )
+    snapshot_operations: list[Operation] = []
+    if sha:
+        snapshot_operations.append(WriteSnapshot(sha=sha, contents=summary_index))
     return [
         WriteFile(
             path=ENDPOINT_PATH,
@@ -85,8 +167,13 @@ def compute_files(
                 raw_coverage_data=raw_coverage_data,
                 line_rate=line_rate,
                 coverage_path=coverage_path,
+                fingerprints=fingerprints,
+                history=history,
             ),
         ),
+        WriteFile(path=SUMMARY_INDEX_PATH, contents=summary_index),
+        *history_operations,
+        *snapshot_operations,
         WriteFile(
             path=BADGE_PATH,
             contents=badge.compute_badge_image(
@@ -100,28 +187,229 @@ def compute_datafile(
     raw_coverage_data: dict[str, Any],
     line_rate: decimal.Decimal,
     coverage_path: pathlib.Path,
+    fingerprints: coverage.Fingerprints | None = None,
+    history: list[HistoryEntry] | None = None,
 ) -> str:
-    return json.dumps(
-        {
-            "coverage": float(line_rate),
-            "raw_data": raw_coverage_data,
-            "coverage_path": str(coverage_path),
-        }
-    )
+    data: dict[str, Any] = {
+        "coverage": float(line_rate),
+        "raw_data": raw_coverage_data,
+        "coverage_path": str(coverage_path),
+    }
+    if fingerprints:
+        data["fingerprints"] = fingerprints.as_json()
+    if history:
+        # Same as in the summary index, so that either file can be used
+        data["history"] = compute_recent_history(entries=history)
+    return json.dumps(data)
 
 
-def parse_datafile(contents: str) -> tuple[coverage.Coverage | None, decimal.Decimal]:
+@dataclasses.dataclass(kw_only=True)
+class Datafile:
+    coverage: coverage.Coverage | None
+    coverage_rate: decimal.Decimal
+    # Only stored when incremental analysis is enabled
+    fingerprints: coverage.Fingerprints | None = None
+    # Coverage rates of the latest saves, oldest first
+    history: list[decimal.Decimal] = dataclasses.field(default_factory=list)
+
+
+def load_datafile(contents: str) -> Datafile:
     file_contents = json.loads_dict(contents)
     coverage_rate = decimal.Decimal(str(file_contents["coverage"])) / decimal.Decimal(
         "100"
     )
     try:
-        return coverage.extract_info(
+        previous_coverage = coverage.extract_info(
             data=file_contents["raw_data"],  # pyright: ignore[reportArgumentType]
             coverage_path=pathlib.Path(file_contents["coverage_path"]),  # pyright: ignore[reportArgumentType]
-        ), coverage_rate
+        )
     except KeyError:
-        return None, coverage_rate
+        return Datafile(coverage=None, coverage_rate=coverage_rate)
+
+    return Datafile(
+        coverage=previous_coverage,
+        coverage_rate=coverage_rate,
+        fingerprints=coverage.Fingerprints.from_json(file_contents.get("fingerprints")),
+        history=parse_recent_history(rates=file_contents.get("history")),  # pyright: ignore[reportArgumentType]
+    )
+
+
+def parse_datafile(contents: str) -> tuple[coverage.Coverage | None, decimal.Decimal]:
+    datafile = load_datafile(contents=contents)
+    return datafile.coverage, datafile.coverage_rate
+
+
+def compute_summary_index(
+    raw_coverage_data: dict[str, Any],
+    line_rate: decimal.Decimal,
+    coverage_path: pathlib.Path,
+    history: list[HistoryEntry] | None = None,
+) -> str:
+    """
+    The data file without the line numbers: only the summary of each file
+    (see `coverage.summary_to_row`), which is all pull requests need from the
+    previous coverage. The most recent coverage rates of the history are
+    included too.
+    """
+    data: dict[str, Any] = {
+        "version": SUMMARY_INDEX_VERSION,
+        "coverage": float(line_rate),
+        "coverage_path": str(coverage_path),
+        "meta": raw_coverage_data["meta"],
+        "totals": coverage.summary_to_row(raw_coverage_data["totals"]),
+        "files": {
+            path: coverage.summary_to_row(file_data["summary"])
+            for path, file_data in raw_coverage_data["files"].items()
+        },
+        "history": compute_recent_history(entries=history or []),
+    }
+    return json.dumps(data)
+
+
+def load_summary_index(contents: str) -> Datafile | None:
+    """
+    Returns None if the summary index was written in another format.
+    """
+    file_contents: dict[str, Any] = json.loads_dict(contents)
+    if file_contents.get("version") != SUMMARY_INDEX_VERSION:
+        return None
+
+    return Datafile(
+        coverage=coverage.extract_summaries(
+            data=file_contents,
+            coverage_path=pathlib.Path(file_contents["coverage_path"]),
+        ),
+        coverage_rate=decimal.Decimal(str(file_contents["coverage"]))
+        / decimal.Decimal("100"),
+        history=parse_recent_history(rates=file_contents.get("history")),
+    )
+
+
+def compute_recent_history(entries: list[HistoryEntry]) -> list[float]:
+    """
+    The most recent coverage rates of the history, as percentages, stored in
+    the data file and the summary index for the comment.
+    """
+    return [float(entry.coverage) for entry in entries[-HISTORY_RECENT_ENTRIES:]]
+
+
+def parse_recent_history(rates: list[float] | None) -> list[decimal.Decimal]:
+    return [decimal.Decimal(str(rate)) / decimal.Decimal("100") for rate in rates or []]
+
+
+@dataclasses.dataclass(frozen=True)
+class HistoryEntry:
+    """
+    A line of the history file. The coverage is a percentage, like in the data
+    file.
+    """
+
+    sha: str
+    timestamp: str
+    coverage: decimal.Decimal
+    num_statements: int
+    covered_lines: int
+    num_branches: int
+    covered_branches: int
+
+    @classmethod
+    def from_coverage(
+        cls, sha: str, raw_coverage_data: dict[str, Any], line_rate: decimal.Decimal
+    ) -> HistoryEntry:
+        totals = raw_coverage_data["totals"]
+        return cls(
+            sha=sha,
+            timestamp=raw_coverage_data["meta"]["timestamp"],
+            coverage=(line_rate * 100).quantize(decimal.Decimal("0.01")),
+            num_statements=totals["num_statements"],
+            covered_lines=totals["covered_lines"],
+            num_branches=totals.get("num_branches", 0),
+            covered_branches=totals.get("covered_branches", 0),
+        )
+
+
+HISTORY_FIELDS = [field.name for field in dataclasses.fields(HistoryEntry)]
+
+
+def parse_history(contents: str | None) -> list[HistoryEntry]:
+    """
+    Lines that can't be read (e.g. written by a future version with other
+    columns) are skipped.
+    """
+    entries: list[HistoryEntry] = []
+    for row in csv.DictReader(io.StringIO(contents or "")):
+        try:
+            entries.append(
+                HistoryEntry(
+                    sha=row["sha"],
+                    timestamp=row["timestamp"],
+                    coverage=decimal.Decimal(row["coverage"]),
+                    num_statements=int(row["num_statements"]),
+                    covered_lines=int(row["covered_lines"]),
+                    num_branches=int(row["num_branches"]),
+                    covered_branches=int(row["covered_branches"]),
+                )
+            )
+        except (KeyError, TypeError, ValueError, decimal.InvalidOperation):
+            log.debug(f"Skipping invalid history line: {row}")
+    return entries
+
+
+def append_history(
+    contents: str | None,
+    entry: HistoryEntry,
+    max_entries: int = HISTORY_MAX_ENTRIES,
+) -> list[HistoryEntry]:
+    """
+    Add an entry at the end of the history, dropping the oldest entries beyond
+    `max_entries`. A new run on the same commit replaces its previous entry.
+    """
+    entries = parse_history(contents)
+    if entry.sha and entries and entries[-1].sha == entry.sha:
+        entries.pop()
+    entries.append(entry)
+    return entries[-max_entries:]
+
+
+def compute_history(entries: list[HistoryEntry]) -> str:
+    output = io.StringIO()
+    writer = csv.writer(output, lineterminator="\n")
+    writer.writerow(HISTORY_FIELDS)
+    for entry in entries:
+        writer.writerow(getattr(entry, field) for field in HISTORY_FIELDS)
+    return output.getvalue()
+
+
+def compute_content_hash(
+    raw_coverage_data: dict[str, Any],
+    fingerprints: coverage.Fingerprints | None,
+    settings: dict[str, Any],
+) -> str | None:
+    """
+    A hash of everything the saved files are made of: the coverage data
+    (except for its timestamp), the sources and coverage configuration through
+    the fingerprints, and the given settings.
+    Returns None if the sources couldn't be fingerprinted: the HTML report
+    might change even if the coverage doesn't.
+    """
+    if fingerprints is None:
+        return None
+
+    meta = {
+        key: value
+        for key, value in raw_coverage_data.get("meta", {}).items()
+        if key != "timestamp"
+    }
+    contents = {
+        "version": CONTENT_HASH_VERSION,
+        "coverage": raw_coverage_data | {"meta": meta},
+        "fingerprints": fingerprints.as_json(),
+        "settings": settings,
+    }
+    # Sorting keys makes the hash independent of the order in which files were
+    # measured
+    serialized = json.dumps(contents, sort_keys=True)
+    return hashlib.sha256(serialized.encode()).hexdigest()
 
 
 class ImageURLs(TypedDict):
@@ -1,11 +1,10 @@
 from __future__ import annotations
 
 import dataclasses
-import io
 import pathlib
 import re
 import sys
-import zipfile
+import tempfile
 from collections.abc import Iterable
 from typing import Any
 from urllib.parse import urlparse
@@ -15,6 +14,8 @@ from coverage_comment import github_client, log
 from . import json
 
 GITHUB_ACTIONS_LOGIN = "github-actions[bot]"
+# Artifacts bigger than this are downloaded to disk rather than in memory
+ARTIFACT_MAX_MEMORY_SIZE = 10 * 1024 * 1024
 
 
 class CannotDeterminePR(Exception):
@@ -50,7 +51,7 @@ class RepositoryInfo:
 def get_repository_info(
     github: github_client.GitHub, repository: str
 ) -> RepositoryInfo:
-    response = github.repos(repository).get()
+    response = github.repos(repository).get(fields={"default_branch", "visibility"})
     assert response is not None
 
     return RepositoryInfo(
@@ -58,6 +59,227 @@ def get_repository_info(
     )
 
 
+@dataclasses.dataclass(kw_only=True)
+class Comment:
+    id: int
+    login: str
+    body: str
+
+
+@dataclasses.dataclass(kw_only=True)
+class PullRequestContext:
+    """
+    What we need to know about the repository and the PR to comment on,
+    fetched in a single GraphQL round trip.
+    """
+
+    repo_info: RepositoryInfo
+    me: str
+    # None when no PR was looked for, or none was found
+    pr_number: int | None
+    # The comments of the PR, oldest first
+    comments: list[Comment]
+    # Current head commit of the PR, None when unknown
+    head_sha: str | None = None
+
+
+COMMENT_PAGE_FRAGMENT = """
+fragment commentPage on IssueCommentConnection {
+  pageInfo {
+    hasNextPage
+    endCursor
+  }
+  nodes {
+    databaseId
+    body
+    author {
+      __typename
+      login
+    }
+  }
+}
+"""
+
+PR_CONTEXT_QUERY = (
+    """
+query(
+  $owner: String!
+  $name: String!
+  $withViewer: Boolean!
+  $byNumber: Boolean!
+  $number: Int = 0
+  $byBranch: Boolean!
+  $branch: String = ""
+) {
+  viewer @include(if: $withViewer) {
+    login
+  }
+  repository(owner: $owner, name: $name) {
+    defaultBranchRef {
+      name
+    }
+    visibility
+    pullRequest(number: $number) @include(if: $byNumber) {
+      ...prFields
+    }
+    pullRequests(
+      headRefName: $branch
+      first: 10
+      orderBy: { field: UPDATED_AT, direction: DESC }
+    ) @include(if: $byBranch) {
+      nodes {
+        ...prFields
+      }
+    }
+  }
+}
+
+fragment prFields on PullRequest {
+  number
+  state
+  headRefOid
+  headRepositoryOwner {
+    login
+  }
+  comments(first: 100) {
+    ...commentPage
+  }
+}
+"""
+    + COMMENT_PAGE_FRAGMENT
+)
+
+# The comments beyond the first page of PR_CONTEXT_QUERY
+PR_COMMENTS_QUERY = (
+    """
+query($owner: String!, $name: String!, $number: Int!, $after: String!) {
+  repository(owner: $owner, name: $name) {
+    pullRequest(number: $number) {
+      comments(first: 100, after: $after) {
+        ...commentPage
+      }
+    }
+  }
+}
+"""
+    + COMMENT_PAGE_FRAGMENT
+)
+
+
+def get_pr_context(
+    github: github_client.GitHub,
+    repository: str,
+    pr_number: int | None = None,
+    owner: str | None = None,
+    branch: str | None = None,
+) -> PullRequestContext | None:
+    """
+    Replaces get_repository_info, get_my_login, find_pr_for_branch and the
+    listing of the PR comments with a single GraphQL query. The PR is looked
+    up by number, or else by head branch (and owner of the head repository).
+
+    Returns None when the GraphQL API cannot answer the query (e.g. on older
+    GitHub Enterprise Server versions): the caller should then use the REST
+    API.
+    """
+    repo_owner, name = repository.split("/", 1)
+    variables: dict[str, Any] = {
+        "owner": repo_owner,
+        "name": name,
+        "byNumber": pr_number is not None,
+        "number": pr_number or 0,
+        "byBranch": branch is not None,
+        "branch": branch or "",
+    }
+    try:
+        try:
+            data = github.graphql(PR_CONTEXT_QUERY, withViewer=True, **variables)
+        except github_client.GraphQLError as exc:
+            if not any(
+                (error.get("path") or [None])[0] == "viewer" for error in exc.errors
+            ):
+                raise
+            # Same as in get_my_login: the GitHub Actions user cannot access
+            # its own details.
+            data = github.graphql(PR_CONTEXT_QUERY, withViewer=False, **variables)
+    except github_client.ApiError:
+        log.info("Cannot use the GraphQL API, falling back to the REST API")
+        log.debug("GraphQL error", exc_info=True)
+        return None
+
+    repo = data.get("repository")
+    if not repo:
+        log.info("Repository not found with GraphQL, falling back to the REST API")
+        return None
+
+    viewer = data.get("viewer")
+
+    pr = None
+    if pr_number is not None:
+        pr = repo.get("pullRequest")
+    elif branch is not None:
+        candidates = [
+            pr
+            for pr in repo.pullRequests.nodes
+            if owner is None or _graphql_head_owner(pr) == owner
+        ]
+        open_prs = [pr for pr in candidates if pr.state == "OPEN"]
+        pr = next(iter(open_prs or candidates), None)
+
+    return PullRequestContext(
+        repo_info=RepositoryInfo(
+            default_branch=repo.defaultBranchRef.name,
+            visibility=repo.visibility.lower(),
+        ),
+        me=viewer.login if viewer else GITHUB_ACTIONS_LOGIN,
+        pr_number=pr.number if pr else None,
+        comments=_graphql_comments(github=github, repository=repository, pr=pr)
+        if pr
+        else [],
+        head_sha=pr.get("headRefOid") if pr else None,
+    )
+
+
+def _graphql_comments(
+    github: github_client.GitHub, repository: str, pr: github_client.JsonObject
+) -> list[Comment]:
+    """
+    Our comment is usually one of the first ones: the comments are read
+    oldest first, and the pages after the first one are fetched until the
+    last comment.
+    """
+    owner, name = repository.split("/", 1)
+    page = pr.comments
+    comments = [_graphql_comment(node) for node in page.nodes]
+    while page.pageInfo.hasNextPage:
+        data = github.graphql(
+            PR_COMMENTS_QUERY,
+            owner=owner,
+            name=name,
+            number=pr.number,
+            after=page.pageInfo.endCursor,
+        )
+        page = data.repository.pullRequest.comments
+        comments.extend(_graphql_comment(node) for node in page.nodes)
+    return comments
+
+
+def _graphql_head_owner(pr: github_client.JsonObject) -> str | None:
+    # Null when the head repository was deleted
+    head_owner = pr.headRepositoryOwner
+    return head_owner.login if head_owner else None
+
+
+def _graphql_comment(node: github_client.JsonObject) -> Comment:
+    author = node.author
+    login = ""
+    # Author is null for deleted users
+    if author:
+        # The REST API calls bots "name[bot]", GraphQL just "name"
+        login = author.login + ("[bot]" if author["__typename"] == "Bot" else "")
+    return Comment(id=node.databaseId, login=login, body=node.body)
+
+
 def extract_github_host(api_url: str) -> str:
     """
     Extracts the base GitHub web host URL from a GitHub API URL.
@@ -95,34 +317,73 @@ def download_artifact(
     run_id: int,
     filename: pathlib.Path,
 ) -> str:
+    files = download_artifact_files(
+        github=github,
+        repository=repository,
+        artifact_name=artifact_name,
+        run_id=run_id,
+        filenames=[filename],
+    )
+    try:
+        return files[filename]
+    except KeyError:
+        raise NoArtifact(f"File named {filename} not found in artifact {artifact_name}")
+
+
+def download_artifact_files(
+    github: github_client.GitHub,
+    repository: str,
+    artifact_name: str,
+    run_id: int,
+    filenames: list[pathlib.Path],
+) -> dict[pathlib.Path, str]:
+    """
+    Download the artifact once, and return the contents of those of the given
+    files it contains.
+    """
+    # Only post_comment downloads artifacts
+    import zipfile
+
     repo_path = github.repos(repository)
 
     try:
         artifact = next(
             artifact
-            for artifact in _fetch_artifacts(repo_path, run_id)
+            for artifact in _fetch_artifacts(repo_path, run_id, name=artifact_name)
+            # Older GitHub Enterprise Server versions ignore the name filter
             if artifact.name == artifact_name
         )
     except StopIteration:
         raise NoArtifact(f"No artifact found with name {artifact_name} in run {run_id}")
 
-    zip_bytes = io.BytesIO(repo_path.actions.artifacts(artifact.id).zip.get(bytes=True))
-    zipf = zipfile.ZipFile(zip_bytes)
+    # The artifact may contain other (large) files: we stream it to disk and
+    # only decompress the files we need.
+    contents: dict[pathlib.Path, str] = {}
+    with tempfile.SpooledTemporaryFile(max_size=ARTIFACT_MAX_MEMORY_SIZE) as zip_file:
+        repo_path.actions.artifacts(artifact.id).zip.download(file=zip_file)
 
-    try:
-        return zipf.open(str(filename), "r").read().decode("utf-8")
-    except KeyError:
-        raise NoArtifact(f"File named {filename} not found in artifact {artifact_name}")
+        with zipfile.ZipFile(zip_file) as zipf:
+            for filename in filenames:
+                try:
+                    with zipf.open(str(filename), "r") as file:
+                        contents[filename] = file.read().decode("utf-8")
+                except KeyError:
+                    continue
+    return contents
 
 
 def _fetch_artifacts(
-    repo_path: github_client.Endpoint, run_id: int
+    repo_path: github_client.Endpoint, run_id: int, name: str
 ) -> Iterable[github_client.JsonObject]:
     page = 1
     total_fetched = 0
 
     while True:
-        result = repo_path.actions.runs(run_id).artifacts.get(page=str(page))
+        result = repo_path.actions.runs(run_id).artifacts.get(
+            name=name,
+            page=str(page),
+            fields={"artifacts", "total_count", "id", "name"},
+        )
         if not result or not result.artifacts:
             break
 
@@ -135,20 +396,39 @@ def _fetch_artifacts(
         page += 1
 
 
-def get_branch_from_workflow_run(
+@dataclasses.dataclass(kw_only=True)
+class WorkflowRun:
+    # Owner of the head repository, i.e. of the fork for PRs from forks
+    owner: str
+    branch: str
+    head_sha: str
+
+
+def get_workflow_run(
     github: github_client.GitHub, repository: str, run_id: int
-) -> tuple[str, str]:
+) -> WorkflowRun:
     repo_path = github.repos(repository)
-    run = repo_path.actions.runs(run_id).get()
+    run = repo_path.actions.runs(run_id).get(
+        fields={"head_branch", "head_sha", "head_repository", "owner", "login"}
+    )
     assert run is not None
-    branch = run.head_branch
-    owner = run.head_repository.owner.login
-    return owner, branch
+    return WorkflowRun(
+        owner=run.head_repository.owner.login,
+        branch=run.head_branch,
+        head_sha=run.head_sha,
+    )
+
+
+@dataclasses.dataclass(kw_only=True)
+class PullRequest:
+    number: int
+    # The commit the PR is currently at
+    head_sha: str
 
 
 def find_pr_for_branch(
     github: github_client.GitHub, repository: str, owner: str, branch: str
-) -> int:
+) -> PullRequest:
     # The full branch is in the form of "owner:branch" as specified in
     # https://docs.github.com/en/rest/pulls/pulls?apiVersion=2022-11-28#list-pull-requests
     # but it seems to also work with "owner/repo:branch"
@@ -157,18 +437,22 @@ def find_pr_for_branch(
 
     for state in ["open", "all"]:
         prs = github.repos(repository).pulls.get(
-            state=state, head=full_branch, sort="updated", direction="desc"
+            state=state,
+            head=full_branch,
+            sort="updated",
+            direction="desc",
+            fields={"number", "head", "sha"},
         )
         assert prs is not None
         for pr in prs:
-            return pr.number  # pyright: ignore
+            return PullRequest(number=pr.number, head_sha=pr.head.sha)  # pyright: ignore
 
     raise CannotDeterminePR(f"No open PR found for branch {branch}")
 
 
 def get_my_login(github: github_client.GitHub) -> str:
     try:
-        response = github.user.get()
+        response = github.user.get(fields={"login"})
     except github_client.Forbidden:
         # The GitHub actions user cannot access its own details
         # and I'm not sure there's a way to see that we're using
@@ -180,6 +464,25 @@ def get_my_login(github: github_client.GitHub) -> str:
         return response.login
 
 
+def list_comments(
+    github: github_client.GitHub, repository: str, pr_number: int
+) -> list[Comment]:
+    comments = (
+        github.repos(repository)
+        .issues(pr_number)
+        .comments.get(fields={"id", "user", "login", "body"})
+    )
+    assert comments is not None
+    return [
+        Comment(
+            id=comment.id,  # pyright: ignore
+            login=comment.user.login,  # pyright: ignore
+            body=comment.body,  # pyright: ignore
+        )
+        for comment in comments
+    ]
+
+
 def post_comment(
     github: github_client.GitHub,
     me: str,
@@ -187,21 +490,30 @@ def post_comment(
     pr_number: int,
     contents: str,
     marker: str,
+    comments: list[Comment] | None = None,
 ) -> None:
+    """
+    Update our previous comment holding the marker, or create a new one.
+    If the PR comments are already known (see get_pr_context), they can be
+    passed as `comments` to avoid listing them again.
+    """
     issue_comments_path = github.repos(repository).issues(pr_number).comments
     comments_path = github.repos(repository).issues.comments
 
-    comments = issue_comments_path.get()
-    assert comments is not None
-    for comment in comments:
-        login: str = comment.user.login  # pyright: ignore
-        body: str = comment.body  # pyright: ignore
-        comment_id: int = comment.id  # pyright: ignore
+    if comments is None:
+        comments = list_comments(
+            github=github, repository=repository, pr_number=pr_number
+        )
 
-        if login == me and marker in body:
+    for comment in comments:
+        if comment.login == me and marker in comment.body:
+            if comment.body == contents:
+                # e.g. several workflow runs posting the same comment
+                log.info("Previous comment is already up to date")
+                break
             log.info("Update previous comment")
             try:
-                comments_path(comment_id).patch(body=contents)
+                comments_path(comment.id).patch(body=contents)
             except github_client.Forbidden as exc:
                 raise CannotPostComment from exc
             break
@@ -10,16 +10,26 @@ License: https://github.com/michaelliao/githubpy/blob/96d0c3e729c0b3e3c043a60454
 
 from __future__ import annotations
 
+import collections
 import dataclasses
-from typing import Any, Literal, overload
+import threading
+from collections.abc import Collection
+from typing import IO, Any, Literal, overload, override
 
 __version__ = "1.1.1"
 
 import httpx
 
 TIMEOUT = 60
+# Size of the chunks written to disk when streaming a download
+CHUNK_SIZE = 64 * 1024
 
 _URL = "https://api.github.com"
+# Bounds of the ETag cache (see CachingTransport)
+ETAG_CACHE_MAX_ENTRIES = 1000
+ETAG_CACHE_MAX_SIZE = 1024 * 1024
+# The cached content is decoded: these headers don't apply to it anymore
+ETAG_CACHE_SKIPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
 
 type Method = Literal["get", "post", "patch", "put", "delete"]
 
@@ -37,6 +47,7 @@ class HttpCall:
         text: Literal[False] = False,
         bytes: Literal[False] = False,
         headers: dict[str, str] | None = None,
+        fields: Collection[str] | None = None,
         **kwargs: Any,
     ) -> JsonObject | None: ...
 
@@ -65,6 +76,7 @@ class HttpCall:
         text: bool = False,
         bytes: bool = False,
         headers: dict[str, str] | None = None,
+        fields: Collection[str] | None = None,
         **kwargs: Any,
     ) -> JsonObject | str | bytes | None:
         return self.gh.http(
@@ -73,6 +85,7 @@ class HttpCall:
             text=text,
             bytes=bytes,
             headers=headers,
+            fields=fields,
             **kwargs,
         )
 
@@ -108,6 +121,9 @@ class Endpoint:
     def delete(self) -> HttpCall:
         return HttpCall(gh=self.gh, method="delete", path=self.name)
 
+    def download(self, file: IO[bytes], **kwargs: Any) -> None:
+        self.gh.download(path=self.name, file=file, **kwargs)
+
     def __getattr__(self, attr: str) -> Endpoint:
         name = f"{self.name}/{attr}"
         return Endpoint(gh=self.gh, name=name)
@@ -133,6 +149,7 @@ class GitHub:
         text: Literal[False] = False,
         bytes: Literal[False] = False,
         headers: dict[str, str] | None,
+        fields: Collection[str] | None = None,
         **kwargs: Any,
     ) -> JsonObject | None: ...
 
@@ -169,6 +186,7 @@ class GitHub:
         text: bool,
         bytes: bool,
         headers: dict[str, str] | None,
+        fields: Collection[str] | None = None,
         **kwargs: Any,
     ) -> JsonObject | str | bytes | None: ...
 
@@ -180,8 +198,17 @@ class GitHub:
         text: bool = False,
         bytes: bool = False,
         headers: dict[str, str] | None = None,
+        fields: Collection[str] | None = None,
         **kwargs: Any,
     ) -> JsonObject | str | bytes | None:
+        """
+        `fields`, if given, lists the keys to keep when decoding a JSON
+        response (at any depth): the other keys are discarded as soon as
+        they're decoded, which saves a lot of memory on listing endpoints.
+        This is a memory-only gain: the whole body is still parsed, so
+        decoding isn't any faster. Error responses are always decoded in
+        full.
+        """
         _method = method.lower()
         params: dict[str, Any] | None = None
         json: dict[str, Any] | None = None
@@ -200,21 +227,170 @@ class GitHub:
             json=json,
         )
         contents: JsonObject | str | bytes = response_contents(
-            response=response, text=text, bytes=bytes
+            response=response,
+            text=text,
+            bytes=bytes,
+            fields=fields if response.is_success else None,
         )
 
         try:
             response.raise_for_status()
         except httpx.HTTPStatusError as exc:
-            cls: type[ApiError] = {
-                403: Forbidden,
-                404: NotFound,
-            }.get(exc.response.status_code, ApiError)
-
-            raise cls(str(contents)) from exc
+            raise get_api_error(exc=exc, contents=contents) from exc
 
         return contents
 
+    def download(self, *, path: str, file: IO[bytes], **kwargs: Any) -> None:
+        """
+        Write the body of a GET request to `file` chunk by chunk, rather than
+        holding it in memory.
+        """
+        with self.session.stream(
+            "GET", path, timeout=TIMEOUT, params=kwargs or None
+        ) as response:
+            try:
+                response.raise_for_status()
+            except httpx.HTTPStatusError as exc:
+                response.read()
+                raise get_api_error(exc=exc, contents=response.text) from exc
+
+            for chunk in response.iter_bytes(chunk_size=CHUNK_SIZE):
+                file.write(chunk)
+
+        file.seek(0)
+
+    def graphql(self, query: str, **variables: Any) -> JsonObject:
+        """
+        Run a GraphQL query and return its `data`.
+
+        GitHub answers GraphQL errors with a 200, so we raise GraphQLError
+        ourselves when the query failed as a whole. Partial errors (some
+        fields being null) are left to the caller.
+        """
+        response = self.http(
+            method="post",
+            path=get_graphql_url(api_url=str(self.session.base_url)),
+            headers=None,
+            query=query,
+            variables=variables,
+        )
+        if not response or response.get("data") is None:
+            raise GraphQLError(errors=response.get("errors", []) if response else [])
+
+        return response.data
+
+
+@dataclasses.dataclass(frozen=True)
+class CachedResponse:
+    etag: str
+    headers: list[tuple[bytes, bytes]]
+    content: bytes
+
+
+class CachingTransport(httpx.BaseTransport):
+    """
+    Revalidate the GET responses we already have, with their ETag: GitHub
+    answers `304 Not Modified` without a body, and such requests don't count
+    against the rate limit. Only useful when the same resources are requested
+    over and over, i.e. in a long-running process (see `serve`).
+
+    The cache is keyed on the request headers too, as the response depends on
+    the token (`Authorization`) and on the requested format (`Accept`).
+    """
+
+    def __init__(
+        self,
+        transport: httpx.BaseTransport,
+        max_entries: int = ETAG_CACHE_MAX_ENTRIES,
+        max_size: int = ETAG_CACHE_MAX_SIZE,
+    ):
+        self.transport: httpx.BaseTransport = transport
+        self.max_entries: int = max_entries
+        self.max_size: int = max_size
+        self.cache: collections.OrderedDict[tuple[str, ...], CachedResponse] = (
+            collections.OrderedDict()
+        )
+        self.lock: threading.Lock = threading.Lock()
+
+    def get_key(self, request: httpx.Request) -> tuple[str, ...]:
+        return (
+            str(request.url),
+            request.headers.get("Authorization", ""),
+            request.headers.get("Accept", ""),
+        )
+
+    @override
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if request.method != "GET":
+            return self.transport.handle_request(request)
+
+        key = self.get_key(request)
+        with self.lock:
+            cached = self.cache.get(key)
+            if cached:
+                self.cache.move_to_end(key)
+        if cached:
+            request.headers["If-None-Match"] = cached.etag
+
+        response = self.transport.handle_request(request)
+
+        if cached and response.status_code == 304:
+            response.close()
+            return httpx.Response(
+                status_code=200,
+                headers=cached.headers,
+                content=cached.content,
+                request=request,
+            )
+
+        etag = response.headers.get("ETag")
+        size = int(response.headers.get("Content-Length", self.max_size + 1))
+        if response.status_code != 200 or not etag or size > self.max_size:
+            return response
+
+        # The body is small: read it now to keep a copy
+        content = response.read()
+        response.close()
+        headers = [
+            (name, value)
+            for name, value in response.headers.raw
+            if name.decode().lower() not in ETAG_CACHE_SKIPPED_HEADERS
+        ]
+        with self.lock:
+            self.cache[key] = CachedResponse(
+                etag=etag, headers=headers, content=content
+            )
+            if len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+        return httpx.Response(
+            status_code=200, headers=headers, content=content, request=request
+        )
+
+    @override
+    def close(self) -> None:
+        self.transport.close()
+
+
+def get_api_error(exc: httpx.HTTPStatusError, contents: Any) -> ApiError:
+    cls: type[ApiError] = {
+        403: Forbidden,
+        404: NotFound,
+    }.get(exc.response.status_code, ApiError)
+
+    return cls(str(contents))
+
+
+def get_graphql_url(api_url: str) -> str:
+    """
+    GitHub.com serves GraphQL at https://api.github.com/graphql, while GitHub
+    Enterprise Server serves it at https://<host>/api/graphql (next to the REST
+    API at https://<host>/api/v3).
+    """
+    api_url = api_url.rstrip("/")
+    if api_url.endswith("/v3"):
+        return api_url.removesuffix("/v3") + "/graphql"
+    return api_url + "/graphql"
+
 
 @overload
 def response_contents(
@@ -240,6 +416,7 @@ def response_contents(
     *,
     text: Literal[False],
     bytes: Literal[False],
+    fields: Collection[str] | None = None,
 ) -> JsonObject: ...
 
 
@@ -249,6 +426,7 @@ def response_contents(
     *,
     text: bool,
     bytes: bool,
+    fields: Collection[str] | None = None,
 ) -> JsonObject | str | bytes: ...
 
 
@@ -257,6 +435,7 @@ def response_contents(
     *,
     text: bool,
     bytes: bool,
+    fields: Collection[str] | None = None,
 ) -> JsonObject | str | bytes | None:
     if bytes:
         return response.content
@@ -264,7 +443,8 @@ def response_contents(
     if text:
         return response.text
 
-    if not response.text:
+    # Checking the raw content avoids decoding the whole body to text
+    if not response.content:
         return None
 
     # Assume that missing content type (which should only happen in tests) isn't
@@ -278,7 +458,17 @@ def response_contents(
             f"Response: {response.text}"
         )
 
-    return response.json(object_hook=JsonObject)
+    if fields is None:
+        return response.json(object_hook=JsonObject)
+
+    kept_fields = frozenset(fields)
+
+    def object_hook(obj: dict[str, Any]) -> JsonObject:
+        return JsonObject(
+            {key: value for key, value in obj.items() if key in kept_fields}
+        )
+
+    return response.json(object_hook=object_hook)
 
 
 class JsonObject(dict[str, Any]):
@@ -286,6 +476,9 @@ class JsonObject(dict[str, Any]):
     general json object that can bind any fields but also act as a dict.
     """
 
+    # API responses hold thousands of these: don't give each one a __dict__
+    __slots__: tuple[str, ...] = ()
+
     def __getattr__(self, key: str) -> Any:
         try:
             return self[key]
@@ -307,3 +500,9 @@ class Forbidden(ApiError):
 
 class InvalidResponseType(ApiError):
     pass
+
+
+class GraphQLError(ApiError):
+    def __init__(self, errors: list[Any]):
+        self.errors: list[Any] = errors
+        super().__init__(str(errors))
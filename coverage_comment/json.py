@@ -1,15 +1,20 @@
 from __future__ import annotations
 
 import json as python_json
-from collections.abc import Mapping, Sequence
+import re
+from collections.abc import Callable, Iterator, Mapping, Sequence
 from json import JSONDecodeError as JSONDecodeError  # reexport error
+from typing import IO
 
 type Json = dict[str, Json] | list[Json] | str | int | float | bool | None
 type ROJson = Mapping[str, Json] | Sequence[Json] | str | int | float | bool | None
 
+# Size of the chunks read from streams
+CHUNK_SIZE = 64 * 1024
 
-def dumps(obj: ROJson) -> str:
-    return python_json.dumps(obj=obj)
+
+def dumps(obj: ROJson, sort_keys: bool = False) -> str:
+    return python_json.dumps(obj=obj, sort_keys=sort_keys)
 
 
 def loads(serialized: str) -> Json:
@@ -31,3 +36,119 @@ def loads_dict(serialized: str) -> dict[str, Json]:
             f"Object loaded from json is expected to be a dict, got a {type(result).__name__}\nObject: {result}"
         )
     return result
+
+
+def load_streamed_dict(
+    stream: IO[str], callbacks: Mapping[str, Callable[[str, Json], None]]
+) -> dict[str, Json]:
+    """
+    Same as `loads_dict`, reading from a stream. The values under the keys
+    of `callbacks` must be objects: each of their items is passed to the
+    callback as soon as it's read, instead of being kept in memory (these
+    keys are absent from the result).
+    """
+    reader = _StreamReader(stream=stream)
+    if reader.peek() != "{":
+        raise UnexpectedType("Object loaded from json is expected to be a dict")
+
+    result: dict[str, Json] = {}
+    for key in reader.iter_object():
+        if key in callbacks:
+            for item_key in reader.iter_object():
+                callbacks[key](item_key, reader.read_value())
+        else:
+            result[key] = reader.read_value()
+
+    if reader.peek():
+        raise JSONDecodeError("Extra data", reader.buffer, reader.pos)
+    return result
+
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+# What's left of a number cut in the middle of its fraction or exponent
+_NUMBER_CONTINUATION = re.compile(r"[.eE][0-9eE+-]*")
+
+
+class _StreamReader:
+    """
+    Reads JSON values one at a time from a stream, keeping only the unread
+    part of the current chunk in memory.
+    """
+
+    def __init__(self, stream: IO[str]):
+        self.stream: IO[str] = stream
+        self.buffer: str = ""
+        self.pos: int = 0
+        self.decoder: python_json.JSONDecoder = python_json.JSONDecoder()
+
+    def _read_chunk(self) -> bool:
+        chunk = self.stream.read(CHUNK_SIZE)
+        if not chunk:
+            return False
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character, or "" at the end of the stream."""
+        while True:
+            match = _WHITESPACE.match(self.buffer, self.pos)
+            assert match
+            self.pos = match.end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._read_chunk():
+                return ""
+
+    def _expect(self, chars: str, message: str) -> str:
+        char = self.peek()
+        if not char or char not in chars:
+            raise JSONDecodeError(message, self.buffer, self.pos)
+        self.pos += 1
+        return char
+
+    def read_value(self) -> Json:
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except JSONDecodeError:
+                # The value may be incomplete
+                if not self._read_chunk():
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next chunk,
+            # including when it was cut right after its "." or exponent
+            if (
+                end == len(self.buffer)
+                or (
+                    isinstance(value, int | float)
+                    and _NUMBER_CONTINUATION.fullmatch(self.buffer, end)
+                )
+            ) and self._read_chunk():
+                continue
+            self.pos = end
+            return value
+
+    def iter_object(self) -> Iterator[str]:
+        """
+        Yield the keys of the object starting at the current position. The
+        caller must read the value after each key.
+        """
+        self._expect("{", "Expecting '{'")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            if self.peek() != '"':
+                raise JSONDecodeError(
+                    "Expecting property name enclosed in double quotes",
+                    self.buffer,
+                    self.pos,
+                )
+            key = self.read_value()
+            assert isinstance(key, str)
+            self._expect(":", "Expecting ':' delimiter")
+            yield key
+            if self._expect(",}", "Expecting ',' delimiter") == "}":
+                return
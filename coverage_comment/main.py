@@ -1,28 +1,33 @@
 from __future__ import annotations
 
+import concurrent.futures
+import contextlib
+import cProfile
 import functools
 import logging
 import os
-from typing import Any
+import pathlib
+import sys
+from typing import TYPE_CHECKING, Any
 
 import httpx
 
 from coverage_comment import activities as activity_module
 from coverage_comment import (
     comment_file,
-    communication,
-    diff_grouper,
-    files,
     github,
     github_client,
     log,
     log_utils,
     settings,
-    storage,
     subprocess,
-    template,
+    tracing,
 )
-from coverage_comment import coverage as coverage_module
+
+# The modules that import coverage and jinja2 take most of the start-up time:
+# they're imported by the activities that need them (e.g. not by post_comment).
+if TYPE_CHECKING:
+    from coverage_comment import files
 
 
 def action(
@@ -35,9 +40,19 @@ def action(
     gh = github_client.GitHub(session=github_session)
     event_name = config.GITHUB_EVENT_NAME
 
-    repo_info = github.get_repository_info(
-        github=gh, repository=config.GITHUB_REPOSITORY
-    )
+    # The PR and its comments are only looked up when they're sure to be
+    # processed, along with the repository info. Otherwise, the activity
+    # (which depends on the default branch) is known first.
+    pr_context = None
+    if is_processing_pr(config=config):
+        pr_context = get_pr_context(config=config, gh=gh)
+
+    if pr_context:
+        repo_info = pr_context.repo_info
+    else:
+        repo_info = github.get_repository_info(
+            github=gh, repository=config.GITHUB_REPOSITORY
+        )
     try:
         activity = config.ACTIVITY
         if not activity:
@@ -59,18 +74,38 @@ def action(
         return 1
 
     if activity == activity_module.Activity.SAVE_COVERAGE_DATA_FILES:
+        if config.SUBPROJECTS:
+            return save_subprojects_coverage_data_files(
+                config=config,
+                gh=gh,
+                git=git,
+                http_session=http_session,
+                repo_info=repo_info,
+            )
         return save_coverage_data_files(
             config=config,
+            gh=gh,
             git=git,
             http_session=http_session,
             repo_info=repo_info,
         )
 
     elif activity == activity_module.Activity.PROCESS_PR:
+        if pr_context is None and not is_processing_pr(config=config):
+            # e.g. a push on another branch than the default one
+            pr_context = get_pr_context(config=config, gh=gh)
+        if config.SUBPROJECTS:
+            return process_subprojects_pr(
+                config=config,
+                gh=gh,
+                repo_info=repo_info,
+                pr_context=pr_context,
+            )
         return process_pr(
             config=config,
             gh=gh,
             repo_info=repo_info,
+            pr_context=pr_context,
         )
 
     else:
@@ -81,28 +116,64 @@ def action(
         )
 
 
-def process_pr(
-    config: settings.Config,
-    gh: github_client.GitHub,
-    repo_info: github.RepositoryInfo,
-) -> int:
-    log.info("Generating comment for PR")
+def is_processing_pr(config: settings.Config) -> bool:
+    """
+    Whether the activity is `process_pr`, as far as we can tell without the
+    repository info: a push may be on the default branch.
+    """
+    if config.ACTIVITY:
+        return config.ACTIVITY == activity_module.Activity.PROCESS_PR
+    return (
+        config.GITHUB_EVENT_NAME == "pull_request"
+        and config.GITHUB_EVENT_TYPE != "closed"
+    )
+
 
+def get_pr_context(
+    config: settings.Config, gh: github_client.GitHub
+) -> github.PullRequestContext | None:
+    """
+    None when the REST API should be used instead (see github.get_pr_context).
+    """
+    if not config.USE_GRAPHQL_API:
+        return None
+    return github.get_pr_context(
+        github=gh,
+        repository=config.GITHUB_REPOSITORY,
+        pr_number=config.GITHUB_PR_NUMBER,
+        # A push event cannot be initiated from a forked repository
+        owner=config.GITHUB_REPOSITORY.split("/")[0],
+        branch=config.GITHUB_BRANCH_NAME,
+    )
+
+
+def set_output(config: settings.Config, **kwargs: Any) -> None:
+    # Outputs of the subprojects are prefixed with their id
+    github.set_output(
+        github_output=config.GITHUB_OUTPUT,
+        **{f"{config.OUTPUT_PREFIX}{key}": value for key, value in kwargs.items()},
+    )
+
+
+def check_pr_or_branch(config: settings.Config) -> bool:
     if not config.GITHUB_PR_NUMBER and not config.GITHUB_BRANCH_NAME:
         log.info(
             "This worflow is not triggered on a pull_request event, "
             "nor on a push event on a branch. Consequently, there's nothing to do. "
             "Exiting."
         )
-        return 0
+        return False
+    return True
 
-    _, coverage = coverage_module.get_coverage_info(
-        merge=config.MERGE_COVERAGE_FILES,
-        coverage_path=config.COVERAGE_PATH,
-    )
-    base_ref = config.GITHUB_BASE_REF or repo_info.default_branch
 
-    failure_msg: str | None = None
+@tracing.span("diff")
+def get_diff(
+    config: settings.Config, gh: github_client.GitHub, base_ref: str
+) -> tuple[str, str | None]:
+    """
+    The diff of the PR (or of the branch), and the reason why it couldn't be
+    fetched, if it couldn't.
+    """
     try:
         if config.GITHUB_BRANCH_NAME:
             diff = github.get_branch_diff(
@@ -122,34 +193,221 @@ def process_pr(
     except github.CannotGetDiff as exc:
         failure_msg = str(exc)
         log.warning(failure_msg, exc_info=True)
-        diff = ""
+        return "", failure_msg
+    return diff, None
 
-    added_lines = coverage_module.get_added_lines(diff=diff)
-    diff_coverage = coverage_module.get_diff_coverage_info(
-        coverage=coverage, added_lines=added_lines
+
+def get_pr_number(
+    config: settings.Config,
+    gh: github_client.GitHub,
+    pr_context: github.PullRequestContext | None,
+) -> int | None:
+    pr_number: int | None = config.GITHUB_PR_NUMBER
+    if pr_number is None and pr_context:
+        pr_number = pr_context.pr_number
+    elif pr_number is None:
+        assert config.GITHUB_BRANCH_NAME is not None
+        # If we don't have a PR number, we're launched from a push event,
+        # so we need to find the PR number from the branch name
+        try:
+            pr_number = github.find_pr_for_branch(
+                github=gh,
+                # A push event cannot be initiated from a forked repository
+                repository=config.GITHUB_REPOSITORY,
+                owner=config.GITHUB_REPOSITORY.split("/")[0],
+                branch=config.GITHUB_BRANCH_NAME,
+            ).number
+        except github.CannotDeterminePR:
+            pr_number = None
+    return pr_number
+
+
+@tracing.span("previous coverage data")
+def get_previous_datafile(
+    config: settings.Config, gh: github_client.GitHub
+) -> files.Datafile | None:
+    """
+    The coverage of the commit the PR is based on is preferred to the latest
+    one, when there's a snapshot for it. Otherwise, with PREVIOUS_SUMMARY_ONLY,
+    the summary index is enough to compare with the latest coverage, and much
+    smaller than the data file. It's opt-in, as custom templates may use the
+    lines of the previous coverage of the files. Incremental analysis needs
+    the line numbers stored in the data file, though, and older data branches
+    don't have an index yet.
+    """
+    from coverage_comment import files, storage
+
+    if config.GITHUB_BASE_SHA and not config.INCREMENTAL_ANALYSIS:
+        snapshot = storage.get_snapshot_contents(
+            github=gh,
+            repository=config.GITHUB_REPOSITORY,
+            branch=config.FINAL_COVERAGE_DATA_BRANCH,
+            sha=config.GITHUB_BASE_SHA,
+        )
+        if snapshot:
+            datafile = files.load_summary_index(contents=snapshot)
+            if datafile:
+                log.info(f"Comparing with the coverage of {config.GITHUB_BASE_SHA}")
+                return datafile
+
+    if config.PREVIOUS_SUMMARY_ONLY and not config.INCREMENTAL_ANALYSIS:
+        summary_index = storage.get_summary_index_contents(
+            github=gh,
+            repository=config.GITHUB_REPOSITORY,
+            branch=config.FINAL_COVERAGE_DATA_BRANCH,
+        )
+        if summary_index:
+            datafile = files.load_summary_index(contents=summary_index)
+            if datafile:
+                return datafile
+
+    contents = storage.get_datafile_contents(
+        github=gh,
+        repository=config.GITHUB_REPOSITORY,
+        branch=config.FINAL_COVERAGE_DATA_BRANCH,
     )
+    if not contents:
+        return None
+    return files.load_datafile(contents=contents)
+
+
+@tracing.span("process_pr")
+def process_pr(
+    config: settings.Config,
+    gh: github_client.GitHub,
+    repo_info: github.RepositoryInfo,
+    pr_context: github.PullRequestContext | None = None,
+    added_lines: dict[pathlib.Path, list[int]] | None = None,
+    failure_msg: str | None = None,
+) -> int:
+    """
+    When processing several subprojects, the lines added by the PR (see
+    get_added_lines) and the PR context are fetched once and passed to each
+    of them.
+    """
+    log.info("Generating comment for PR")
+
+    if not check_pr_or_branch(config=config):
+        return 0
+
+    if added_lines is None:
+        added_lines, failure_msg = get_added_lines(
+            config=config, gh=gh, repo_info=repo_info
+        )
+
+    pr_number = get_pr_number(config=config, gh=gh, pr_context=pr_context)
+    marker = comment_file.get_marker(marker_id=config.SUBPROJECT_ID)
+
+    result = generate_pr_comment(
+        config=config,
+        gh=gh,
+        repo_info=repo_info,
+        added_lines=added_lines,
+        failure_msg=failure_msg,
+        pr_number=pr_number,
+        marker=marker,
+    )
+    if result is None:
+        return 1
+    comment, outputs = result
+
+    outputs["comment_file_written"] = post_or_store_comment(
+        config=config,
+        gh=gh,
+        pr_context=pr_context,
+        pr_number=pr_number,
+        comment=comment,
+        marker=marker,
+    )
+
+    set_output(config=config, activity_run="process_pr", **outputs)
+    return 0
+
+
+def get_added_lines(
+    config: settings.Config, gh: github_client.GitHub, repo_info: github.RepositoryInfo
+) -> tuple[dict[pathlib.Path, list[int]], str | None]:
+    """
+    The lines added by the PR (or the branch), for each file, and the reason
+    why the diff couldn't be fetched, if it couldn't.
+    """
+    from coverage_comment import coverage as coverage_module
+
+    base_ref = config.GITHUB_BASE_REF or repo_info.default_branch
+    diff, failure_msg = get_diff(config=config, gh=gh, base_ref=base_ref)
+    return coverage_module.get_added_lines(diff=diff), failure_msg
+
+
+def generate_pr_comment(
+    config: settings.Config,
+    gh: github_client.GitHub,
+    repo_info: github.RepositoryInfo,
+    added_lines: dict[pathlib.Path, list[int]],
+    failure_msg: str | None,
+    pr_number: int | None,
+    marker: str,
+) -> tuple[str, dict[str, str | bool]] | None:
+    """
+    Compute the coverage of the PR, and return the comment to post along with
+    the outputs of the action. Also writes the job summary and the
+    annotations. None if the comment couldn't be rendered.
+    """
+    from coverage_comment import coverage as coverage_module
+    from coverage_comment import diff_grouper, template
+
+    if config.MERGE_COVERAGE_FILES:
+        coverage_module.merge_coverage_files(
+            coverage_path=config.COVERAGE_PATH,
+            workers=config.MERGE_COVERAGE_WORKERS,
+            cache=config.MERGE_COVERAGE_CACHE,
+        )
+    base_ref = config.GITHUB_BASE_REF or repo_info.default_branch
+
     # It only really makes sense to display a comparison with the previous
     # coverage if the PR target is the branch in which the coverage data is
     # stored, e.g. the default branch.
     # In the case we're running on a branch without a PR yet, we can't know
     # if it's going to target the default branch, so we display it.
-    previous_coverage_data_file = None
     pr_targets_default_branch = base_ref == repo_info.default_branch
-
+    previous_datafile = None
     if pr_targets_default_branch:
-        previous_coverage_data_file = storage.get_datafile_contents(
-            github=gh,
-            repository=config.GITHUB_REPOSITORY,
-            branch=config.FINAL_COVERAGE_DATA_BRANCH,
-        )
+        previous_datafile = get_previous_datafile(config=config, gh=gh)
 
     previous_coverage, previous_coverage_rate = None, None
-    if previous_coverage_data_file:
-        previous_coverage, previous_coverage_rate = files.parse_datafile(
-            contents=previous_coverage_data_file
+    if previous_datafile:
+        previous_coverage = previous_datafile.coverage
+        previous_coverage_rate = previous_datafile.coverage_rate
+
+    coverage = None
+    if (
+        config.INCREMENTAL_ANALYSIS
+        and previous_coverage
+        and previous_datafile
+        and previous_datafile.fingerprints
+    ):
+        coverage = coverage_module.get_incremental_coverage_info(
+            coverage_path=config.COVERAGE_PATH,
+            previous_coverage=previous_coverage,
+            previous_fingerprints=previous_datafile.fingerprints,
+            added_files=added_lines.keys(),
+            repository_path=config.REPOSITORY_COVERAGE_PATH,
+        )
+    if coverage is None:
+        keep_file = None
+        if config.DIFF_ONLY:
+            keep_file = coverage_module.get_diff_only_filter(
+                added_lines=added_lines.keys(), previous_coverage=previous_coverage
+            )
+        coverage = coverage_module.get_coverage(
+            coverage_path=config.COVERAGE_PATH,
+            workers=config.ANALYSIS_WORKERS,
+            keep_file=keep_file,
+            repository_path=config.REPOSITORY_COVERAGE_PATH,
         )
 
-    marker = template.get_marker(marker_id=config.SUBPROJECT_ID)
+    diff_coverage = coverage_module.get_diff_coverage_info(
+        coverage=coverage, added_lines=added_lines
+    )
 
     files_info, count_files = template.select_files(
         coverage=coverage,
@@ -157,22 +415,7 @@ def process_pr(
         previous_coverage=previous_coverage,
         max_files=config.MAX_FILES_IN_COMMENT,
     )
-    pr_number: int | None = config.GITHUB_PR_NUMBER
     branch: str | None = config.GITHUB_BRANCH_NAME
-    if pr_number is None:
-        assert branch is not None
-        # If we don't have a PR number, we're launched from a push event,
-        # so we need to find the PR number from the branch name
-        try:
-            pr_number = github.find_pr_for_branch(
-                github=gh,
-                # A push event cannot be initiated from a forked repository
-                repository=config.GITHUB_REPOSITORY,
-                owner=config.GITHUB_REPOSITORY.split("/")[0],
-                branch=branch,
-            )
-        except github.CannotDeterminePR:
-            pr_number = None
 
     try:
         comment = template.get_comment_markdown(
@@ -195,6 +438,7 @@ def process_pr(
             marker=marker,
             subproject_id=config.SUBPROJECT_ID,
             failure_msg=failure_msg,
+            coverage_history=previous_datafile.history if previous_datafile else None,
         )
         # Same as above except `max_files` is None
         summary_comment = template.get_comment_markdown(
@@ -217,6 +461,7 @@ def process_pr(
             marker=marker,
             subproject_id=config.SUBPROJECT_ID,
             failure_msg=failure_msg,
+            coverage_history=previous_datafile.history if previous_datafile else None,
         )
     except template.MissingMarker:
         log.error(
@@ -226,14 +471,14 @@ def process_pr(
             "its own comment and avoid making new comments or overwriting someone else's "
             "comment."
         )
-        return 1
+        return None
     except template.TemplateError:
         log.exception(
             "There was a rendering error when computing the text of the comment to post "
             "on the PR. Please see the traceback, in particular if you're using a custom "
             "template."
         )
-        return 1
+        return None
 
     github.add_job_summary(
         content=summary_comment, github_step_summary=config.GITHUB_STEP_SUMMARY
@@ -251,7 +496,7 @@ def process_pr(
             ],
         )
 
-    outputs: dict[str, str | bool] = {"activity_run": "process_pr"}
+    outputs: dict[str, str | bool] = {}
     outputs |= coverage_module.as_output(obj=coverage.info, prefix="new")
     outputs |= coverage_module.as_output(obj=diff_coverage, prefix="diff")
     if previous_coverage:
@@ -259,17 +504,33 @@ def process_pr(
             obj=previous_coverage.info, prefix="reference"
         )
 
+    return comment, outputs
+
+
+def post_or_store_comment(
+    config: settings.Config,
+    gh: github_client.GitHub,
+    pr_context: github.PullRequestContext | None,
+    pr_number: int | None,
+    comment: str,
+    marker: str,
+) -> bool:
+    """
+    Post the comment on the PR, or store it in a file for a later
+    `workflow_run` to post it. Returns whether the file was written.
+    """
     try:
         if config.FORCE_WORKFLOW_RUN or not pr_number:
             raise github.CannotPostComment
 
         github.post_comment(
             github=gh,
-            me=github.get_my_login(github=gh),
+            me=pr_context.me if pr_context else github.get_my_login(github=gh),
             repository=config.GITHUB_REPOSITORY,
             pr_number=pr_number,
             contents=comment,
             marker=marker,
+            comments=pr_context.comments if pr_context else None,
         )
     except github.CannotPostComment:
         log.debug("Exception when posting comment", exc_info=True)
@@ -283,19 +544,119 @@ def process_pr(
             filename=config.FINAL_COMMENT_FILENAME,
             content=comment,
         )
-        outputs["comment_file_written"] = True
         log.debug("Comment stored locally on disk")
+        return True
     else:
-        outputs["comment_file_written"] = False
         log.debug("Comment not generated")
+        return False
 
-    github.set_output(
-        github_output=config.GITHUB_OUTPUT,
-        **outputs,
+
+@tracing.span("process_subprojects_pr")
+def process_subprojects_pr(
+    config: settings.Config,
+    gh: github_client.GitHub,
+    repo_info: github.RepositoryInfo,
+    pr_context: github.PullRequestContext | None = None,
+) -> int:
+    """
+    Process each subproject in parallel, sharing the lines added by the PR,
+    the PR number and the PR comments. With COMBINED_COMMENT, a single comment
+    holds a section per subproject.
+    """
+    from coverage_comment import template
+
+    if not check_pr_or_branch(config=config):
+        return 0
+
+    added_lines, failure_msg = get_added_lines(
+        config=config, gh=gh, repo_info=repo_info
+    )
+
+    if pr_context is None:
+        pr_number = get_pr_number(config=config, gh=gh, pr_context=None)
+        comments = []
+        if pr_number and not config.FORCE_WORKFLOW_RUN:
+            comments = github.list_comments(
+                github=gh, repository=config.GITHUB_REPOSITORY, pr_number=pr_number
+            )
+        pr_context = github.PullRequestContext(
+            repo_info=repo_info,
+            me=github.get_my_login(github=gh),
+            pr_number=pr_number,
+            comments=comments,
+        )
+
+    if not config.COMBINED_COMMENT:
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            exit_codes = list(
+                executor.map(
+                    tracing.in_current_context(
+                        functools.partial(
+                            process_pr,
+                            gh=gh,
+                            repo_info=repo_info,
+                            pr_context=pr_context,
+                            added_lines=added_lines,
+                            failure_msg=failure_msg,
+                        )
+                    ),
+                    config.SUBPROJECT_CONFIGS,
+                )
+            )
+
+        set_output(config=config, activity_run="process_pr")
+        return max(exit_codes)
+
+    pr_number = get_pr_number(config=config, gh=gh, pr_context=pr_context)
+    configs = config.SUBPROJECT_CONFIGS
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        results = list(
+            executor.map(
+                tracing.in_current_context(
+                    functools.partial(
+                        generate_pr_comment,
+                        gh=gh,
+                        repo_info=repo_info,
+                        added_lines=added_lines,
+                        failure_msg=failure_msg,
+                        pr_number=pr_number,
+                        # The combined comment holds a single marker
+                        marker="",
+                    )
+                ),
+                configs,
+            )
+        )
+
+    sections: list[str] = []
+    for sub_config, result in zip(configs, results):
+        if result is None:
+            return 1
+        section, outputs = result
+        sections.append(section)
+        set_output(config=sub_config, **outputs)
+
+    marker = comment_file.get_marker(marker_id=config.SUBPROJECT_ID)
+    comment_file_written = post_or_store_comment(
+        config=config,
+        gh=gh,
+        pr_context=pr_context,
+        pr_number=pr_number,
+        comment=template.get_combined_comment_markdown(
+            sections=sections, marker=marker
+        ),
+        marker=marker,
+    )
+
+    set_output(
+        config=config,
+        activity_run="process_pr",
+        comment_file_written=comment_file_written,
     )
     return 0
 
 
+@tracing.span("post_comment")
 def post_comment(
     config: settings.Config,
     gh: github_client.GitHub,
@@ -306,20 +667,38 @@ def post_comment(
         log.error("Missing input GITHUB_PR_RUN_ID. Please consult the documentation.")
         return 1
 
-    me = github.get_my_login(github=gh)
     log.info(f"Search for PR associated with run id {config.GITHUB_PR_RUN_ID}")
-    owner, branch = github.get_branch_from_workflow_run(
+    run = github.get_workflow_run(
         github=gh,
         run_id=config.GITHUB_PR_RUN_ID,
         repository=config.GITHUB_REPOSITORY,
     )
-    try:
-        pr_number = github.find_pr_for_branch(
+    pr_context = None
+    if config.USE_GRAPHQL_API:
+        pr_context = github.get_pr_context(
             github=gh,
             repository=config.GITHUB_REPOSITORY,
-            owner=owner,
-            branch=branch,
+            owner=run.owner,
+            branch=run.branch,
         )
+
+    try:
+        if pr_context:
+            me = pr_context.me
+            if pr_context.pr_number is None:
+                raise github.CannotDeterminePR(f"No PR found for branch {run.branch}")
+            pr_number = pr_context.pr_number
+            head_sha = pr_context.head_sha
+        else:
+            me = github.get_my_login(github=gh)
+            pr = github.find_pr_for_branch(
+                github=gh,
+                repository=config.GITHUB_REPOSITORY,
+                owner=run.owner,
+                branch=run.branch,
+            )
+            pr_number = pr.number
+            head_sha = pr.head_sha
     except github.CannotDeterminePR:
         log.error(
             "The PR cannot be found. That's strange. Please open an "
@@ -329,15 +708,33 @@ def post_comment(
         return 1
 
     log.info(f"PR number: {pr_number}")
+    # When several runs finish out of order, an older run must not overwrite
+    # the comment of a newer one.
+    if head_sha and head_sha != run.head_sha:
+        log.info(
+            f"The workflow run is for commit {run.head_sha}, but the PR is now at "
+            f"{head_sha}. Not posting an outdated comment."
+        )
+        return 0
+
     log.info("Download associated artifacts")
+    # With subprojects, a single artifact holds the comment files of all of
+    # them, unless they share a combined comment
+    configs = [config]
+    if config.SUBPROJECTS and not config.COMBINED_COMMENT:
+        configs = config.SUBPROJECT_CONFIGS
     try:
-        comment = github.download_artifact(
+        comments = github.download_artifact_files(
             github=gh,
             repository=config.GITHUB_REPOSITORY,
             artifact_name=config.COMMENT_ARTIFACT_NAME,
             run_id=config.GITHUB_PR_RUN_ID,
-            filename=config.FINAL_COMMENT_FILENAME,
+            filenames=[sub_config.FINAL_COMMENT_FILENAME for sub_config in configs],
         )
+        if not comments:
+            raise github.NoArtifact(
+                f"No comment file found in artifact {config.COMMENT_ARTIFACT_NAME}"
+            )
     except github.NoArtifact:
         log.info(
             "Artifact was not found, which is probably because it was probably "
@@ -345,49 +742,147 @@ def post_comment(
             exc_info=True,
         )
         return 0
-    log.info("Comment file found in artifact, posting to PR")
-    github.post_comment(
-        github=gh,
-        me=me,
-        repository=config.GITHUB_REPOSITORY,
-        pr_number=pr_number,
-        contents=comment,
-        marker=template.get_marker(marker_id=config.SUBPROJECT_ID),
-    )
-    log.info("Comment posted in PR")
 
-    github.set_output(github_output=config.GITHUB_OUTPUT, activity_run="post_comment")
+    existing_comments = pr_context.comments if pr_context else None
+    if existing_comments is None and len(configs) > 1:
+        existing_comments = github.list_comments(
+            github=gh, repository=config.GITHUB_REPOSITORY, pr_number=pr_number
+        )
+
+    for sub_config in configs:
+        comment = comments.get(sub_config.FINAL_COMMENT_FILENAME)
+        if comment is None:
+            log.info(f"No comment file for subproject {sub_config.SUBPROJECT_ID}")
+            continue
+        log.info("Comment file found in artifact, posting to PR")
+        github.post_comment(
+            github=gh,
+            me=me,
+            repository=config.GITHUB_REPOSITORY,
+            pr_number=pr_number,
+            contents=comment,
+            marker=comment_file.get_marker(marker_id=sub_config.SUBPROJECT_ID),
+            comments=existing_comments,
+        )
+        log.info("Comment posted in PR")
+
+    set_output(config=config, activity_run="post_comment")
     return 0
 
 
+@tracing.span("save_coverage_data_files")
 def save_coverage_data_files(
     config: settings.Config,
+    gh: github_client.GitHub,
+    git: subprocess.Git,
+    http_session: httpx.Client,
+    repo_info: github.RepositoryInfo,
+) -> int:
+    from coverage_comment import storage
+
+    prepared = prepare_coverage_data_files(
+        config=config, gh=gh, http_session=http_session, repo_info=repo_info
+    )
+    if prepared:
+        operations, log_message = prepared
+        storage.commit_operations(
+            operations=operations,
+            git=git,
+            branch=config.FINAL_COVERAGE_DATA_BRANCH,
+            token=config.GITHUB_TOKEN,
+        )
+
+        log.info(log_message)
+
+    set_output(config=config, activity_run="save_coverage_data_files")
+
+    return 0
+
+
+@tracing.span("save_coverage_data_files")
+def save_subprojects_coverage_data_files(
+    config: settings.Config,
+    gh: github_client.GitHub,
     git: subprocess.Git,
     http_session: httpx.Client,
     repo_info: github.RepositoryInfo,
 ) -> int:
+    """
+    Compute the files of each subproject in parallel, then commit them on
+    their data branches, with a single fetch and a single push.
+    """
+    from coverage_comment import storage
+
+    configs = config.SUBPROJECT_CONFIGS
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        prepared = list(
+            executor.map(
+                tracing.in_current_context(
+                    functools.partial(
+                        prepare_coverage_data_files,
+                        gh=gh,
+                        http_session=http_session,
+                        repo_info=repo_info,
+                    )
+                ),
+                configs,
+            )
+        )
+
+    operations_by_branch: dict[str, list[files.Operation]] = {}
+    log_messages: list[str] = []
+    for sub_config, sub_prepared in zip(configs, prepared):
+        if sub_prepared:
+            operations, log_message = sub_prepared
+            operations_by_branch[sub_config.FINAL_COVERAGE_DATA_BRANCH] = operations
+            log_messages.append(log_message)
+
+    if operations_by_branch:
+        storage.commit_operations_on_branches(
+            operations_by_branch=operations_by_branch,
+            git=git,
+            token=config.GITHUB_TOKEN,
+        )
+
+    for log_message in log_messages:
+        log.info(log_message)
+
+    set_output(config=config, activity_run="save_coverage_data_files")
+
+    return 0
+
+
+def prepare_coverage_data_files(
+    config: settings.Config,
+    gh: github_client.GitHub,
+    http_session: httpx.Client,
+    repo_info: github.RepositoryInfo,
+) -> tuple[list[files.Operation], str] | None:
+    """
+    The operations storing the coverage data files on the data branch, and
+    the message to log once they're saved. None if the coverage data didn't
+    change since it was last saved.
+    """
+    from coverage_comment import communication, files, storage
+    from coverage_comment import coverage as coverage_module
+
     log.info("Computing coverage files & badge")
 
     raw_coverage_data, coverage = coverage_module.get_coverage_info(
         merge=config.MERGE_COVERAGE_FILES,
         coverage_path=config.COVERAGE_PATH,
+        merge_workers=config.MERGE_COVERAGE_WORKERS,
+        merge_cache=config.MERGE_COVERAGE_CACHE,
+        analysis_workers=config.ANALYSIS_WORKERS,
     )
 
-    operations: list[files.Operation] = files.compute_files(
-        line_rate=coverage.info.percent_covered,
-        raw_coverage_data=raw_coverage_data,
-        coverage_path=config.COVERAGE_PATH,
-        minimum_green=config.MINIMUM_GREEN,
-        minimum_orange=config.MINIMUM_ORANGE,
-        http_session=http_session,
+    # The fingerprints are also part of the content hash
+    fingerprints = coverage_module.compute_fingerprints(
+        coverage_path=config.COVERAGE_PATH
     )
 
     is_public = repo_info.is_public()
-    if is_public:
-        log.info("Generating HTML coverage report")
-        operations.append(
-            files.get_coverage_html_files(coverage_path=config.COVERAGE_PATH)
-        )
+    github_host = github.extract_github_host(config.GITHUB_BASE_URL)
 
     markdown_report = coverage_module.generate_coverage_markdown(
         coverage_path=config.COVERAGE_PATH
@@ -398,7 +893,61 @@ def save_coverage_data_files(
         github_step_summary=config.GITHUB_STEP_SUMMARY,
     )
 
-    github_host = github.extract_github_host(config.GITHUB_BASE_URL)
+    content_hash = files.compute_content_hash(
+        raw_coverage_data=raw_coverage_data,
+        fingerprints=fingerprints,
+        settings={
+            "coverage_path": str(config.COVERAGE_PATH),
+            "minimum_green": str(config.MINIMUM_GREEN),
+            "minimum_orange": str(config.MINIMUM_ORANGE),
+            "incremental_analysis": config.INCREMENTAL_ANALYSIS,
+            "is_public": is_public,
+            "github_host": github_host,
+            "repository": config.GITHUB_REPOSITORY,
+            "branch": config.FINAL_COVERAGE_DATA_BRANCH,
+            "use_gh_pages_html_url": config.USE_GH_PAGES_HTML_URL,
+            "subproject_id": config.SUBPROJECT_ID,
+        },
+    )
+    if content_hash and content_hash == storage.get_content_hash(
+        github=gh,
+        repository=config.GITHUB_REPOSITORY,
+        branch=config.FINAL_COVERAGE_DATA_BRANCH,
+    ):
+        return prepare_snapshot(config=config, gh=gh)
+
+    history = files.append_history(
+        contents=storage.get_history_contents(
+            github=gh,
+            repository=config.GITHUB_REPOSITORY,
+            branch=config.FINAL_COVERAGE_DATA_BRANCH,
+        ),
+        entry=files.HistoryEntry.from_coverage(
+            sha=config.GITHUB_SHA,
+            raw_coverage_data=raw_coverage_data,
+            line_rate=coverage.info.percent_covered,
+        ),
+    )
+
+    with tracing.span("compute files"):
+        operations: list[files.Operation] = files.compute_files(
+            line_rate=coverage.info.percent_covered,
+            raw_coverage_data=raw_coverage_data,
+            coverage_path=config.COVERAGE_PATH,
+            minimum_green=config.MINIMUM_GREEN,
+            minimum_orange=config.MINIMUM_ORANGE,
+            http_session=http_session,
+            fingerprints=fingerprints if config.INCREMENTAL_ANALYSIS else None,
+            history=history,
+            sha=config.GITHUB_SHA,
+        )
+
+    if is_public:
+        log.info("Generating HTML coverage report")
+        operations.append(
+            files.get_coverage_html_files(coverage_path=config.COVERAGE_PATH)
+        )
+
     url_getter = functools.partial(
         storage.get_raw_file_url,
         github_host=github_host,
@@ -426,23 +975,53 @@ def save_coverage_data_files(
         subproject_id=config.SUBPROJECT_ID,
     )
     operations.append(readme_file)
-    storage.commit_operations(
-        operations=operations,
-        git=git,
-        branch=config.FINAL_COVERAGE_DATA_BRANCH,
-        token=config.GITHUB_TOKEN,
-    )
+    if content_hash:
+        operations.append(
+            files.WriteFile(path=files.CONTENT_HASH_PATH, contents=content_hash)
+        )
+    return operations, log_message
 
-    log.info(log_message)
 
-    github.set_output(
-        github_output=config.GITHUB_OUTPUT, activity_run="save_coverage_data_files"
+def prepare_snapshot(
+    config: settings.Config, gh: github_client.GitHub
+) -> tuple[list[files.Operation], str] | None:
+    """
+    When the coverage data didn't change, a new commit still needs its
+    snapshot, for the PRs based on it. The summary index on the data branch
+    has the same coverage, so it's copied as is.
+    """
+    from coverage_comment import files, storage
+
+    log.info("Coverage data didn't change since it was last saved, skipping.")
+    if not config.GITHUB_SHA or storage.get_snapshot_contents(
+        github=gh,
+        repository=config.GITHUB_REPOSITORY,
+        branch=config.FINAL_COVERAGE_DATA_BRANCH,
+        sha=config.GITHUB_SHA,
+    ):
+        return None
+
+    summary_index = storage.get_summary_index_contents(
+        github=gh,
+        repository=config.GITHUB_REPOSITORY,
+        branch=config.FINAL_COVERAGE_DATA_BRANCH,
+    )
+    if not summary_index:
+        return None
+    return (
+        [files.WriteSnapshot(sha=config.GITHUB_SHA, contents=summary_index)],
+        f"Saved the coverage snapshot of {config.GITHUB_SHA}",
     )
 
-    return 0
 
+def main(_action: Any = action, argv: list[str] | None = None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["serve"]:
+        from coverage_comment import serve
+
+        serve.main(action=_action, argv=argv[1:])
+        return
 
-def main(_action: Any = action):
     config = None
     try:
         logging.basicConfig(level="DEBUG")
@@ -453,13 +1032,30 @@ def main(_action: Any = action):
 
         git = subprocess.Git()
 
+        recorder = tracing.RequestRecorder()
+        span_recorder = tracing.SpanRecorder(origin=recorder.origin)
+        profile = cProfile.Profile() if config.PROFILE else None
+
+        def transport() -> httpx.BaseTransport:
+            # When given a transport, httpx ignores the http2 and limits
+            # parameters of the client
+            return tracing.RecordingTransport(
+                transport=httpx.HTTPTransport(
+                    http2=config.HTTP2, limits=config.HTTP_LIMITS
+                ),
+                recorder=recorder,
+            )
+
         with (
             httpx.Client(
                 base_url=config.GITHUB_BASE_URL,
                 follow_redirects=True,
                 headers={"Authorization": f"token {config.GITHUB_TOKEN}"},
+                transport=transport(),
             ) as github_session,
-            httpx.Client() as http_session,
+            httpx.Client(transport=transport()) as http_session,
+            tracing.recording_spans(span_recorder),
+            profile or contextlib.nullcontext(),
         ):
             exit_code = _action(
                 config=config,
@@ -468,6 +1064,20 @@ def main(_action: Any = action):
                 git=git,
             )
 
+        tracing.report(
+            recorder=recorder,
+            span_recorder=span_recorder,
+            github_step_summary=config.GITHUB_STEP_SUMMARY,
+            trace_file=config.FINAL_TRACE_FILE,
+        )
+        if profile and config.PROFILE_FILE:
+            profile.dump_stats(config.PROFILE_FILE)
+            set_output(
+                config=config,
+                profile_file=str(config.PROFILE_FILE),
+                trace_file=str(config.FINAL_TRACE_FILE),
+            )
+
         log.info("Ending action")
         raise SystemExit(exit_code)
 
@@ -0,0 +1,387 @@
+"""
+A long-running service running the action for many repositories, without
+starting a container for each run. It keeps warm, from one job to the next:
+the HTTP connection pools, the ETag cache of the GitHub API responses (see
+github_client.CachingTransport), and the compiled templates.
+
+POST /jobs with a JSON payload:
+
+    {
+        "workspace": "<directory of the checkout, below the working directory>",
+        "env": {"GITHUB_REPOSITORY": "owner/repo", "ACTIVITY": "process_pr", ...}
+    }
+
+`env` holds the settings of the action, as environment variables. Paths are
+relative to the workspace, and can't point outside of it (except
+`COMMENT_FILENAME` when posting the comment: it's a name within the artifact).
+Only the `process_pr` and `post_comment` activities are supported:
+`save_coverage_data_files` checks out the data branch in the working directory.
+
+The workspace is expected on disk: the coverage data files aren't enough to
+compute the coverage, `coverage json` reads the sources too. Fetching the
+checkout is left to whatever submits the jobs.
+
+The job is queued (202) and its status can be followed at GET /jobs/<id>.
+"""
+
+from __future__ import annotations
+
+import argparse
+import collections
+import concurrent.futures
+import dataclasses
+import http
+import http.server
+import json
+import logging
+import pathlib
+import threading
+import time
+import uuid
+from collections.abc import Callable, Iterable
+from typing import Any, cast, override
+
+import httpx
+
+from coverage_comment import (
+    activities,
+    github_client,
+    log,
+    settings,
+    subprocess,
+)
+
+SUPPORTED_ACTIVITIES = {
+    activities.Activity.PROCESS_PR.value,
+    activities.Activity.POST_COMMENT.value,
+}
+# Settings holding paths, which are relative to the workspace of the job
+WORKSPACE_PATH_SETTINGS = [
+    "COVERAGE_PATH",
+    "COMMENT_FILENAME",
+    "GITHUB_EVENT_PATH",
+    "GITHUB_OUTPUT",
+    "GITHUB_STEP_SUMMARY",
+]
+DEFAULT_JOB_ENVIRON = {
+    "COVERAGE_PATH": str(settings.Config.COVERAGE_PATH),
+    "COMMENT_FILENAME": str(settings.Config.COMMENT_FILENAME),
+    "GITHUB_OUTPUT": "coverage-comment-output.txt",
+    "GITHUB_STEP_SUMMARY": "coverage-comment-summary.md",
+}
+# Number of finished jobs whose status is kept
+MAX_FINISHED_JOBS = 1000
+
+
+class InvalidJob(Exception):
+    pass
+
+
+class QueueFull(Exception):
+    pass
+
+
+@dataclasses.dataclass(kw_only=True)
+class Job:
+    id: str
+    config: settings.Config
+    status: str = "queued"
+    exit_code: int | None = None
+    duration: float | None = None
+    superseded_by: str | None = None
+
+    def as_json(self) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "exit_code": self.exit_code,
+            "duration": self.duration,
+            "superseded_by": self.superseded_by,
+        }
+
+
+def get_coalescing_key(config: settings.Config) -> tuple[Any, ...] | None:
+    """
+    A queued job is superseded by a newer job with the same key: only the
+    latest commit of a PR (or branch) needs to be processed. Comments are
+    posted for a workflow run, which doesn't tell the PR: they're never
+    coalesced.
+    """
+    if config.ACTIVITY != activities.Activity.PROCESS_PR:
+        return None
+    return (
+        config.GITHUB_REPOSITORY,
+        config.FINAL_COVERAGE_DATA_BRANCH,
+        config.GITHUB_PR_NUMBER,
+        config.GITHUB_BRANCH_NAME,
+    )
+
+
+def path_in_workspace(workspace: pathlib.Path, key: str, path: str) -> pathlib.Path:
+    """
+    The settings come from the job, which isn't trusted: they can't write (or
+    read) files of the server, or of the other jobs.
+    """
+    joined = workspace / path
+    if not joined.resolve().is_relative_to(workspace.resolve()):
+        raise InvalidJob(f"`env.{key}` needs to be relative and below the workspace")
+    return joined
+
+
+def get_job_environ(workspace: pathlib.Path, environ: dict[str, str]) -> dict[str, str]:
+    environ = DEFAULT_JOB_ENVIRON | environ | {"WORKSPACE": str(workspace)}
+    for key in WORKSPACE_PATH_SETTINGS:
+        # When posting, the comment file is a name within the artifact
+        if (
+            key == "COMMENT_FILENAME"
+            and environ.get("ACTIVITY") == activities.Activity.POST_COMMENT.value
+        ):
+            continue
+        if environ.get(key):
+            environ[key] = str(
+                path_in_workspace(workspace=workspace, key=key, path=environ[key])
+            )
+    if environ.get("SUBPROJECTS"):
+        lines: list[str] = []
+        for line in environ["SUBPROJECTS"].splitlines():
+            subproject_id, separator, path = line.partition(":")
+            if separator:
+                subproject_path = path_in_workspace(
+                    workspace=workspace, key="SUBPROJECTS", path=path.strip() or "."
+                )
+                line = f"{subproject_id}:{subproject_path}"
+            lines.append(line)
+        environ["SUBPROJECTS"] = "\n".join(lines)
+    return environ
+
+
+def parse_job(payload: Any) -> settings.Config:
+    if not isinstance(payload, dict):
+        raise InvalidJob("Expected a JSON object")
+    job = cast(dict[str, Any], payload)
+    env = job.get("env")
+    if not isinstance(env, dict) or not all(
+        isinstance(value, str) for value in cast(dict[str, Any], env).values()
+    ):
+        raise InvalidJob("`env` should be an object of strings")
+    environ = cast(dict[str, str], env)
+    if environ.get("ACTIVITY") not in SUPPORTED_ACTIVITIES:
+        raise InvalidJob(
+            f"`env.ACTIVITY` should be one of {', '.join(sorted(SUPPORTED_ACTIVITIES))}"
+        )
+
+    workspace = job.get("workspace", ".")
+    if not isinstance(workspace, str):
+        raise InvalidJob("`workspace` should be a string")
+
+    try:
+        workspace = settings.path_below(workspace)
+        return settings.Config.from_environ(
+            environ=get_job_environ(workspace=workspace, environ=environ)
+        )
+    except (ValueError, settings.MissingEnvironmentVariable) as exc:
+        raise InvalidJob(str(exc)) from exc
+
+
+class Service:
+    """
+    Runs the jobs in a bounded pool of threads, sharing one HTTP transport.
+    At most `queue_size` jobs wait for a thread in `queue`, in the order they
+    were submitted, the others are refused.
+
+    Jobs don't need to be serialized: the supported activities don't write
+    to the data branch.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        queue_size: int,
+        action: Callable[..., int],
+        transport: httpx.BaseTransport | None = None,
+    ):
+        # `main.action`, passed by the caller: the main module imports this one
+        self.action: Callable[..., int] = action
+        self.transport: httpx.BaseTransport = github_client.CachingTransport(
+            transport=transport
+            or httpx.HTTPTransport(
+                http2=settings.Config.HTTP2,
+                limits=httpx.Limits(
+                    max_connections=settings.Config.HTTP_MAX_CONNECTIONS * workers,
+                    max_keepalive_connections=settings.Config.HTTP_MAX_KEEPALIVE_CONNECTIONS
+                    * workers,
+                    keepalive_expiry=settings.Config.HTTP_KEEPALIVE_EXPIRY,
+                ),
+            )
+        )
+        self.executor: concurrent.futures.ThreadPoolExecutor = (
+            concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        )
+        # Running and queued jobs
+        self.slots: threading.BoundedSemaphore = threading.BoundedSemaphore(
+            workers + queue_size
+        )
+        self.jobs: collections.OrderedDict[str, Job] = collections.OrderedDict()
+        # Jobs waiting for a thread. Each one has a call to `run_next` waiting
+        # in the executor, which runs the first job of the queue.
+        self.queue: collections.deque[Job] = collections.deque()
+        self.closing: bool = False
+        self.lock: threading.Lock = threading.Lock()
+
+    def submit(self, config: settings.Config) -> Job:
+        job = Job(id=uuid.uuid4().hex, config=config)
+        with self.lock:
+            superseded = self.find_superseded(pending=self.queue, config=config)
+            if superseded:
+                # The new job takes the place (and the slot) of the old one
+                self.queue[self.queue.index(superseded)] = job
+                superseded.status = "superseded"
+                superseded.superseded_by = job.id
+                log.info(f"Job {superseded.id}: superseded by {job.id}")
+            elif not self.slots.acquire(blocking=False):
+                raise QueueFull
+            else:
+                self.queue.append(job)
+                self.executor.submit(self.run_next)
+
+            self.jobs[job.id] = job
+            finished = [
+                job_id
+                for job_id, other in self.jobs.items()
+                if other.status in {"done", "failed", "superseded"}
+            ]
+            for job_id in finished[: max(0, len(finished) - MAX_FINISHED_JOBS)]:
+                del self.jobs[job_id]
+        return job
+
+    def find_superseded(
+        self, pending: Iterable[Job], config: settings.Config
+    ) -> Job | None:
+        coalescing_key = get_coalescing_key(config)
+        if coalescing_key is None:
+            return None
+        for job in pending:
+            if get_coalescing_key(job.config) == coalescing_key:
+                return job
+        return None
+
+    def get(self, job_id: str) -> Job | None:
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def run_next(self) -> None:
+        with self.lock:
+            if self.closing:
+                return
+            job = self.queue.popleft()
+            job.status = "running"
+        self.run(job)
+
+    def run(self, job: Job) -> None:
+        config = job.config
+        log.info(f"Job {job.id}: running on {config.GITHUB_REPOSITORY}")
+        start = time.perf_counter()
+        # The clients are not closed: that would close the shared transport
+        github_session = httpx.Client(
+            base_url=config.GITHUB_BASE_URL,
+            follow_redirects=True,
+            headers={"Authorization": f"token {config.GITHUB_TOKEN}"},
+            transport=self.transport,
+        )
+        http_session = httpx.Client(transport=self.transport)
+        try:
+            job.exit_code = self.action(
+                config=config,
+                github_session=github_session,
+                http_session=http_session,
+                git=subprocess.Git(),
+            )
+        # A failing job must not take the worker down
+        except Exception:  # noqa: BLE001
+            log.exception(f"Job {job.id} failed")
+            job.exit_code = 1
+        finally:
+            job.duration = time.perf_counter() - start
+            job.status = "done" if job.exit_code == 0 else "failed"
+            self.slots.release()
+            log.info(f"Job {job.id}: {job.status} in {job.duration:.1f}s")
+
+    def close(self) -> None:
+        with self.lock:
+            self.closing = True
+        self.executor.shutdown(wait=True)
+        self.transport.close()
+
+
+class JobServer(http.server.ThreadingHTTPServer):
+    def __init__(self, address: tuple[str, int], service: Service):
+        self.service: Service = service
+        super().__init__(address, JobHandler)
+
+
+class JobHandler(http.server.BaseHTTPRequestHandler):
+    @property
+    def service(self) -> Service:
+        return cast(JobServer, self.server).service
+
+    def send_json(self, status: http.HTTPStatus, body: dict[str, Any]) -> None:
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_POST(self) -> None:
+        if self.path != "/jobs":
+            self.send_json(http.HTTPStatus.NOT_FOUND, {"error": "Not found"})
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            config = parse_job(json.loads(self.rfile.read(length) or b"null"))
+        except (ValueError, InvalidJob) as exc:
+            self.send_json(http.HTTPStatus.BAD_REQUEST, {"error": str(exc)})
+            return
+
+        try:
+            job = self.service.submit(config)
+        except QueueFull:
+            self.send_json(
+                http.HTTPStatus.SERVICE_UNAVAILABLE, {"error": "Too many jobs queued"}
+            )
+            return
+        self.send_json(http.HTTPStatus.ACCEPTED, job.as_json())
+
+    def do_GET(self) -> None:
+        job_id = self.path.removeprefix("/jobs/")
+        job = self.service.get(job_id) if job_id != self.path else None
+        if job is None:
+            self.send_json(http.HTTPStatus.NOT_FOUND, {"error": "Not found"})
+            return
+        self.send_json(http.HTTPStatus.OK, job.as_json())
+
+    @override
+    def log_message(self, format: str, *args: Any) -> None:
+        log.debug(format % args)
+
+
+def main(action: Callable[..., int], argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="coverage_comment serve")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--queue-size", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level="INFO", format="%(asctime)s %(levelname)s %(message)s")
+
+    service = Service(workers=args.workers, queue_size=args.queue_size, action=action)
+    with JobServer((args.host, args.port), service) as server:
+        log.info(f"Serving on http://{args.host}:{server.server_port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            service.close()
@@ -8,6 +8,8 @@ import pathlib
 from collections.abc import MutableMapping
 from typing import Any
 
+import httpx
+
 from coverage_comment import log
 
 from . import activities, json
@@ -34,6 +36,12 @@ def str_to_bool(value: str) -> bool:
     return value.lower() in ("1", "true", "yes")
 
 
+@dataclasses.dataclass(frozen=True)
+class Subproject:
+    id: str
+    coverage_path: pathlib.Path
+
+
 @dataclasses.dataclass(kw_only=True)
 class Config:
     """This object defines the environment variables"""
@@ -49,6 +57,8 @@ class Config:
     # > For example, `refs/heads/feature-branch-1`.
     # (from https://docs.github.com/en/actions/learn-github-actions/variables#default-environment-variables )
     GITHUB_REF: str
+    # The commit that triggered the workflow
+    GITHUB_SHA: str = ""
     GITHUB_EVENT_NAME: str
     GITHUB_EVENT_PATH: pathlib.Path | None = None
     GITHUB_PR_RUN_ID: int | None = None
@@ -59,18 +69,57 @@ class Config:
     COMMENT_ARTIFACT_NAME: str = "python-coverage-comment-action"
     COMMENT_FILENAME: pathlib.Path = pathlib.Path("python-coverage-comment-action.txt")
     SUBPROJECT_ID: str | None = None
+    # Several subprojects processed in a single run, sharing the API calls and
+    # the git operations. Replaces SUBPROJECT_ID and COVERAGE_PATH.
+    SUBPROJECTS: list[Subproject] = dataclasses.field(default_factory=list)
+    # Post a single comment for all the SUBPROJECTS, with a section for each
+    COMBINED_COMMENT: bool = False
     GITHUB_OUTPUT: pathlib.Path | None = None
     MINIMUM_GREEN: decimal.Decimal = decimal.Decimal("100")
     MINIMUM_ORANGE: decimal.Decimal = decimal.Decimal("70")
     MERGE_COVERAGE_FILES: bool = False
+    MERGE_COVERAGE_CACHE: bool = False
+    INCREMENTAL_ANALYSIS: bool = False
+    DIFF_ONLY: bool = False
+    PREVIOUS_SUMMARY_ONLY: bool = False
     ANNOTATE_MISSING_LINES: bool = False
     ANNOTATION_TYPE: str = "warning"
     MAX_FILES_IN_COMMENT: int = 25
     USE_GH_PAGES_HTML_URL: bool = False
     ACTIVITY: activities.Activity | None = None
     VERBOSE: bool = False
+    # Tuning of the HTTP connection pools, not exposed in the action (use `env:`
+    # on the step if you need to change them)
+    HTTP2: bool = True
+    HTTP_MAX_CONNECTIONS: int = 10
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    # httpx closes idle connections after 5s by default, which is shorter than
+    # the time we spend running coverage between 2 API calls.
+    HTTP_KEEPALIVE_EXPIRY: float = 60.0
+    # Number of parallel `coverage combine` processes when MERGE_COVERAGE_FILES
+    # is set and there are many files to combine. Defaults to the number of CPUs.
+    # Ignored on a single CPU, where the files are combined in one process.
+    MERGE_COVERAGE_WORKERS: int | None = None
+    # Number of parallel processes analysing the source files when building the
+    # coverage report, if there are many files. Defaults to the number of CPUs.
+    ANALYSIS_WORKERS: int | None = None
+    # Fetch repository, PR and comments details in a single GraphQL query.
+    # The REST API is used anyway if the GraphQL query fails.
+    USE_GRAPHQL_API: bool = True
+    # If set, a trace of the HTTP calls in the Chrome Trace Event format is
+    # written to this file.
+    TRACE_FILE: pathlib.Path | None = None
+    # If set, the run is profiled with cProfile, and both the profile and the
+    # trace (see TRACE_FILE) are written to files, exposed as outputs.
+    PROFILE: bool = False
     # Only for debugging, not exposed in the action:
     FORCE_WORKFLOW_RUN: bool = False
+    # Only for `serve`, not exposed in the action: the directory of the
+    # checkout, which the paths of the settings are below.
+    WORKSPACE: pathlib.Path = pathlib.Path(".")
+    # Set for each subproject when there are SUBPROJECTS, so that their
+    # outputs don't overwrite each other
+    OUTPUT_PREFIX: str = ""
 
     # Clean methods
     @classmethod
@@ -93,6 +142,22 @@ class Config:
     def clean_merge_coverage_files(cls, value: str) -> bool:
         return str_to_bool(value)
 
+    @classmethod
+    def clean_merge_coverage_cache(cls, value: str) -> bool:
+        return str_to_bool(value)
+
+    @classmethod
+    def clean_incremental_analysis(cls, value: str) -> bool:
+        return str_to_bool(value)
+
+    @classmethod
+    def clean_diff_only(cls, value: str) -> bool:
+        return str_to_bool(value)
+
+    @classmethod
+    def clean_previous_summary_only(cls, value: str) -> bool:
+        return str_to_bool(value)
+
     @classmethod
     def clean_annotate_missing_lines(cls, value: str) -> bool:
         return str_to_bool(value)
@@ -125,6 +190,10 @@ class Config:
     def clean_coverage_path(cls, value: str) -> pathlib.Path:
         return path_below(value)
 
+    @classmethod
+    def clean_workspace(cls, value: str) -> pathlib.Path:
+        return path_below(value)
+
     @classmethod
     def clean_github_output(cls, value: str) -> pathlib.Path:
         return pathlib.Path(value)
@@ -141,6 +210,68 @@ class Config:
     def clean_use_gh_pages_html_url(cls, value: str) -> bool:
         return str_to_bool(value)
 
+    @classmethod
+    def clean_http2(cls, value: str) -> bool:
+        return str_to_bool(value)
+
+    @classmethod
+    def clean_http_max_connections(cls, value: str) -> int:
+        return int(value)
+
+    @classmethod
+    def clean_http_max_keepalive_connections(cls, value: str) -> int:
+        return int(value)
+
+    @classmethod
+    def clean_http_keepalive_expiry(cls, value: str) -> float:
+        return float(value)
+
+    @classmethod
+    def clean_merge_coverage_workers(cls, value: str) -> int | None:
+        return int(value) if value else None
+
+    @classmethod
+    def clean_analysis_workers(cls, value: str) -> int | None:
+        return int(value) if value else None
+
+    @classmethod
+    def clean_use_graphql_api(cls, value: str) -> bool:
+        return str_to_bool(value)
+
+    @classmethod
+    def clean_trace_file(cls, value: str) -> pathlib.Path:
+        return path_below(value)
+
+    @classmethod
+    def clean_subprojects(cls, value: str) -> list[Subproject]:
+        # One `<id>:<coverage path>` per line
+        subprojects: list[Subproject] = []
+        for line in value.splitlines():
+            if not line.strip():
+                continue
+            subproject_id, separator, path = line.partition(":")
+            if not separator or not subproject_id.strip():
+                raise ValueError(f"Expected `<id>:<coverage path>`, got {line!r}")
+            subprojects.append(
+                Subproject(
+                    id=subproject_id.strip(),
+                    coverage_path=path_below(path.strip() or "."),
+                )
+            )
+
+        ids = [subproject.id for subproject in subprojects]
+        if len(set(ids)) != len(ids):
+            raise ValueError("Subproject ids must be unique")
+        return subprojects
+
+    @classmethod
+    def clean_combined_comment(cls, value: str) -> bool:
+        return str_to_bool(value)
+
+    @classmethod
+    def clean_profile(cls, value: str) -> bool:
+        return str_to_bool(value)
+
     @classmethod
     def clean_activity(cls, activity: str) -> activities.Activity | None:
         return activities.Activity(activity)
@@ -159,6 +290,14 @@ class Config:
             return self.GITHUB_REF.split("/", 2)[2]
         return None
 
+    @property
+    def HTTP_LIMITS(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=self.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=self.HTTP_KEEPALIVE_EXPIRY,
+        )
+
     @functools.cached_property
     def GITHUB_EVENT_PAYLOAD(self) -> dict[str, Any]:
         if not self.GITHUB_EVENT_PATH:
@@ -176,6 +315,14 @@ class Config:
         except KeyError:
             return False
 
+    @property
+    def GITHUB_BASE_SHA(self) -> str | None:
+        # The tip of the base branch the PR merge commit was made on
+        try:
+            return self.GITHUB_EVENT_PAYLOAD["pull_request"]["base"]["sha"]
+        except KeyError:
+            return None
+
     @property
     def FINAL_COMMENT_FILENAME(self):
         filename = self.COMMENT_FILENAME
@@ -184,6 +331,39 @@ class Config:
             return filename.parent / new_name
         return filename
 
+    @property
+    def PROFILE_FILE(self) -> pathlib.Path | None:
+        if not self.PROFILE:
+            return None
+        suffix = f"-{self.SUBPROJECT_ID}" if self.SUBPROJECT_ID else ""
+        return pathlib.Path(f"coverage-comment-profile{suffix}.pstats")
+
+    @property
+    def FINAL_TRACE_FILE(self) -> pathlib.Path | None:
+        if self.TRACE_FILE or not self.PROFILE:
+            return self.TRACE_FILE
+        suffix = f"-{self.SUBPROJECT_ID}" if self.SUBPROJECT_ID else ""
+        return pathlib.Path(f"coverage-comment-trace{suffix}.json")
+
+    @property
+    def SUBPROJECT_CONFIGS(self) -> list[Config]:
+        return [
+            dataclasses.replace(
+                self,
+                SUBPROJECT_ID=subproject.id,
+                COVERAGE_PATH=subproject.coverage_path,
+                SUBPROJECTS=[],
+                OUTPUT_PREFIX=f"{subproject.id}_",
+            )
+            for subproject in self.SUBPROJECTS
+        ]
+
+    @property
+    def REPOSITORY_COVERAGE_PATH(self) -> pathlib.Path:
+        # The paths of the coverage report, like the paths of the diff, are
+        # relative to the root of the repository, i.e. the workspace
+        return self.COVERAGE_PATH.relative_to(self.WORKSPACE)
+
     @property
     def FINAL_COVERAGE_DATA_BRANCH(self):
         return self.COVERAGE_DATA_BRANCH + (
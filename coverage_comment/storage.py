@@ -3,7 +3,7 @@ from __future__ import annotations
 import contextlib
 import pathlib
 
-from coverage_comment import files, github_client, log, subprocess
+from coverage_comment import files, github_client, log, subprocess, tracing
 
 GITHUB_ACTIONS_BOT_NAME = "github-actions"
 # A discussion pointing at the email address of the github-actions bot user;
@@ -25,8 +25,41 @@ COMMIT_ENVIRONMENT = {
 GIT_COMMIT_MESSAGE = "ci: Update coverage data"
 
 
+def fetch_branches(git: subprocess.Git, branches: list[str], token: str) -> set[str]:
+    """
+    Fetch the given branches from origin, and return those that exist.
+    """
+    try:
+        git.fetch("origin", *branches, token=token)
+    except subprocess.SubProcessError:
+        # A branch seems to no exist, OR fetch failed for a different reason.
+        # Let's make sure:
+        # 1/ Fetch again, but this time all the remote
+        git.fetch("origin", token=token)
+        # 2/ And check which of our branches really don't exist
+        existing: set[str] = set()
+        for branch in branches:
+            try:
+                git.rev_parse("--verify", f"origin/{branch}")
+            except subprocess.SubProcessError:
+                log.debug(f"Branch {branch} doesn't exist.")
+            else:
+                existing.add(branch)
+        if existing == set(branches):
+            # Ok, our branches exist, but we failed to fetch them. Let's raise.
+            raise
+        return existing
+
+    return set(branches)
+
+
 @contextlib.contextmanager
-def checked_out_branch(git: subprocess.Git, branch: str, token: str):
+def checked_out_branches(git: subprocess.Git, branches: list[str], token: str):
+    """
+    Fetch all the branches at once, and yield a function switching to one of
+    them (creating it if it doesn't exist yet). The initial checkout is
+    restored at the end.
+    """
     # If we're not on a branch, `git branch --show-current` will print nothing
     # and still exit with 0.
     current_checkout = git.branch("--show-current").strip()
@@ -40,37 +73,59 @@ def checked_out_branch(git: subprocess.Git, branch: str, token: str):
     # Goodbye `.coverage` file.
     git.reset("--hard")
 
-    try:
-        git.fetch("origin", branch, token=token)
-    except subprocess.SubProcessError:
-        # Branch seems to no exist, OR fetch failed for a different reason.
-        # Let's make sure:
-        # 1/ Fetch again, but this time all the remote
-        git.fetch("origin", token=token)
-        # 2/ And check that our branch really doesn't exist
-        try:
-            git.rev_parse("--verify", f"origin/{branch}")
-        except subprocess.SubProcessError:
-            # Ok good, the branch really doesn't exist.
-            pass
-        else:
-            # Ok, our branch exist, but we failed to fetch it. Let's raise.
-            raise
-        log.debug(f"Branch {branch} doesn't exist.")
-        log.info(f"Creating branch {branch}")
-        git.switch("--orphan", branch)
-    else:
-        log.debug(f"Branch {branch} exist.")
-        git.switch(branch)
+    with tracing.span("git checkout"):
+        existing_branches = fetch_branches(git=git, branches=branches, token=token)
+
+    def switch(branch: str) -> None:
+        with tracing.span("git checkout"):
+            if branch in existing_branches:
+                log.debug(f"Branch {branch} exist.")
+                git.switch(branch)
+            else:
+                log.info(f"Creating branch {branch}")
+                git.switch("--orphan", branch)
 
     try:
-        yield
+        yield switch
     finally:
         log.debug(f"Back to checkout of {current_checkout}")
         detach = ["--detach"] if not is_on_a_branch else []
         git.switch(*detach, current_checkout)
 
 
+@contextlib.contextmanager
+def checked_out_branch(git: subprocess.Git, branch: str, token: str):
+    with checked_out_branches(git=git, branches=[branch], token=token) as switch:
+        switch(branch)
+        yield
+
+
+def commit_changes(operations: list[files.Operation], git: subprocess.Git) -> bool:
+    """
+    Apply the operations on the current branch, and commit them if they
+    changed anything. Returns whether a commit was made.
+    """
+    with tracing.span("write files"):
+        for op in operations:
+            op.apply()
+            git.add(str(op.path))
+
+    try:
+        git.diff("--staged", "--exit-code")
+    except subprocess.GitError:
+        pass  # All good, command returns 1 if there's diff, 0 otherwise
+    else:
+        log.info("No change detected, skipping.")
+        return False
+
+    git.commit(
+        "--message",
+        GIT_COMMIT_MESSAGE,
+        env=COMMIT_ENVIRONMENT,
+    )
+    return True
+
+
 def commit_operations(
     operations: list[files.Operation], git: subprocess.Git, branch: str, token: str
 ):
@@ -86,26 +141,43 @@ def commit_operations(
     branch : str
         branch on which to store the files
     """
-    with checked_out_branch(git=git, branch=branch, token=token):
-        for op in operations:
-            op.apply()
-            git.add(str(op.path))
+    commit_operations_on_branches(
+        operations_by_branch={branch: operations}, git=git, token=token
+    )
 
-        try:
-            git.diff("--staged", "--exit-code")
-        except subprocess.GitError:
-            pass  # All good, command returns 1 if there's diff, 0 otherwise
-        else:
-            log.info("No change detected, skipping.")
+
+@tracing.span("commit data files")
+def commit_operations_on_branches(
+    operations_by_branch: dict[str, list[files.Operation]],
+    git: subprocess.Git,
+    token: str,
+):
+    """
+    Store the given files on several branches, with a single fetch and a
+    single push.
+
+    Parameters
+    ----------
+    operations_by_branch : dict[str, list[files.Operation]]
+        File operations to process, for each branch
+    git : subprocess.Git
+        Git actor
+    """
+    changed_branches: list[str] = []
+    with checked_out_branches(
+        git=git, branches=list(operations_by_branch), token=token
+    ) as switch:
+        for branch, operations in operations_by_branch.items():
+            switch(branch)
+            if commit_changes(operations=operations, git=git):
+                changed_branches.append(branch)
+
+        if not changed_branches:
             return
 
         log.info("Saving coverage files")
-        git.commit(
-            "--message",
-            GIT_COMMIT_MESSAGE,
-            env=COMMIT_ENVIRONMENT,
-        )
-        git.push("origin", branch, token=token)
+        with tracing.span("git push"):
+            git.push("origin", *changed_branches, token=token)
 
         log.info("Files saved")
 
@@ -115,7 +187,69 @@ def get_datafile_contents(
     repository: str,
     branch: str,
 ) -> str | None:
-    contents_path = github.repos(repository).contents(str(files.DATA_PATH))
+    return get_file_contents(
+        github=github, repository=repository, branch=branch, path=files.DATA_PATH
+    )
+
+
+def get_summary_index_contents(
+    github: github_client.GitHub,
+    repository: str,
+    branch: str,
+) -> str | None:
+    return get_file_contents(
+        github=github,
+        repository=repository,
+        branch=branch,
+        path=files.SUMMARY_INDEX_PATH,
+    )
+
+
+def get_history_contents(
+    github: github_client.GitHub,
+    repository: str,
+    branch: str,
+) -> str | None:
+    return get_file_contents(
+        github=github, repository=repository, branch=branch, path=files.HISTORY_PATH
+    )
+
+
+def get_snapshot_contents(
+    github: github_client.GitHub,
+    repository: str,
+    branch: str,
+    sha: str,
+) -> str | None:
+    return get_file_contents(
+        github=github,
+        repository=repository,
+        branch=branch,
+        path=files.SNAPSHOTS_PATH / files.get_snapshot_path(sha=sha),
+    )
+
+
+def get_content_hash(
+    github: github_client.GitHub,
+    repository: str,
+    branch: str,
+) -> str | None:
+    contents = get_file_contents(
+        github=github,
+        repository=repository,
+        branch=branch,
+        path=files.CONTENT_HASH_PATH,
+    )
+    return contents.strip() if contents else None
+
+
+def get_file_contents(
+    github: github_client.GitHub,
+    repository: str,
+    branch: str,
+    path: pathlib.Path,
+) -> str | None:
+    contents_path = github.repos(repository).contents(str(path))
     try:
         response = contents_path.get(
             ref=branch,
@@ -1,11 +1,14 @@
 from __future__ import annotations
 
 import base64
+import contextlib
 import functools
 import os
 import pathlib
 import subprocess
-from typing import Any, Self
+import tempfile
+from collections.abc import Generator
+from typing import IO, Any, Self
 
 from coverage_comment import log
 
@@ -65,6 +68,56 @@ def run(*args: str, path: pathlib.Path, **kwargs: Any) -> str:
     return call.stdout
 
 
+@contextlib.contextmanager
+def stream(*args: str, path: pathlib.Path, **kwargs: Any) -> Generator[IO[str]]:
+    """
+    Same as `run`, but stdout is read while the process writes it, instead
+    of being kept in memory. Errors are raised when leaving the context
+    manager (including when reading stdout failed because of the error).
+    """
+    # stderr goes to a file, so that the process never blocks on a full pipe
+    # that we don't read
+    with (
+        tempfile.TemporaryFile("w+", errors="replace") as stderr,
+        subprocess.Popen(
+            args,
+            cwd=path,
+            text=True,
+            errors="replace",
+            stdout=subprocess.PIPE,
+            stderr=stderr,
+            **kwargs,
+        ) as process,
+    ):
+        assert process.stdout
+        try:
+            yield process.stdout
+        except Exception as exc:
+            # Let the process finish, to know whether it failed
+            stdout = process.stdout.read()
+            if process.wait() == 0:
+                raise
+            error = exc
+        else:
+            stdout = process.stdout.read()
+            if process.wait() == 0:
+                log.debug(f"Streamed command: {args=} {path=} {kwargs=}")
+                return
+            error = None
+
+        stderr.seek(0)
+        new_exc = SubProcessError.from_called_process_error(
+            subprocess.CalledProcessError(
+                returncode=process.returncode,
+                cmd=list(args),
+                output=stdout,
+                stderr=stderr.read(),
+            )
+        )
+        new_exc.add_note(f"Launched from {path=} with {kwargs=}")
+        raise new_exc from error
+
+
 class Git:
     """
     Wrapper around calling git subprocesses in a way that reads a tiny bit like
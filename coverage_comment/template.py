@@ -1,11 +1,13 @@
 from __future__ import annotations
 
+import collections
 import dataclasses
 import decimal
 import functools
 import hashlib
 import itertools
 import pathlib
+import threading
 from collections.abc import Callable
 from importlib import resources
 from typing import Any, override
@@ -13,12 +15,22 @@ from typing import Any, override
 import jinja2
 from jinja2.sandbox import SandboxedEnvironment
 
-from coverage_comment import badge, diff_grouper
+from coverage_comment import badge, diff_grouper, tracing
 from coverage_comment import coverage as coverage_module
 
-MARKER = (
-    """<!-- This comment was produced by python-coverage-comment-action{id_part} -->"""
-)
+# Templates compiled to Python modules by `compile_templates` (at build time, see
+# the Dockerfile), so that they're not compiled again on each run. Each one is in
+# a directory named after a hash of its source, so an outdated one is never used.
+COMPILED_TEMPLATES_PATH = pathlib.Path(__file__).parent / "template_files" / "compiled"
+# Name under which each packaged template is loaded
+TEMPLATE_NAMES = {
+    "comment.md.j2": "base",
+    "readme.md.j2": "readme",
+    "log.txt.j2": "log",
+}
+# Bound of the bytecode cache (see MemoryBytecodeCache). Custom templates are
+# cached too, and each different one adds an entry.
+BYTECODE_CACHE_MAX_ENTRIES = 100
 
 
 def uptodate():
@@ -49,6 +61,89 @@ class CommentLoader(jinja2.BaseLoader):
         raise jinja2.TemplateNotFound(template)
 
 
+class MemoryBytecodeCache(jinja2.BytecodeCache):
+    """
+    Keeps the templates compiled from source in memory, for all the
+    environments (there's one per rendering). Mostly useful to long-running
+    processes (see `serve`), and when the templates weren't precompiled.
+    The least recently used templates are dropped beyond `max_entries`.
+    """
+
+    def __init__(self, max_entries: int = BYTECODE_CACHE_MAX_ENTRIES):
+        self.max_entries: int = max_entries
+        self.cache: collections.OrderedDict[str, bytes] = collections.OrderedDict()
+        # Jobs render their templates in parallel in `serve`
+        self.lock: threading.Lock = threading.Lock()
+
+    @override
+    def load_bytecode(self, bucket: jinja2.bccache.Bucket) -> None:
+        with self.lock:
+            bytecode = self.cache.get(bucket.key)
+            if bytecode is not None:
+                self.cache.move_to_end(bucket.key)
+        if bytecode is not None:
+            bucket.bytecode_from_string(bytecode)
+
+    @override
+    def dump_bytecode(self, bucket: jinja2.bccache.Bucket) -> None:
+        bytecode = bucket.bytecode_to_string()
+        with self.lock:
+            self.cache[bucket.key] = bytecode
+            self.cache.move_to_end(bucket.key)
+            while len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+
+
+BYTECODE_CACHE = MemoryBytecodeCache()
+
+
+def get_compiled_template_path(name: str, source: str) -> pathlib.Path:
+    key = f"{jinja2.__version__}\n{name}\n{source}"
+    return COMPILED_TEMPLATES_PATH / hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+def with_compiled_template(
+    loader: jinja2.BaseLoader, name: str, source: str
+) -> jinja2.BaseLoader:
+    """
+    Load the template `name` from its compiled module if there's one for this
+    source, and the other templates from `loader`.
+    """
+    path = get_compiled_template_path(name=name, source=source)
+    if not path.is_dir():
+        return loader
+    return jinja2.ChoiceLoader([jinja2.ModuleLoader(path), loader])
+
+
+def get_packaged_template_loader(filename: str) -> jinja2.BaseLoader:
+    name = TEMPLATE_NAMES[filename]
+    source = read_template_file(filename)
+    return with_compiled_template(
+        jinja2.DictLoader({name: source}), name=name, source=source
+    )
+
+
+def compile_templates() -> None:
+    # Filters are looked up when rendering, only their names matter here
+    filters = get_comment_filters(
+        github_host="",
+        repo_name="",
+        pr_number=None,
+        branch_name=None,
+        minimum_green=decimal.Decimal("100"),
+        minimum_orange=decimal.Decimal("70"),
+    )
+    for filename, name in TEMPLATE_NAMES.items():
+        source = read_template_file(filename)
+        env = SandboxedEnvironment(loader=jinja2.DictLoader({name: source}))
+        env.filters.update(filters)
+        env.compile_templates(
+            target=str(get_compiled_template_path(name=name, source=source)),
+            zip=None,
+            ignore_errors=False,
+        )
+
+
 class MissingMarker(Exception):
     pass
 
@@ -57,10 +152,6 @@ class TemplateError(Exception):
     pass
 
 
-def get_marker(marker_id: str | None):
-    return MARKER.format(id_part=f" (id: {marker_id})" if marker_id else "")
-
-
 def pluralize(number: int, singular: str = "", plural: str = "s") -> str:
     if number == 1:
         return singular
@@ -113,14 +204,66 @@ def x100(val: decimal.Decimal):
     return val * 100
 
 
+SPARKLINE_BARS = "▁▂▃▄▅▆▇█"
+
+
+def sparkline(values: list[decimal.Decimal]) -> str:
+    # Only the shape matters, floats are precise enough
+    rates = [float(value) for value in values]
+    low, high = min(rates, default=0.0), max(rates, default=0.0)
+    if low == high:
+        return SPARKLINE_BARS[len(SPARKLINE_BARS) // 2] * len(rates)
+    scale = (len(SPARKLINE_BARS) - 1) / (high - low)
+    return "".join(SPARKLINE_BARS[round((rate - low) * scale)] for rate in rates)
+
+
 @dataclasses.dataclass
 class FileInfo:
     path: pathlib.Path
     coverage: coverage_module.FileCoverage
     diff: coverage_module.FileDiffCoverage | None
     previous: coverage_module.FileCoverage | None
+    # Also known when the previous coverage only has the summary of the file
+    previous_info: coverage_module.CoverageInfo | None = None
+
+    def __post_init__(self):
+        if self.previous_info is None and self.previous is not None:
+            self.previous_info = self.previous.info
 
 
+def get_comment_filters(
+    github_host: str,
+    repo_name: str,
+    pr_number: int | None,
+    branch_name: str | None,
+    minimum_green: decimal.Decimal,
+    minimum_orange: decimal.Decimal,
+) -> dict[str, Callable[..., Any]]:
+    filters: dict[str, Callable[..., Any]] = {}
+    filters["pct"] = pct
+    filters["delta"] = delta
+    filters["x100"] = x100
+    filters["get_evolution_color"] = badge.get_evolution_badge_color
+    filters["generate_badge"] = badge.get_static_badge_url
+    filters["pluralize"] = pluralize
+    filters["compact"] = compact
+    filters["sparkline"] = sparkline
+    filters["file_url"] = functools.partial(
+        get_file_url,
+        github_host=github_host,
+        repo_name=repo_name,
+        pr_number=pr_number,
+        branch_name=branch_name,
+    )
+    filters["get_badge_color"] = functools.partial(
+        badge.get_badge_color,
+        minimum_green=minimum_green,
+        minimum_orange=minimum_orange,
+    )
+    return filters
+
+
+@tracing.span("render comment")
 def get_comment_markdown(
     *,
     coverage: coverage_module.Coverage,
@@ -142,30 +285,23 @@ def get_comment_markdown(
     custom_template: str | None = None,
     pr_targets_default_branch: bool = True,
     failure_msg: str | None = None,
+    coverage_history: list[decimal.Decimal] | None = None,
 ):
     loader = CommentLoader(base_template=base_template, custom_template=custom_template)
-    env = SandboxedEnvironment(loader=loader)
-    filters: dict[str, Callable[..., Any]] = {}
-    filters["pct"] = pct
-    filters["delta"] = delta
-    filters["x100"] = x100
-    filters["get_evolution_color"] = badge.get_evolution_badge_color
-    filters["generate_badge"] = badge.get_static_badge_url
-    filters["pluralize"] = pluralize
-    filters["compact"] = compact
-    filters["file_url"] = functools.partial(
-        get_file_url,
-        github_host=github_host,
-        repo_name=repo_name,
-        pr_number=pr_number,
-        branch_name=branch_name,
+    env = SandboxedEnvironment(
+        loader=with_compiled_template(loader, name="base", source=base_template),
+        bytecode_cache=BYTECODE_CACHE,
     )
-    filters["get_badge_color"] = functools.partial(
-        badge.get_badge_color,
-        minimum_green=minimum_green,
-        minimum_orange=minimum_orange,
+    env.filters.update(
+        get_comment_filters(
+            github_host=github_host,
+            repo_name=repo_name,
+            pr_number=pr_number,
+            branch_name=branch_name,
+            minimum_green=minimum_green,
+            minimum_orange=minimum_orange,
+        )
     )
-    env.filters.update(filters)
 
     missing_diff_lines = {
         key: list(value)
@@ -190,6 +326,7 @@ def get_comment_markdown(
             marker=marker,
             pr_targets_default_branch=pr_targets_default_branch,
             failure_msg=failure_msg,
+            coverage_history=coverage_history or [],
         )
     except jinja2.exceptions.TemplateError as exc:
         raise TemplateError from exc
@@ -200,6 +337,14 @@ def get_comment_markdown(
     return comment
 
 
+def get_combined_comment_markdown(sections: list[str], marker: str) -> str:
+    """
+    A single comment for several subprojects: their comments (rendered
+    without a marker) one after the other, followed by the marker.
+    """
+    return "\n\n".join([section.strip() for section in sections] + [marker])
+
+
 def select_files(
     *,
     coverage: coverage_module.Coverage,
@@ -211,24 +356,26 @@ def select_files(
     Selects the MAX_FILES files with the most new missing lines sorted by path
 
     """
-    previous_coverage_files = previous_coverage.files if previous_coverage else {}
-
     files: list[FileInfo] = []
     for path, coverage_file in coverage.files.items():
         diff_coverage_file = diff_coverage.files.get(path)
-        previous_coverage_file = previous_coverage_files.get(path)
+        previous_coverage_file = (
+            previous_coverage.files.get(path) if previous_coverage else None
+        )
+        previous_info = (
+            previous_coverage.get_file_info(path) if previous_coverage else None
+        )
 
         file_info = FileInfo(
             path=path,
             coverage=coverage_file,
             diff=diff_coverage_file,
             previous=previous_coverage_file,
+            previous_info=previous_info,
         )
         has_diff = bool(diff_coverage_file and diff_coverage_file.added_statements)
         has_evolution_from_previous = (
-            previous_coverage_file.info != coverage_file.info
-            if previous_coverage_file
-            else False
+            previous_info != coverage_file.info if previous_info else False
         )
 
         if has_diff or has_evolution_from_previous:
@@ -248,18 +395,19 @@ def sort_order(file_info: FileInfo) -> tuple[int, int, int]:
     2. Files with the most added lines (from the diff)
     3. Files with the most new executed lines (including not in the diff)
     """
-    new_missing_lines = len(file_info.coverage.missing_lines)
-    if file_info.previous:
-        new_missing_lines -= len(file_info.previous.missing_lines)
+    new_missing_lines = file_info.coverage.info.missing_lines
+    if file_info.previous_info:
+        new_missing_lines -= file_info.previous_info.missing_lines
 
     added_statements = len(file_info.diff.added_statements) if file_info.diff else 0
-    new_covered_lines = len(file_info.coverage.executed_lines)
-    if file_info.previous:
-        new_covered_lines -= len(file_info.previous.executed_lines)
+    new_covered_lines = file_info.coverage.info.covered_lines
+    if file_info.previous_info:
+        new_covered_lines -= file_info.previous_info.covered_lines
 
     return abs(new_missing_lines), added_statements, abs(new_covered_lines)
 
 
+@tracing.span("render readme")
 def get_readme_markdown(
     is_public: bool,
     readme_url: str,
@@ -270,9 +418,11 @@ def get_readme_markdown(
     endpoint_image_url: str | None,
     subproject_id: str | None = None,
 ):
-    env = SandboxedEnvironment()
-    template = jinja2.Template(read_template_file("readme.md.j2"))
-    return env.get_template(template).render(
+    env = SandboxedEnvironment(
+        loader=get_packaged_template_loader("readme.md.j2"),
+        bytecode_cache=BYTECODE_CACHE,
+    )
+    return env.get_template("readme").render(
         is_public=is_public,
         readme_url=readme_url,
         markdown_report=markdown_report,
@@ -293,9 +443,11 @@ def get_log_message(
     endpoint_image_url: str | None,
     subproject_id: str | None = None,
 ):
-    env = SandboxedEnvironment()
-    template = jinja2.Template(read_template_file("log.txt.j2"))
-    return env.get_template(template).render(
+    env = SandboxedEnvironment(
+        loader=get_packaged_template_loader("log.txt.j2"),
+        bytecode_cache=BYTECODE_CACHE,
+    )
+    return env.get_template("log").render(
         is_public=is_public,
         html_report_url=html_report_url,
         direct_image_url=direct_image_url,
@@ -306,6 +458,7 @@ def get_log_message(
     )
 
 
+@functools.cache
 def read_template_file(template: str) -> str:
     return (
         resources.files("coverage_comment") / "template_files" / template
@@ -0,0 +1,351 @@
+"""
+This module records the HTTP calls made by the action (what was called, how
+long it took, how big the answer was and how much rate limit is left), and the
+time spent in each phase of the run (see `span`), in order to report on them
+at the end of the run.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import dataclasses
+import functools
+import pathlib
+import re
+import time
+from collections.abc import Callable, Generator, Iterator
+from typing import Any, override
+
+import httpx
+
+from coverage_comment import github, json
+
+
+@dataclasses.dataclass(kw_only=True)
+class RequestRecord:
+    method: str
+    host: str
+    # Path with identifiers replaced by placeholders, e.g.
+    # /repos/{owner}/{repo}/issues/{id}/comments
+    path: str
+    status: int
+    # Seconds since the recorder was created
+    start: float
+    duration: float
+    # Bytes received, as sent on the wire (possibly compressed)
+    size: int
+    rate_limit_remaining: int | None = None
+    rate_limit_limit: int | None = None
+
+
+def template_path(path: str) -> str:
+    """
+    Replace the parts of a GitHub API path that identify a specific object by
+    placeholders, so that calls to the same endpoint can be aggregated.
+    """
+    # GitHub Enterprise Server prefix
+    path = path.removeprefix("/api/v3")
+    path = re.sub(r"^/repos/[^/]+/[^/]+", "/repos/{owner}/{repo}", path)
+    path = re.sub(r"/compare/[^/]+$", "/compare/{basehead}", path)
+    path = re.sub(r"/contents/.+$", "/contents/{path}", path)
+    return re.sub(r"/\d+(?=/|$)", "/{id}", path)
+
+
+def _int_header(response: httpx.Response, name: str) -> int | None:
+    value = response.headers.get(name)
+    return int(value) if value and value.isdigit() else None
+
+
+class RequestRecorder:
+    def __init__(self):
+        self.origin: float = time.perf_counter()
+        self.records: list[RequestRecord] = []
+
+    def record(self, request: httpx.Request, response: httpx.Response, start: float):
+        """
+        Called once the response has been fully read.
+        """
+        self.records.append(
+            RequestRecord(
+                method=request.method,
+                host=request.url.host,
+                path=template_path(request.url.path),
+                status=response.status_code,
+                start=start - self.origin,
+                duration=time.perf_counter() - start,
+                size=response.num_bytes_downloaded,
+                rate_limit_remaining=_int_header(response, "x-ratelimit-remaining"),
+                rate_limit_limit=_int_header(response, "x-ratelimit-limit"),
+            )
+        )
+
+    def get_summary_markdown(self) -> str:
+        """
+        Aggregated table of the calls, grouped by endpoint, in the order of
+        the first call to each endpoint.
+        """
+        groups: dict[tuple[str, str, str], list[RequestRecord]] = {}
+        for record in self.records:
+            groups.setdefault((record.method, record.host, record.path), []).append(
+                record
+            )
+
+        total_duration = sum(record.duration for record in self.records) * 1000
+        lines = [
+            f"<details><summary>{len(self.records)} HTTP calls, {total_duration:.0f}ms</summary>",
+            "",
+            "| Method | Host | Path | Calls | Statuses | Total time | Mean time | Received |",
+            "|---|---|---|--:|---|--:|--:|--:|",
+        ]
+        for (method, host, path), records in groups.items():
+            statuses = ", ".join(sorted({str(record.status) for record in records}))
+            duration = sum(record.duration for record in records)
+            size = sum(record.size for record in records)
+            lines.append(
+                f"| {method} | {host} | `{path}` | {len(records)} | {statuses} "
+                f"| {duration * 1000:.0f}ms | {duration * 1000 / len(records):.0f}ms "
+                f"| {size / 1024:.1f} KiB |"
+            )
+
+        rate_limited = [
+            record for record in self.records if record.rate_limit_remaining is not None
+        ]
+        if rate_limited:
+            last = rate_limited[-1]
+            remaining = f"{last.rate_limit_remaining}/{last.rate_limit_limit}"
+            lines += ["", f"GitHub API rate limit remaining: {remaining}"]
+
+        lines += ["", "</details>", ""]
+        return "\n".join(lines)
+
+    def get_chrome_trace(self) -> dict[str, Any]:
+        """
+        Trace in the Chrome Trace Event format, which can be loaded in
+        https://ui.perfetto.dev or https://www.speedscope.app
+        """
+        return {
+            "displayTimeUnit": "ms",
+            "traceEvents": [
+                {
+                    "name": f"{record.method} {record.path}",
+                    "cat": "http",
+                    "ph": "X",
+                    "pid": 1,
+                    "tid": 1,
+                    "ts": round(record.start * 1_000_000),
+                    "dur": round(record.duration * 1_000_000),
+                    "args": {
+                        "host": record.host,
+                        "status": record.status,
+                        "size": record.size,
+                        "rate_limit_remaining": record.rate_limit_remaining,
+                    },
+                }
+                for record in self.records
+            ],
+        }
+
+
+@dataclasses.dataclass(kw_only=True)
+class SpanRecord:
+    # Names of the enclosing spans and of this one, e.g.
+    # ("process_pr", "coverage report")
+    path: tuple[str, ...]
+    # Seconds since the recorder was created
+    start: float
+    duration: float
+
+
+class SpanRecorder:
+    """
+    Records the spans of the thread running `recording_spans`, and of the
+    functions it runs in other threads through `in_current_context`.
+    """
+
+    def __init__(self, origin: float | None = None):
+        # Pass the origin of a RequestRecorder to align both traces
+        self.origin: float = time.perf_counter() if origin is None else origin
+        self.records: list[SpanRecord] = []
+
+    def get_summary_markdown(self) -> str:
+        """
+        Aggregated table of the spans, grouped by path, in the order of the
+        first span of each path.
+        """
+        groups: dict[tuple[str, ...], list[SpanRecord]] = {}
+        for record in sorted(self.records, key=lambda record: record.start):
+            groups.setdefault(record.path, []).append(record)
+
+        total_duration = sum(
+            record.duration for record in self.records if len(record.path) == 1
+        )
+        lines = [
+            f"<details><summary>Timings, {total_duration * 1000:.0f}ms</summary>",
+            "",
+            "| Phase | Calls | Total time | Share |",
+            "|---|--:|--:|--:|",
+        ]
+        for path, records in groups.items():
+            duration = sum(record.duration for record in records)
+            share = duration / total_duration * 100 if total_duration else 0
+            lines.append(
+                f"| {' / '.join(path)} | {len(records)} "
+                f"| {duration * 1000:.0f}ms | {share:.0f}% |"
+            )
+        lines += ["", "</details>", ""]
+        return "\n".join(lines)
+
+    def get_trace_events(self) -> list[dict[str, Any]]:
+        """
+        Events in the Chrome Trace Event format, on their own thread so that
+        they're not mixed with the HTTP calls.
+        """
+        return [
+            {
+                "name": record.path[-1],
+                "cat": "span",
+                "ph": "X",
+                "pid": 1,
+                "tid": 0,
+                "ts": round(record.start * 1_000_000),
+                "dur": round(record.duration * 1_000_000),
+            }
+            for record in self.records
+        ]
+
+
+_span_recorder: contextvars.ContextVar[SpanRecorder | None] = contextvars.ContextVar(
+    "span_recorder", default=None
+)
+# Names of the enclosing spans. A context variable rather than an attribute of
+# the recorder, so that spans running in parallel threads don't mix.
+_span_path: contextvars.ContextVar[tuple[str, ...]] = contextvars.ContextVar(
+    "span_path", default=()
+)
+
+
+@contextlib.contextmanager
+def recording_spans(recorder: SpanRecorder) -> Generator[SpanRecorder]:
+    """
+    Record the spans entered in the block (in the current thread) in
+    `recorder`.
+    """
+    token = _span_recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _span_recorder.reset(token)
+
+
+@contextlib.contextmanager
+def span(name: str) -> Generator[None]:
+    """
+    Time the block, or the decorated function. Does nothing outside of
+    `recording_spans`, so it can be used anywhere.
+    """
+    recorder = _span_recorder.get()
+    if recorder is None:
+        yield
+        return
+
+    path = (*_span_path.get(), name)
+    token = _span_path.set(path)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        recorder.records.append(
+            SpanRecord(
+                path=path,
+                start=start - recorder.origin,
+                duration=time.perf_counter() - start,
+            )
+        )
+        _span_path.reset(token)
+
+
+def in_current_context[**P, R](func: Callable[P, R]) -> Callable[P, R]:
+    """
+    Threads don't inherit context variables: wrap the functions run by a
+    thread pool so that their spans are recorded, below the current one.
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(func)
+    def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        # A context can't be entered by several threads at once
+        return context.copy().run(func, *args, **kwargs)
+
+    return wrapper
+
+
+class _RecordingStream(httpx.SyncByteStream):
+    def __init__(self, stream: httpx.SyncByteStream, on_close: Callable[[], None]):
+        self.stream: httpx.SyncByteStream = stream
+        self.on_close: Callable[[], None] | None = on_close
+
+    @override
+    def __iter__(self) -> Iterator[bytes]:
+        yield from self.stream
+
+    @override
+    def close(self) -> None:
+        self.stream.close()
+        if self.on_close:
+            self.on_close()
+            self.on_close = None
+
+
+class RecordingTransport(httpx.BaseTransport):
+    """
+    Wraps a transport to record every request it sends. Requests are
+    recorded when their response is closed, so that the duration includes
+    reading the body (even for streamed responses).
+    """
+
+    def __init__(self, transport: httpx.BaseTransport, recorder: RequestRecorder):
+        self.transport: httpx.BaseTransport = transport
+        self.recorder: RequestRecorder = recorder
+
+    @override
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.perf_counter()
+        response = self.transport.handle_request(request)
+        assert isinstance(response.stream, httpx.SyncByteStream)
+        response.stream = _RecordingStream(
+            stream=response.stream,
+            on_close=lambda: self.recorder.record(
+                request=request, response=response, start=start
+            ),
+        )
+        return response
+
+    @override
+    def close(self) -> None:
+        self.transport.close()
+
+
+def report(
+    recorder: RequestRecorder,
+    github_step_summary: pathlib.Path,
+    trace_file: pathlib.Path | None,
+    span_recorder: SpanRecorder | None = None,
+) -> None:
+    if span_recorder and span_recorder.records:
+        github.add_job_summary(
+            content=span_recorder.get_summary_markdown(),
+            github_step_summary=github_step_summary,
+        )
+    if recorder.records:
+        github.add_job_summary(
+            content=recorder.get_summary_markdown(),
+            github_step_summary=github_step_summary,
+        )
+    if trace_file:
+        trace = recorder.get_chrome_trace()
+        if span_recorder:
+            trace["traceEvents"] = (
+                span_recorder.get_trace_events() + trace["traceEvents"]
+            )
+        trace_file.write_text(json.dumps(trace))
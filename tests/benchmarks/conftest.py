@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import dataclasses
+import json
+import pathlib
+import random
+import statistics
+import time
+import timeit
+from collections.abc import Callable
+
+import pytest
+
+from tests.benchmarks import stub_github
+
+BASELINE_PATH = pathlib.Path(__file__).parent / "baseline.json"
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("benchmarks")
+    group.addoption(
+        "--update-baseline",
+        action="store_true",
+        help=f"Store the benchmark results in {BASELINE_PATH.name}",
+    )
+    group.addoption(
+        "--regression-threshold",
+        type=float,
+        default=2.0,
+        help="Fail when a stage is this many times slower than its baseline",
+    )
+
+
+@dataclasses.dataclass
+class Timing:
+    name: str
+    # Of a single call
+    durations: list[float]
+    # Calls per round
+    iterations: int = 1
+
+    @property
+    def best(self) -> float:
+        return min(self.durations)
+
+    @property
+    def median(self) -> float:
+        return statistics.median(self.durations)
+
+    def __str__(self) -> str:
+        rounds = f"{len(self.durations)} rounds"
+        if self.iterations > 1:
+            rounds += f" of {self.iterations} calls"
+        return (
+            f"{self.name}: best {self.best * 1000:.2f}ms, "
+            f"median {self.median * 1000:.2f}ms ({rounds})"
+        )
+
+
+@pytest.fixture
+def benchmark(capsys):
+    """
+    Run `func` a few times and return its timings. Results are printed even
+    when pytest captures the output.
+
+    With `autorange`, each round calls `func` enough times to last at least
+    0.2s (see `timeit.Timer.autorange`): a few milliseconds, timed once, are
+    at the mercy of the timer and of the load of the machine.
+    """
+
+    def _(
+        name: str,
+        func: Callable[[], object],
+        rounds: int = 5,
+        autorange: bool = False,
+    ) -> Timing:
+        iterations = timeit.Timer(func).autorange()[0] if autorange else 1
+        durations = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            for _ in range(iterations):
+                func()
+            durations.append((time.perf_counter() - start) / iterations)
+
+        timing = Timing(name=name, durations=durations, iterations=iterations)
+        with capsys.disabled():
+            print(f"\n{timing}")
+        return timing
+
+    return _
+
+
+def calibrate(rounds: int = 5) -> float:
+    """
+    Duration of a fixed workload on this machine. Baselines are stored
+    relative to it, so that they mean something on other machines too.
+    """
+    rng = random.Random(0)
+    values = [rng.random() for _ in range(200_000)]
+    durations = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        sorted(values)
+        {str(value): value for value in values}
+        durations.append(time.perf_counter() - start)
+    return min(durations)
+
+
+@dataclasses.dataclass
+class Baseline:
+    expected: dict[str, float]
+    calibration: float
+    threshold: float
+    results: dict[str, float] = dataclasses.field(default_factory=dict)
+
+    def check(self, timing: Timing) -> None:
+        # A single slow round (GC, another process) doesn't move the median
+        relative = timing.median / self.calibration
+        self.results[timing.name] = float(f"{relative:.4g}")
+        if timing.name not in self.expected:
+            return
+        limit = self.expected[timing.name] * self.threshold
+        assert relative <= limit, (
+            f"{timing.name} regressed: {relative:.3f} times the calibration "
+            f"workload, the baseline is {self.expected[timing.name]:.3f}"
+        )
+
+
+@pytest.fixture(scope="session")
+def baseline(request):
+    """
+    Compare timings with the ones stored in baseline.json. Run with
+    `--update-baseline` to store new ones.
+    """
+    update = request.config.getoption("--update-baseline")
+    expected = {}
+    if BASELINE_PATH.exists() and not update:
+        expected = json.loads(BASELINE_PATH.read_text())
+    result = Baseline(
+        expected=expected,
+        calibration=calibrate(),
+        threshold=request.config.getoption("--regression-threshold"),
+    )
+
+    yield result
+
+    if update:
+        stored = {}
+        if BASELINE_PATH.exists():
+            stored = json.loads(BASELINE_PATH.read_text())
+        stored |= result.results
+        BASELINE_PATH.write_text(json.dumps(stored, indent=2, sort_keys=True) + "\n")
+
+
+@pytest.fixture
+def stub_server():
+    servers: list[stub_github.StubGitHub] = []
+
+    def _(calls: list[stub_github.RecordedCall], **kwargs) -> stub_github.StubGitHub:
+        server = stub_github.StubGitHub(calls=calls, **kwargs).__enter__()
+        servers.append(server)
+        return server
+
+    yield _
+
+    for server in servers:
+        server.__exit__()
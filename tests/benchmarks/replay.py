@@ -0,0 +1,450 @@
+"""
+Replays whole runs of the action, offline: GitHub is replaced by a local
+stand-in (see stub_github.py) and the data branch is pushed to a bare git
+repository on disk.
+
+The three activities run in the order they happen on a real repository:
+`save_coverage_data_files` on a push to the default branch, then
+`process_pr` on a pull request (as if it came from a fork, so that the
+comment is stored in an artifact), then `post_comment` in the
+`workflow_run` workflow.
+
+    python -m tests.benchmarks.replay --modules 500 --latency 0.05
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import dataclasses
+import io
+import logging
+import pathlib
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from collections.abc import Sequence
+from typing import Any, override
+
+import httpx
+
+from coverage_comment import comment_file, json, main, settings, subprocess, tracing
+from tests.benchmarks import stub_github
+
+REPOSITORY = "owner/repo"
+DATA_BRANCH = "python-coverage-comment-action-data"
+PR_NUMBER = 2
+PR_BRANCH = "feature"
+HEAD_SHA = "0" * 40
+RUN_ID = 123
+ARTIFACT_ID = 7
+# Functions per module: each takes 6 lines
+NUM_FUNCTIONS = 20
+
+# Bot identity for the commits made outside of the action
+GIT_ENVIRONMENT = {
+    "GIT_AUTHOR_NAME": "replay",
+    "GIT_AUTHOR_EMAIL": "replay@example.com",
+    "GIT_COMMITTER_NAME": "replay",
+    "GIT_COMMITTER_EMAIL": "replay@example.com",
+}
+
+
+@dataclasses.dataclass
+class PhaseResult:
+    name: str
+    exit_code: int
+    duration: float
+    requests: int
+    # Peak of the memory allocated by Python code, subprocesses excluded
+    peak_memory: int
+    rate_limit_remaining: int | None
+
+    def __str__(self) -> str:
+        return (
+            f"{self.name:<26} exit {self.exit_code}  {self.duration * 1000:>8.0f}ms  "
+            f"{self.requests:>3} requests  {self.peak_memory / 1024 / 1024:>7.1f} MiB"
+        )
+
+
+def module_source(index: int) -> str:
+    return "".join(
+        f"def f_{i}(x):\n"
+        f"    if x > {i}:\n"
+        f"        return x - {index}\n"
+        f"    for y in range(x):\n"
+        f"        x += y\n"
+        f"    return x\n"
+        for i in range(NUM_FUNCTIONS)
+    )
+
+
+def make_project(path: pathlib.Path, modules: int) -> str:
+    """
+    Create a git repository with `modules` Python modules, pushed to a bare
+    remote next to it, and measure its coverage. Returns the commit SHA.
+    """
+    remote = path / "remote.git"
+    project = path / "project"
+    project.mkdir()
+    subprocess.run(
+        "git", "init", "--bare", "--initial-branch=main", str(remote), path=path
+    )
+
+    for index in range(modules):
+        (project / f"module_{index}.py").write_text(module_source(index))
+    (project / "main.py").write_text(
+        "import importlib\n"
+        f"for index in range({modules}):\n"
+        "    module = importlib.import_module(f'module_{index}')\n"
+        "    module.f_0(index % 3)\n"
+    )
+    (project / ".coveragerc").write_text(
+        "[run]\nbranch = true\nrelative_files = true\n"
+    )
+
+    git = subprocess.Git()
+    git.cwd = project
+    git.init("--initial-branch=main")
+    git.add(".")
+    git.commit("--message", "Initial commit", env=GIT_ENVIRONMENT)
+    git.remote("add", "origin", str(remote))
+    git.push("origin", "main")
+
+    subprocess.run("coverage", "run", "main.py", path=project)
+    return git.rev_parse("HEAD").strip()
+
+
+def make_diff(modules: int) -> str:
+    """
+    The diff of a PR adding a few lines to a tenth of the modules.
+    """
+    chunks: list[str] = []
+    for index in range(max(1, modules // 10)):
+        path = f"module_{index}.py"
+        chunks.append(
+            f"diff --git a/{path} b/{path}\n"
+            f"--- a/{path}\n"
+            f"+++ b/{path}\n"
+            "@@ -1,6 +1,6 @@\n"
+            f"+def f_0(x):\n"
+            f"+    if x > 0:\n"
+            "@@ -7,0 +7,6 @@\n" + "".join(f"+    line {line}\n" for line in range(6))
+        )
+    return "".join(chunks)
+
+
+def read_remote_file(remote: pathlib.Path):
+    def _(path: str, ref: str) -> str | None:
+        try:
+            return subprocess.run(
+                "git", "--git-dir", str(remote), "show", f"{ref}:{path}", path=remote
+            )
+        except subprocess.SubProcessError:
+            return None
+
+    return _
+
+
+def graphql_call(repository: dict[str, Any]) -> stub_github.RecordedCall:
+    return stub_github.RecordedCall(
+        method="POST",
+        path="/graphql",
+        body=json.dumps(
+            {
+                "data": {
+                    "viewer": {"login": "github-actions[bot]"},
+                    "repository": {
+                        "defaultBranchRef": {"name": "main"},
+                        "visibility": "PUBLIC",
+                    }
+                    | repository,
+                }
+            }
+        ),
+    )
+
+
+def repository_call() -> stub_github.RecordedCall:
+    return stub_github.RecordedCall(
+        method="GET",
+        path=f"/repos/{REPOSITORY}",
+        body=json.dumps({"default_branch": "main", "visibility": "public"}),
+    )
+
+
+def pull_request() -> dict[str, Any]:
+    return {
+        "number": PR_NUMBER,
+        "state": "OPEN",
+        "headRefOid": HEAD_SHA,
+        "headRepositoryOwner": {"login": "owner"},
+        "comments": {
+            "pageInfo": {"hasNextPage": False},
+            "nodes": [
+                {
+                    "databaseId": 1,
+                    "body": f"Previous comment\n{comment_file.get_marker(marker_id=None)}",
+                    "author": {"__typename": "Bot", "login": "github-actions"},
+                }
+            ],
+        },
+    }
+
+
+def save_calls() -> list[stub_github.RecordedCall]:
+    return [
+        repository_call(),
+        stub_github.RecordedCall(
+            method="GET",
+            path="/static/v1",
+            body="<svg>badge</svg>",
+            content_type="image/svg+xml",
+        ),
+    ]
+
+
+def process_pr_calls(modules: int) -> list[stub_github.RecordedCall]:
+    return [
+        graphql_call({"pullRequest": pull_request()}),
+        stub_github.RecordedCall(
+            method="GET",
+            path=f"/repos/{REPOSITORY}/pulls/{PR_NUMBER}",
+            body=make_diff(modules=modules),
+            content_type="application/vnd.github.v3.diff",
+        ),
+    ]
+
+
+def post_comment_calls(artifact: bytes) -> list[stub_github.RecordedCall]:
+    return [
+        stub_github.RecordedCall(
+            method="GET",
+            path=f"/repos/{REPOSITORY}/actions/runs/{RUN_ID}",
+            body=json.dumps(
+                {
+                    "head_branch": PR_BRANCH,
+                    "head_sha": HEAD_SHA,
+                    "head_repository": {"owner": {"login": "owner"}},
+                }
+            ),
+        ),
+        repository_call(),
+        graphql_call({"pullRequests": {"nodes": [pull_request()]}}),
+        stub_github.RecordedCall(
+            method="GET",
+            path=f"/repos/{REPOSITORY}/actions/runs/{RUN_ID}/artifacts",
+            body=json.dumps(
+                {
+                    "total_count": 1,
+                    "artifacts": [
+                        {"id": ARTIFACT_ID, "name": "python-coverage-comment-action"}
+                    ],
+                }
+            ),
+        ),
+        stub_github.RecordedCall(
+            method="GET",
+            path=f"/repos/{REPOSITORY}/actions/artifacts/{ARTIFACT_ID}/zip",
+            body=artifact,
+            content_type="application/zip",
+        ),
+        stub_github.RecordedCall(
+            method="PATCH",
+            path=f"/repos/{REPOSITORY}/issues/comments/1",
+            body=json.dumps({"id": 1}),
+        ),
+    ]
+
+
+def make_artifact(path: pathlib.Path) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zip_file:
+        zip_file.write(path, arcname=path.name)
+    return buffer.getvalue()
+
+
+class LocalTransport(httpx.HTTPTransport):
+    """
+    Sends every request to the stub server, whatever its host (e.g. the
+    badge requests to img.shields.io).
+    """
+
+    def __init__(self, url: str, **kwargs: Any):
+        self.url = httpx.URL(url)
+        super().__init__(**kwargs)
+
+    @override
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        request.url = request.url.copy_with(
+            scheme=self.url.scheme, host=self.url.host, port=self.url.port
+        )
+        return super().handle_request(request)
+
+
+def run_phase(
+    name: str, config: settings.Config, server: stub_github.StubGitHub
+) -> PhaseResult:
+    recorder = tracing.RequestRecorder()
+
+    def transport() -> httpx.BaseTransport:
+        return tracing.RecordingTransport(
+            transport=LocalTransport(url=server.url, limits=config.HTTP_LIMITS),
+            recorder=recorder,
+        )
+
+    with (
+        httpx.Client(
+            base_url=config.GITHUB_BASE_URL,
+            follow_redirects=True,
+            headers={"Authorization": f"token {config.GITHUB_TOKEN}"},
+            transport=transport(),
+        ) as github_session,
+        httpx.Client(transport=transport()) as http_session,
+    ):
+        tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            exit_code = main.action(
+                config=config,
+                github_session=github_session,
+                http_session=http_session,
+                git=subprocess.Git(),
+            )
+        finally:
+            duration = time.perf_counter() - start
+            _, peak_memory = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+    remaining = [
+        record.rate_limit_remaining
+        for record in recorder.records
+        if record.rate_limit_remaining is not None
+    ]
+    return PhaseResult(
+        name=name,
+        exit_code=exit_code,
+        duration=duration,
+        requests=len(recorder.records),
+        peak_memory=peak_memory,
+        rate_limit_remaining=remaining[-1] if remaining else None,
+    )
+
+
+def replay(
+    path: pathlib.Path,
+    modules: int,
+    latency: float = 0.0,
+    connection_latency: float = 0.0,
+    rate_limit: int | None = 5000,
+) -> list[PhaseResult]:
+    sha = make_project(path=path, modules=modules)
+    project = path / "project"
+    event_path = path / "event.json"
+    event_path.write_text(json.dumps({"pull_request": {"base": {"sha": sha}}}))
+
+    server = stub_github.StubGitHub(
+        calls=[],
+        connection_latency=connection_latency,
+        latency=latency,
+        rate_limit=rate_limit,
+        contents=read_remote_file(remote=path / "remote.git"),
+    )
+
+    def config(**kwargs: Any) -> settings.Config:
+        return settings.Config(
+            GITHUB_TOKEN="token",
+            GITHUB_REPOSITORY=REPOSITORY,
+            GITHUB_BASE_URL=server.url,
+            GITHUB_STEP_SUMMARY=path / "step_summary.md",
+            GITHUB_SHA=sha,
+            **kwargs,
+        )
+
+    results: list[PhaseResult] = []
+    with server, contextlib.chdir(project):
+        server.set_calls(save_calls())
+        results.append(
+            run_phase(
+                name="save_coverage_data_files",
+                config=config(GITHUB_REF="refs/heads/main", GITHUB_EVENT_NAME="push"),
+                server=server,
+            )
+        )
+
+        server.set_calls(process_pr_calls(modules=modules))
+        pr_config = config(
+            GITHUB_REF=f"refs/pull/{PR_NUMBER}/merge",
+            GITHUB_BASE_REF="main",
+            GITHUB_EVENT_NAME="pull_request",
+            GITHUB_EVENT_PATH=event_path,
+            FORCE_WORKFLOW_RUN=True,
+        )
+        results.append(run_phase(name="process_pr", config=pr_config, server=server))
+
+        server.set_calls(
+            post_comment_calls(
+                artifact=make_artifact(project / pr_config.FINAL_COMMENT_FILENAME)
+            )
+        )
+        results.append(
+            run_phase(
+                name="post_comment",
+                config=config(
+                    GITHUB_REF="refs/heads/main",
+                    GITHUB_EVENT_NAME="workflow_run",
+                    GITHUB_PR_RUN_ID=RUN_ID,
+                ),
+                server=server,
+            )
+        )
+
+    return results
+
+
+def parse_args(argv: Sequence[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m tests.benchmarks.replay", description=__doc__.split("\n\n")[0]
+    )
+    parser.add_argument("--modules", type=int, default=200, help="Size of the project")
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds added to each request"
+    )
+    parser.add_argument(
+        "--connection-latency",
+        type=float,
+        default=0.0,
+        help="Seconds added to each new connection",
+    )
+    parser.add_argument(
+        "--rate-limit", type=int, default=5000, help="Rate limit of the stub API"
+    )
+    parser.add_argument("--verbose", action="store_true", help="Show the action logs")
+    return parser.parse_args(argv)
+
+
+def cli(argv: Sequence[str] | None = None) -> int:
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    logging.basicConfig(level="DEBUG" if args.verbose else "WARNING")
+
+    with tempfile.TemporaryDirectory() as path:
+        results = replay(
+            path=pathlib.Path(path),
+            modules=args.modules,
+            latency=args.latency,
+            connection_latency=args.connection_latency,
+            rate_limit=args.rate_limit,
+        )
+
+    for result in results:
+        print(result)
+    remaining = results[-1].rate_limit_remaining
+    if remaining is not None:
+        print(f"Rate limit remaining: {remaining}/{args.rate_limit}")
+    return max(result.exit_code for result in results)
+
+
+if __name__ == "__main__":
+    sys.exit(cli())
@@ -0,0 +1,202 @@
+"""
+A local stand-in for the GitHub API, used to replay recorded call sequences
+without touching the network.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import http.server
+import re
+import threading
+import time
+import urllib.parse
+from collections.abc import Callable
+from typing import Any
+
+from coverage_comment import json
+
+
+@dataclasses.dataclass(frozen=True)
+class RecordedCall:
+    method: str
+    path: str
+    status: int = 200
+    body: str | bytes = ""
+    content_type: str = "application/json"
+
+
+# The calls made by `main.process_pr` on a PR that already has a comment,
+# in the order the action makes them.
+PROCESS_PR_CALLS = [
+    RecordedCall(
+        method="GET",
+        path="/repos/owner/repo",
+        body=json.dumps({"default_branch": "main", "visibility": "public"}),
+    ),
+    RecordedCall(
+        method="GET",
+        path="/repos/owner/repo/pulls/2",
+        body="diff --git a/foo.py b/foo.py\n--- a/foo.py\n+++ b/foo.py\n@@ -1,0 +2,2 @@\n+a\n+b\n",
+        content_type="application/vnd.github.v3.diff",
+    ),
+    RecordedCall(
+        method="GET",
+        path="/repos/owner/repo/contents/summary-index.json",
+        status=404,
+        body=json.dumps({"message": "Not Found"}),
+    ),
+    RecordedCall(
+        method="GET",
+        path="/repos/owner/repo/contents/data.json",
+        status=404,
+        body=json.dumps({"message": "Not Found"}),
+    ),
+    RecordedCall(
+        method="GET",
+        path="/user",
+        body=json.dumps({"login": "foo"}),
+    ),
+    RecordedCall(
+        method="GET",
+        path="/repos/owner/repo/issues/2/comments",
+        body=json.dumps(
+            [{"id": 1, "user": {"login": "foo"}, "body": "<!-- marker -->"}]
+        ),
+    ),
+    RecordedCall(
+        method="PATCH",
+        path="/repos/owner/repo/issues/comments/1",
+        body=json.dumps({"id": 1}),
+    ),
+]
+
+
+# Reads a file from a branch of the repository, or returns None if there's no
+# such file
+type ContentsReader = Callable[[str, str], str | None]
+
+CONTENTS_PATH = re.compile(r"^/repos/[^/]+/[^/]+/contents/(?P<path>.+)$")
+
+
+class StubGitHub(http.server.ThreadingHTTPServer):
+    """
+    Serves recorded calls over HTTP/1.1 with keep-alive. `connection_latency`
+    is spent once per new connection, to mimic the cost of a TCP + TLS
+    handshake with the real API, and `latency` once per request.
+    When `rate_limit` is set, responses carry GitHub's rate limit headers,
+    counting down from it. Calls to the contents API are answered with
+    `contents` if given, instead of recorded calls. Successful GET responses
+    carry an ETag, and are answered with a 304 when the client already has
+    them (counted in `not_modified`).
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        calls: list[RecordedCall],
+        connection_latency: float = 0.0,
+        latency: float = 0.0,
+        rate_limit: int | None = None,
+        contents: ContentsReader | None = None,
+    ):
+        self.set_calls(calls)
+        self.connection_latency = connection_latency
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.contents = contents
+        self.connections = 0
+        self.requests = 0
+        self.not_modified = 0
+        self.lock = threading.Lock()
+        super().__init__(("127.0.0.1", 0), StubHandler)
+
+    def set_calls(self, calls: list[RecordedCall]) -> None:
+        self.calls = {(call.method, call.path): call for call in calls}
+
+    def find_call(self, method: str, url: str) -> RecordedCall:
+        path, _, query = url.partition("?")
+        call = self.calls.get((method, path))
+        if call:
+            return call
+
+        match = CONTENTS_PATH.match(path)
+        if self.contents and method == "GET" and match:
+            ref = urllib.parse.parse_qs(query).get("ref", [""])[0]
+            contents = self.contents(urllib.parse.unquote(match["path"]), ref)
+            if contents is not None:
+                return RecordedCall(
+                    method=method,
+                    path=path,
+                    body=contents,
+                    content_type="application/vnd.github.raw+json",
+                )
+
+        return RecordedCall(method=method, path=path, status=404)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host!s}:{port}"
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args: object):
+        self.shutdown()
+        self.server_close()
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately: without this, Nagle's
+    # algorithm would stall every response on kept-alive connections.
+    disable_nagle_algorithm = True
+    server: StubGitHub
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+        time.sleep(self.server.connection_latency)
+
+    def log_message(self, format: str, *args: Any):
+        pass
+
+    def handle_call(self):
+        length = int(self.headers.get("content-length") or 0)
+        self.rfile.read(length)
+        with self.server.lock:
+            self.server.requests += 1
+            requests = self.server.requests
+        time.sleep(self.server.latency)
+
+        call = self.server.find_call(method=self.command, url=self.path)
+
+        body = call.body.encode() if isinstance(call.body, str) else call.body
+        status = call.status
+        etag = None
+        if self.command == "GET" and status == 200:
+            etag = f'"{hashlib.sha1(body).hexdigest()}"'
+            if self.headers.get("if-none-match") == etag:
+                with self.server.lock:
+                    self.server.not_modified += 1
+                status, body = 304, b""
+
+        self.send_response(status)
+        self.send_header("content-type", call.content_type)
+        self.send_header("content-length", str(len(body)))
+        if etag:
+            self.send_header("etag", etag)
+        if self.server.rate_limit is not None:
+            self.send_header("x-ratelimit-limit", str(self.server.rate_limit))
+            remaining = max(self.server.rate_limit - requests, 0)
+            self.send_header("x-ratelimit-remaining", str(remaining))
+            self.send_header("x-ratelimit-used", str(requests))
+            self.send_header("x-ratelimit-reset", str(int(time.time()) + 3600))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_PATCH = do_PUT = do_DELETE = handle_call
@@ -0,0 +1,127 @@
+"""
+Generators of synthetic inputs for the benchmarks: coverage reports, PR diffs
+and previous data files of a code base of any size.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import decimal
+import pathlib
+import random
+from typing import Any
+
+from coverage_comment import files
+
+# Every n-th line of a file is blank, and doesn't count as a statement
+BLANK_LINE_EVERY = 5
+# Number of lines added by each hunk of the diff
+HUNK_SIZE = 6
+
+
+@dataclasses.dataclass(frozen=True)
+class Scale:
+    files: int
+    lines: int
+    # Per changed file. The diff changes a tenth of the files.
+    hunks: int
+
+    @property
+    def changed_files(self) -> int:
+        return max(1, self.files // 10)
+
+
+def file_path(index: int) -> str:
+    return f"package_{index % 50}/module_{index}.py"
+
+
+def make_file_data(
+    rng: random.Random, lines: int, missing_rate: float
+) -> dict[str, Any]:
+    statements = [line for line in range(1, lines + 1) if line % BLANK_LINE_EVERY]
+    missing = [line for line in statements if rng.random() < missing_rate]
+    missing_set = set(missing)
+    executed = [line for line in statements if line not in missing_set]
+    return {
+        "executed_lines": executed,
+        "summary": {
+            "covered_lines": len(executed),
+            "num_statements": len(statements),
+            "percent_covered": 100 * len(executed) / len(statements),
+            "missing_lines": len(missing),
+            "excluded_lines": 0,
+        },
+        "missing_lines": missing,
+        "excluded_lines": [],
+    }
+
+
+def make_coverage_json(scale: Scale, seed: int = 0) -> dict[str, Any]:
+    """
+    A report in the format of `coverage json`, without branch coverage.
+    """
+    rng = random.Random(seed)
+    report_files = {
+        file_path(index): make_file_data(
+            rng=rng, lines=scale.lines, missing_rate=rng.uniform(0, 0.5)
+        )
+        for index in range(scale.files)
+    }
+    totals = {
+        key: sum(data["summary"][key] for data in report_files.values())
+        for key in ["covered_lines", "num_statements", "missing_lines"]
+    }
+    return {
+        "meta": {
+            "version": "7.0.0",
+            "timestamp": "2000-01-01T00:00:00",
+            "branch_coverage": False,
+            "show_contexts": False,
+        },
+        "files": report_files,
+        "totals": totals
+        | {
+            "percent_covered": 100 * totals["covered_lines"] / totals["num_statements"],
+            "excluded_lines": 0,
+        },
+    }
+
+
+def make_diff(scale: Scale, seed: int = 0) -> str:
+    """
+    A unified diff (as returned by GitHub) adding lines to the changed files.
+    """
+    rng = random.Random(seed)
+    chunks: list[str] = []
+    for index in range(scale.changed_files):
+        path = file_path(index)
+        chunks.append(
+            f"diff --git a/{path} b/{path}\n"
+            "index 1234567..89abcdef 100644\n"
+            f"--- a/{path}\n"
+            f"+++ b/{path}\n"
+        )
+        starts = sorted(
+            rng.sample(
+                range(1, scale.lines - HUNK_SIZE, HUNK_SIZE),
+                k=min(scale.hunks, scale.lines // HUNK_SIZE - 1),
+            )
+        )
+        for start in starts:
+            chunks.append(f"@@ -{start},0 +{start},{HUNK_SIZE} @@ def f():\n")
+            chunks.extend(f"+    x = {line}\n" for line in range(HUNK_SIZE))
+    return "".join(chunks)
+
+
+def make_previous_datafile(scale: Scale, seed: int = 1) -> str:
+    """
+    The data file stored by the previous save, for a slightly different
+    coverage of the same files.
+    """
+    raw_coverage_data = make_coverage_json(scale=scale, seed=seed)
+    totals = raw_coverage_data["totals"]
+    return files.compute_datafile(
+        raw_coverage_data=raw_coverage_data,
+        line_rate=decimal.Decimal(totals["percent_covered"]),
+        coverage_path=pathlib.Path("."),
+    )
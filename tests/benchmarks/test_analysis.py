@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import functools
+import os
+
+from coverage_comment import coverage as coverage_module
+from coverage_comment import subprocess
+
+# A large code base
+NUM_MODULES = 400
+NUM_FUNCTIONS = 20
+
+
+def module_source(index: int) -> str:
+    return "".join(
+        f"def f_{i}(x):\n"
+        f"    if x > {i}:\n"
+        f"        return x - {index}\n"
+        f"    for y in range(x):\n"
+        f"        x += y\n"
+        f"    return x\n\n"
+        for i in range(NUM_FUNCTIONS)
+    )
+
+
+def test_generate_json_report(tmp_path, benchmark):
+    for index in range(NUM_MODULES):
+        (tmp_path / f"module_{index}.py").write_text(module_source(index))
+    (tmp_path / "main.py").write_text(
+        "import importlib\n"
+        f"for index in range({NUM_MODULES}):\n"
+        "    module = importlib.import_module(f'module_{index}')\n"
+        "    module.f_0(index % 3)\n"
+    )
+    (tmp_path / ".coveragerc").write_text("[run]\nbranch = true\n")
+    subprocess.run("coverage", "run", "main.py", path=tmp_path)
+
+    timings = {
+        workers: benchmark(
+            f"Analysis with {workers} workers",
+            functools.partial(
+                coverage_module.generate_json_report,
+                coverage_path=tmp_path,
+                workers=workers,
+            ),
+            rounds=3,
+        )
+        for workers in [1, 2, 4, 8]
+    }
+
+    if (os.process_cpu_count() or 1) > 1:
+        assert timings[2].best < timings[1].best
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import os
+import shutil
+
+from coverage_comment import coverage as coverage_module
+from coverage_comment import subprocess
+
+# A large test matrix
+NUM_SHARDS = 400
+
+
+def test_combine(tmp_path, benchmark, write_coverage_data_files):
+    shards_path = tmp_path / "shards"
+    shards_path.mkdir()
+    write_coverage_data_files(
+        path=shards_path, count=NUM_SHARDS, num_files=100, num_lines=200
+    )
+    run_path = tmp_path / "run"
+
+    def setup():
+        # Combining removes the shards
+        shutil.rmtree(run_path, ignore_errors=True)
+        shutil.copytree(shards_path, run_path)
+
+    def sequential():
+        setup()
+        subprocess.run("coverage", "combine", path=run_path)
+
+    def parallel():
+        setup()
+        coverage_module.combine(coverage_path=run_path)
+
+    sequential_timing = benchmark("coverage combine", sequential, rounds=3)
+    parallel_timing = benchmark(
+        f"Parallel combine ({os.process_cpu_count()} CPUs)", parallel, rounds=3
+    )
+
+    if (os.process_cpu_count() or 1) > 1:
+        assert parallel_timing.best < sequential_timing.best
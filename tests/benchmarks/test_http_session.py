@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import pathlib
+
+import httpx
+
+from coverage_comment import settings
+from tests.benchmarks import stub_github
+
+# Roughly what a TLS handshake with api.github.com costs from a runner
+CONNECTION_LATENCY = 0.02
+
+
+def replay(client: httpx.Client, calls: list[stub_github.RecordedCall]):
+    for call in calls:
+        client.request(call.method, call.path)
+
+
+def test_process_pr_call_sequence(stub_server, benchmark):
+    calls = stub_github.PROCESS_PR_CALLS
+    server = stub_server(calls=calls, connection_latency=CONNECTION_LATENCY)
+    config = settings.Config(
+        GITHUB_TOKEN="foo",
+        GITHUB_REPOSITORY="owner/repo",
+        GITHUB_REF="refs/pull/2/merge",
+        GITHUB_EVENT_NAME="pull_request",
+        GITHUB_STEP_SUMMARY=pathlib.Path("step_summary"),
+    )
+
+    def without_keepalive():
+        limits = httpx.Limits(max_keepalive_connections=0)
+        with httpx.Client(base_url=server.url, limits=limits) as client:
+            replay(client=client, calls=calls)
+
+    def with_session():
+        with httpx.Client(
+            base_url=server.url, http2=config.HTTP2, limits=config.HTTP_LIMITS
+        ) as client:
+            replay(client=client, calls=calls)
+
+    cold = benchmark("One connection per call", without_keepalive)
+    connections = server.connections
+
+    pooled = benchmark("Pooled session", with_session)
+
+    # 1 connection per round
+    assert server.connections - connections == 5
+    assert pooled.best < cold.best
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import statistics
+import time
+import tracemalloc
+from collections.abc import Callable, Collection
+
+import httpx
+import pytest
+
+from coverage_comment import github_client, json
+
+USER = {
+    "login": "octocat",
+    "id": 1,
+    "node_id": "MDQ6VXNlcjE=",
+    "avatar_url": "https://github.com/images/error/octocat_happy.gif",
+    "gravatar_id": "",
+    "url": "https://api.github.com/users/octocat",
+    "html_url": "https://github.com/octocat",
+    "followers_url": "https://api.github.com/users/octocat/followers",
+    "following_url": "https://api.github.com/users/octocat/following{/other_user}",
+    "gists_url": "https://api.github.com/users/octocat/gists{/gist_id}",
+    "starred_url": "https://api.github.com/users/octocat/starred{/owner}{/repo}",
+    "subscriptions_url": "https://api.github.com/users/octocat/subscriptions",
+    "organizations_url": "https://api.github.com/users/octocat/orgs",
+    "repos_url": "https://api.github.com/users/octocat/repos",
+    "events_url": "https://api.github.com/users/octocat/events{/privacy}",
+    "received_events_url": "https://api.github.com/users/octocat/received_events",
+    "type": "User",
+    "site_admin": False,
+}
+
+
+def comment(id: int) -> dict:
+    url = f"https://api.github.com/repos/owner/repo/issues/comments/{id}"
+    return {
+        "id": id,
+        "node_id": "MDEyOklzc3VlQ29tbWVudDE=",
+        "url": url,
+        "html_url": f"https://github.com/owner/repo/pull/2#issuecomment-{id}",
+        "issue_url": "https://api.github.com/repos/owner/repo/issues/2",
+        "body": "Some review comment. " * 50,
+        "user": USER,
+        "created_at": "2011-04-14T16:00:49Z",
+        "updated_at": "2011-04-14T16:00:49Z",
+        "author_association": "COLLABORATOR",
+        "reactions": {
+            "url": f"{url}/reactions",
+            "total_count": 0,
+            **{key: 0 for key in ["+1", "-1", "laugh", "confused", "heart"]},
+        },
+        "performed_via_github_app": None,
+    }
+
+
+def artifact(id: int) -> dict:
+    url = f"https://api.github.com/repos/owner/repo/actions/artifacts/{id}"
+    return {
+        "id": id,
+        "node_id": "MDg6QXJ0aWZhY3QxMQ==",
+        "name": f"coverage-{id}",
+        "size_in_bytes": 556,
+        "url": url,
+        "archive_download_url": f"{url}/zip",
+        "expired": False,
+        "created_at": "2020-01-10T14:59:22Z",
+        "expires_at": "2020-03-21T14:59:22Z",
+        "updated_at": "2020-02-21T14:59:22Z",
+        "workflow_run": {
+            "id": 2332938,
+            "repository_id": 1296269,
+            "head_repository_id": 1296269,
+            "head_branch": "main",
+            "head_sha": "328faa0536e6fef19753d9d91dc96a9931694ce3",
+        },
+    }
+
+
+# The action only ever reads a few fields of these payloads: see the callers
+# in coverage_comment/github.py
+PAYLOADS = {
+    "comments": ([comment(id) for id in range(1000)], {"id", "user", "login", "body"}),
+    "artifacts": (
+        {"total_count": 1000, "artifacts": [artifact(id) for id in range(1000)]},
+        {"artifacts", "total_count", "id", "name"},
+    ),
+}
+
+
+def decode(response: httpx.Response, fields: Collection[str] | None):
+    return github_client.response_contents(
+        response=response, text=False, bytes=False, fields=fields
+    )
+
+
+def retained_memory(response: httpx.Response, fields: Collection[str] | None) -> int:
+    tracemalloc.start()
+    try:
+        result = decode(response=response, fields=fields)
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return size
+
+
+def slowdown(
+    reference: Callable[[], object], func: Callable[[], object], rounds: int = 30
+) -> float:
+    """
+    Median ratio of the durations of `func` and `reference`, run one after
+    the other in each round: a few milliseconds each, timed apart, are at
+    the mercy of the load of the machine.
+    """
+    ratios = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        reference()
+        middle = time.perf_counter()
+        func()
+        ratios.append((time.perf_counter() - middle) / (middle - start))
+    return statistics.median(ratios)
+
+
+@pytest.mark.parametrize("payload", PAYLOADS)
+def test_decode_listing(benchmark, capsys, payload):
+    data, fields = PAYLOADS[payload]
+    response = httpx.Response(
+        200,
+        content=json.dumps(data).encode(),
+        headers={"content-type": "application/json"},
+    )
+
+    benchmark(f"{payload}: full decoding", lambda: decode(response, None))
+    benchmark(f"{payload}: projected decoding", lambda: decode(response, fields))
+
+    full_memory = retained_memory(response=response, fields=None)
+    projected_memory = retained_memory(response=response, fields=fields)
+    with capsys.disabled():
+        print(
+            f"{payload}: {len(response.content) / 1024:.0f} KiB of JSON, "
+            f"retained {full_memory / 1024:.0f} KiB (full) vs "
+            f"{projected_memory / 1024:.0f} KiB (projected)"
+        )
+
+    assert projected_memory < full_memory / 2
+    # Dropping keys costs a dict comprehension per object, which shouldn't
+    # be noticeably slower than building the full objects.
+    ratio = slowdown(
+        reference=lambda: decode(response, None),
+        func=lambda: decode(response, fields),
+    )
+    assert ratio < 1.5, f"Projected decoding is {ratio:.2f} times slower"
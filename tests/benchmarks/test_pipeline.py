@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import decimal
+import functools
+import pathlib
+
+import pytest
+
+from coverage_comment import coverage as coverage_module
+from coverage_comment import diff_grouper, files, template
+from tests.benchmarks import synthetic
+
+SCALES = {
+    "small": synthetic.Scale(files=100, lines=200, hunks=3),
+    "monorepo": synthetic.Scale(files=5000, lines=400, hunks=5),
+}
+
+
+def render_comment(coverage, diff_coverage, previous_coverage, files_info, count):
+    return template.get_comment_markdown(
+        coverage=coverage,
+        diff_coverage=diff_coverage,
+        previous_coverage=previous_coverage,
+        previous_coverage_rate=previous_coverage.info.percent_covered,
+        files=files_info,
+        count_files=count,
+        max_files=25,
+        minimum_green=decimal.Decimal("100"),
+        minimum_orange=decimal.Decimal("70"),
+        github_host="https://github.com",
+        repo_name="owner/repo",
+        pr_number=2,
+        branch_name=None,
+        base_template=template.read_template_file("comment.md.j2"),
+        marker="<!-- marker -->",
+    )
+
+
+@pytest.mark.parametrize("scale", SCALES)
+def test_pipeline(benchmark, baseline, scale):
+    """
+    The stages of `main.process_pr` that only depend on the size of the code
+    base and of the diff.
+    """
+    size = SCALES[scale]
+    raw_coverage_data = synthetic.make_coverage_json(scale=size)
+    diff = synthetic.make_diff(scale=size)
+    previous_datafile = synthetic.make_previous_datafile(scale=size)
+    rounds = 5 if scale == "small" else 3
+
+    def stage(name, func):
+        timing = benchmark(f"{scale}: {name}", func, rounds=rounds, autorange=True)
+        baseline.check(timing)
+        return func()
+
+    coverage = stage(
+        "extract_info",
+        functools.partial(
+            coverage_module.extract_info,
+            data=raw_coverage_data,
+            coverage_path=pathlib.Path("."),
+        ),
+    )
+    previous_coverage = files.load_datafile(contents=previous_datafile).coverage
+    assert previous_coverage
+    added_lines = stage(
+        "get_added_lines",
+        functools.partial(coverage_module.get_added_lines, diff=diff),
+    )
+    diff_coverage = stage(
+        "get_diff_coverage_info",
+        functools.partial(
+            coverage_module.get_diff_coverage_info,
+            added_lines=added_lines,
+            coverage=coverage,
+        ),
+    )
+    files_info, count = stage(
+        "select_files",
+        functools.partial(
+            template.select_files,
+            coverage=coverage,
+            diff_coverage=diff_coverage,
+            previous_coverage=previous_coverage,
+            max_files=25,
+        ),
+    )
+    stage(
+        "get_diff_missing_groups",
+        lambda: list(
+            diff_grouper.get_diff_missing_groups(
+                coverage=coverage, diff_coverage=diff_coverage
+            )
+        ),
+    )
+    comment = stage(
+        "get_comment_markdown",
+        functools.partial(
+            render_comment,
+            coverage=coverage,
+            diff_coverage=diff_coverage,
+            previous_coverage=previous_coverage,
+            files_info=files_info,
+            count=count,
+        ),
+    )
+
+    assert len(added_lines) == size.changed_files
+    assert "<!-- marker -->" in comment
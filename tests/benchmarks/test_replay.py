@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+from coverage_comment import subprocess
+from tests.benchmarks import replay
+
+
+def test_replay(tmp_path):
+    results = replay.replay(path=tmp_path, modules=5, latency=0.001)
+
+    assert [(result.name, result.exit_code) for result in results] == [
+        ("save_coverage_data_files", 0),
+        ("process_pr", 0),
+        ("post_comment", 0),
+    ]
+    assert all(result.requests for result in results)
+    assert results[-1].rate_limit_remaining is not None
+
+    files = subprocess.run(
+        "git",
+        "--git-dir",
+        str(tmp_path / "remote.git"),
+        "ls-tree",
+        "--name-only",
+        replay.DATA_BRANCH,
+        path=tmp_path,
+    ).split()
+    assert {"data.json", "summary-index.json", "history.csv"} <= set(files)
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import pathlib
+import tracemalloc
+from collections.abc import Callable
+
+from coverage_comment import coverage as coverage_module
+from coverage_comment import json
+
+REPORT_SIZE = 50 * 1024 * 1024
+
+
+def file_data(index: int) -> dict:
+    summary = {
+        "covered_lines": 150,
+        "num_statements": 200,
+        "percent_covered": 75.0,
+        "percent_covered_display": "75",
+        "missing_lines": 50,
+        "excluded_lines": 0,
+    }
+    executed = list(range(index % 7, 2000, 3))
+    missing = list(range(1 + index % 7, 2000, 9))
+    return {
+        "executed_lines": executed,
+        "summary": summary,
+        "missing_lines": missing,
+        "excluded_lines": [],
+        "functions": {
+            f"f_{i}": {"executed_lines": executed[:20], "summary": summary}
+            for i in range(10)
+        },
+        "classes": {"": {"executed_lines": executed, "summary": summary}},
+    }
+
+
+def write_report(path: pathlib.Path) -> None:
+    """A `coverage json` report of about REPORT_SIZE bytes."""
+    size = len(json.dumps(file_data(0)))
+    report = {
+        "meta": {
+            "format": 3,
+            "version": "7.6.0",
+            "timestamp": "2024-07-26T12:00:00.000000",
+            "branch_coverage": False,
+            "show_contexts": False,
+        },
+        "files": {
+            f"src/package_{i // 100}/module_{i}.py": file_data(i)
+            for i in range(REPORT_SIZE // size)
+        },
+        "totals": {
+            "covered_lines": 1,
+            "num_statements": 2,
+            "percent_covered": 50.0,
+            "missing_lines": 1,
+            "excluded_lines": 0,
+        },
+    }
+    path.write_text(json.dumps(report))
+
+
+def peak_memory(func: Callable[[], object]) -> int:
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def test_report_ingestion(tmp_path, benchmark, capsys):
+    report = tmp_path / "coverage.json"
+    write_report(report)
+    coverage_path = pathlib.Path(".")
+
+    def load():
+        data = json.loads_dict(report.read_text())
+        return coverage_module.extract_info(data=data, coverage_path=coverage_path)
+
+    def stream():
+        files = {}
+
+        def add_file(path, file_data):
+            files[coverage_path / path] = coverage_module._make_file_coverage(
+                path=coverage_path / path, data=file_data
+            )
+
+        with report.open() as stdout:
+            json.load_streamed_dict(stream=stdout, callbacks={"files": add_file})
+        return files
+
+    assert load().files == stream()
+
+    benchmark("Full loading", load, rounds=3)
+    benchmark("Streamed loading", stream, rounds=3)
+    load_peak = peak_memory(load)
+    stream_peak = peak_memory(stream)
+    with capsys.disabled():
+        print(
+            f"{report.stat().st_size / 2**20:.0f} MiB report, peak memory "
+            f"{load_peak / 2**20:.0f} MiB (full) vs {stream_peak / 2**20:.0f} MiB "
+            "(streamed)"
+        )
+
+    assert stream_peak < load_peak / 2
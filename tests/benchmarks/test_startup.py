@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import os
+import pathlib
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+from tests.benchmarks import conftest
+
+ROUNDS = 5
+STARTUP_ROUNDS = 10
+PACKAGE_PATH = pathlib.Path(__file__).parents[2] / "coverage_comment"
+
+
+def import_time(module: str) -> float:
+    """
+    Cumulated time to import `module` in a new interpreter, as measured by
+    `python -X importtime`, in seconds.
+    """
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+    match = re.search(rf"\|\s*(\d+) \| {re.escape(module)}$", stderr, re.MULTILINE)
+    assert match, stderr
+    return int(match.group(1)) / 1_000_000
+
+
+@pytest.mark.parametrize(
+    "module",
+    [
+        # What every activity loads (post_comment doesn't need more)
+        "coverage_comment.main",
+        # What process_pr and save_coverage_data_files load on top of it
+        "coverage_comment.template",
+        "coverage_comment.storage",
+    ],
+)
+def test_import_time(baseline, capsys, module):
+    timing = conftest.Timing(
+        name=f"import {module}",
+        durations=[import_time(module) for _ in range(ROUNDS)],
+    )
+    with capsys.disabled():
+        print(f"\n{timing}")
+    baseline.check(timing)
+
+
+def copy_package(path: pathlib.Path, precompiled: bool) -> pathlib.Path:
+    """
+    Copy the package like the Dockerfile does, without any bytecode, and run
+    the same build step if `precompiled`.
+    """
+    shutil.copytree(
+        PACKAGE_PATH,
+        path / "coverage_comment",
+        ignore=shutil.ignore_patterns("__pycache__", "compiled"),
+    )
+    if precompiled:
+        subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "from coverage_comment import template; template.compile_templates()",
+            ],
+            cwd=path,
+            check=True,
+        )
+        subprocess.run(
+            [sys.executable, "-m", "compileall", "-q", "coverage_comment"],
+            cwd=path,
+            check=True,
+        )
+    return path
+
+
+def time_to_first_request(package_path: pathlib.Path, cwd: pathlib.Path) -> float:
+    """
+    Time from the start of the action to its first connection to the GitHub
+    API. The action is stopped there.
+    """
+    with socket.create_server(("127.0.0.1", 0)) as server:
+        server.settimeout(30)
+        host, port = server.getsockname()
+        env = os.environ | {
+            "PYTHONPATH": str(package_path),
+            # Like a new container: bytecode that's not in the image is
+            # compiled again on each run
+            "PYTHONDONTWRITEBYTECODE": "1",
+            "GITHUB_BASE_URL": f"http://{host}:{port}",
+            "GITHUB_REPOSITORY": "owner/repo",
+            "GITHUB_TOKEN": "token",
+            "GITHUB_REF": "refs/heads/main",
+            "GITHUB_EVENT_NAME": "push",
+            "GITHUB_STEP_SUMMARY": str(cwd / "step_summary"),
+        }
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "coverage_comment"],
+            cwd=cwd,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            connection, _ = server.accept()
+            duration = time.perf_counter() - start
+            connection.close()
+        finally:
+            process.kill()
+            process.wait()
+    return duration
+
+
+def test_time_to_first_request(baseline, capsys, tmp_path):
+    builds = ["source", "precompiled"]
+    package_paths = {
+        build: copy_package(tmp_path / build, precompiled=build == "precompiled")
+        for build in builds
+    }
+    # Compiling the bytecode saves a few tens of milliseconds, less than the
+    # load of the machine can add to a run: alternate the builds in each
+    # round so that they are timed under the same conditions
+    durations: dict[str, list[float]] = {build: [] for build in builds}
+    for _ in range(STARTUP_ROUNDS):
+        for build in builds:
+            durations[build].append(
+                time_to_first_request(package_path=package_paths[build], cwd=tmp_path)
+            )
+
+    for build in builds:
+        timing = conftest.Timing(name=f"startup: {build}", durations=durations[build])
+        with capsys.disabled():
+            print(f"\n{timing}")
+        baseline.check(timing)
+
+
+# What a run does first with the packaged templates: the log message, and the
+# comment template (compiling it loads the template it extends)
+RENDER_CODE = """
+import time
+from coverage_comment import template
+
+start = time.perf_counter()
+template.get_log_message(
+    is_public=True,
+    readme_url="url",
+    direct_image_url="url",
+    html_report_url=None,
+    dynamic_image_url=None,
+    endpoint_image_url=None,
+)
+source = template.read_template_file("comment.md.j2")
+loader = template.CommentLoader(base_template=source, custom_template=None)
+env = template.SandboxedEnvironment(
+    loader=template.with_compiled_template(loader, name="base", source=source)
+)
+env.filters.update(
+    template.get_comment_filters(
+        github_host="https://github.com",
+        repo_name="owner/repo",
+        pr_number=1,
+        branch_name=None,
+        minimum_green=template.decimal.Decimal("100"),
+        minimum_orange=template.decimal.Decimal("70"),
+    )
+)
+env.get_template("base")
+print(time.perf_counter() - start)
+"""
+# Each round renders in this many new interpreters, as many runs would
+RENDER_PROCESSES = 10
+
+
+def time_to_first_render(package_path: pathlib.Path) -> float:
+    """
+    Time spent loading the packaged templates in `RENDER_PROCESSES` new
+    interpreters, imports excluded.
+    """
+    env = os.environ | {"PYTHONPATH": str(package_path), "PYTHONDONTWRITEBYTECODE": "1"}
+    return sum(
+        float(
+            subprocess.run(
+                [sys.executable, "-c", RENDER_CODE],
+                cwd=package_path,
+                env=env,
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+        )
+        for _ in range(RENDER_PROCESSES)
+    )
+
+
+def test_first_render(baseline, capsys, tmp_path):
+    timings = {}
+    for build in ["source", "precompiled"]:
+        package_path = copy_package(
+            tmp_path / build, precompiled=build == "precompiled"
+        )
+        timings[build] = conftest.Timing(
+            name=f"first render: {build}",
+            durations=[time_to_first_render(package_path) for _ in range(ROUNDS)],
+        )
+        with capsys.disabled():
+            print(f"\n{timings[build]}")
+
+    baseline.check(timings["source"])
+    # Loading the compiled modules skips parsing and compiling the templates
+    assert timings["precompiled"].median < timings["source"].median / 2
@@ -5,10 +5,12 @@ import decimal
 import io
 import os
 import pathlib
+import random
 import shlex
 import zipfile
 from collections.abc import Callable
 
+import coverage
 import httpx
 import pytest
 
@@ -27,6 +29,8 @@ def base_config():
             "GITHUB_STEP_SUMMARY": pathlib.Path("step_summary"),
             # Action settings
             "MERGE_COVERAGE_FILES": True,
+            # Most tests describe the REST API calls
+            "USE_GRAPHQL_API": False,
         }
         return settings.Config(**(defaults | kwargs))
 
@@ -89,6 +93,9 @@ def session(httpx_mock):
         def get_request(self, *args, **kwargs):
             return httpx_mock.get_request(**self._kwargs(*args, **kwargs))
 
+        def get_requests(self, *args, **kwargs):
+            return httpx_mock.get_requests(**self._kwargs(*args, **kwargs))
+
         def register(self, *args, callback=None, **kwargs):
             if callback:
                 return httpx_mock.add_callback(
@@ -515,3 +522,40 @@ def diff_coverage_obj_more_files(coverage_obj_more_files, make_diff_coverage):
         },
         coverage=coverage_obj_more_files,
     )
+
+
+@pytest.fixture
+def write_coverage_data_files():
+    """
+    Write `count` parallel coverage data files (the kind `coverage combine`
+    reads) in `path`, each with arcs measured on a random part of `num_files`
+    source files.
+    """
+
+    def _(
+        path: pathlib.Path,
+        count: int,
+        num_files: int = 20,
+        num_lines: int = 100,
+        seed: int = 0,
+    ) -> list[pathlib.Path]:
+        rng = random.Random(seed)
+        data_files = []
+        for i in range(count):
+            data = coverage.CoverageData(
+                basename=str(path / ".coverage"), suffix=f"shard-{i}"
+            )
+            data.add_arcs(
+                {
+                    f"pkg/module_{file}.py": {
+                        (line, line + 1)
+                        for line in rng.sample(range(1, num_lines), k=num_lines // 4)
+                    }
+                    for file in rng.sample(range(num_files), k=num_files // 2)
+                }
+            )
+            data.write()
+            data_files.append(pathlib.Path(data.data_filename()))
+        return data_files
+
+    return _
@@ -0,0 +1,438 @@
+from __future__ import annotations
+
+import concurrent.futures
+import contextlib
+import dataclasses
+import json
+import os
+import pathlib
+import sqlite3
+
+import coverage
+import pytest
+
+from coverage_comment import coverage as coverage_module
+from coverage_comment import subprocess
+
+
+def read_data(path: pathlib.Path) -> dict[str, list[tuple[int, int]]]:
+    data = coverage.CoverageData(basename=str(path / ".coverage"))
+    data.read()
+    return {
+        file: sorted(data.arcs(file) or []) for file in sorted(data.measured_files())
+    }
+
+
+@pytest.mark.parametrize("workers", [2, 3])
+def test_combine__parallel__same_as_coverage_combine(
+    tmp_path, write_coverage_data_files, workers, get_logs, monkeypatch
+):
+    monkeypatch.setattr(os, "cpu_count", lambda: 4)
+    count = coverage_module.MIN_FILES_PER_COMBINE_WORKER * workers + 1
+    sequential_path = tmp_path / "sequential"
+    parallel_path = tmp_path / "parallel"
+    for path in (sequential_path, parallel_path):
+        path.mkdir()
+        write_coverage_data_files(path=path, count=count)
+
+    subprocess.run("coverage", "combine", path=sequential_path)
+    coverage_module.combine(coverage_path=parallel_path, workers=workers)
+
+    assert get_logs("INFO", f"Combining {count} coverage files with {workers} workers")
+    assert read_data(parallel_path) == read_data(sequential_path)
+    # Combined files are removed, as with `coverage combine`
+    assert [path.name for path in parallel_path.iterdir()] == [".coverage"]
+
+
+def test_combine__few_files(tmp_path, write_coverage_data_files, get_logs):
+    write_coverage_data_files(path=tmp_path, count=3)
+
+    coverage_module.combine(coverage_path=tmp_path, workers=4)
+
+    assert not get_logs("INFO", "Combining")
+    assert len(read_data(tmp_path)) > 0
+
+
+def test_combine__single_cpu(
+    tmp_path, write_coverage_data_files, get_logs, monkeypatch
+):
+    monkeypatch.setattr(os, "cpu_count", lambda: 1)
+    write_coverage_data_files(
+        path=tmp_path, count=coverage_module.MIN_FILES_PER_COMBINE_WORKER * 4
+    )
+
+    coverage_module.combine(coverage_path=tmp_path, workers=4)
+
+    assert not get_logs("INFO", "Combining")
+    assert [path.name for path in tmp_path.iterdir()] == [".coverage"]
+
+
+@pytest.mark.parametrize("cpu_count", [1, 4])
+def test_combine__error(tmp_path, write_coverage_data_files, monkeypatch, cpu_count):
+    monkeypatch.setattr(os, "cpu_count", lambda: cpu_count)
+    count = coverage_module.MIN_FILES_PER_COMBINE_WORKER * 2
+    write_coverage_data_files(path=tmp_path, count=count)
+    for path in tmp_path.glob(".coverage.*"):
+        path.write_text("not a database")
+
+    with pytest.raises(subprocess.SubProcessError):
+        coverage_module.combine(coverage_path=tmp_path, workers=2)
+
+
+def test_combine_with_cache(tmp_path, write_coverage_data_files, get_logs):
+    reference_path = tmp_path / "reference"
+    cached_path = tmp_path / "cached"
+    for path in (reference_path, cached_path):
+        path.mkdir()
+        write_coverage_data_files(path=path, count=5)
+
+    # First run: nothing in cache
+    coverage_module.combine_with_cache(coverage_path=cached_path)
+    assert get_logs("INFO", "No usable cache of combined coverage data")
+    assert (cached_path / coverage_module.COMBINE_CACHE_DIR / ".coverage").exists()
+
+    # Re-run: the same files are downloaded again, plus a new one
+    for path in (reference_path, cached_path):
+        write_coverage_data_files(path=path, count=6)
+    subprocess.run("coverage", "combine", path=reference_path)
+    coverage_module.combine_with_cache(coverage_path=cached_path)
+
+    assert get_logs(
+        "INFO", "Reusing cached combined coverage data, combining 1 new coverage files"
+    )
+    assert read_data(cached_path) == read_data(reference_path)
+    assert sorted(path.name for path in cached_path.iterdir()) == [
+        ".coverage",
+        coverage_module.COMBINE_CACHE_DIR,
+    ]
+
+
+def test_combine_with_cache__changed_file(
+    tmp_path, write_coverage_data_files, get_logs
+):
+    write_coverage_data_files(path=tmp_path, count=3)
+    coverage_module.combine_with_cache(coverage_path=tmp_path)
+
+    # Different contents, same names
+    write_coverage_data_files(path=tmp_path, count=3, seed=1)
+    coverage_module.combine_with_cache(coverage_path=tmp_path)
+
+    assert get_logs("INFO", "Coverage data files have changed since they were cached")
+    reference_path = tmp_path / "reference"
+    reference_path.mkdir()
+    write_coverage_data_files(path=reference_path, count=3, seed=1)
+    subprocess.run("coverage", "combine", path=reference_path)
+    assert read_data(tmp_path) == read_data(reference_path)
+
+
+def test_combine_with_cache__config_changed(
+    tmp_path, write_coverage_data_files, get_logs
+):
+    write_coverage_data_files(path=tmp_path, count=3)
+    coverage_module.combine_with_cache(coverage_path=tmp_path)
+
+    (tmp_path / ".coveragerc").write_text("[run]\nrelative_files = true\n")
+    write_coverage_data_files(path=tmp_path, count=3)
+    coverage_module.combine_with_cache(coverage_path=tmp_path)
+
+    assert len(get_logs("INFO", "No usable cache")) == 2
+
+
+def test_combine_with_cache__schema_changed(tmp_path, write_coverage_data_files):
+    write_coverage_data_files(path=tmp_path, count=3)
+    coverage_module.combine_with_cache(coverage_path=tmp_path)
+    cached_data_file = tmp_path / coverage_module.COMBINE_CACHE_DIR / ".coverage"
+    with contextlib.closing(sqlite3.connect(cached_data_file)) as connection:
+        connection.execute("update coverage_schema set version = 1")
+        connection.commit()
+
+    assert coverage_module.read_schema_version(cached_data_file) == 1
+    assert (
+        coverage_module.read_combine_cache(
+            cache_dir=cached_data_file.parent,
+            config_hash=coverage_module.hash_coverage_config(coverage_path=tmp_path),
+        )
+        is None
+    )
+
+
+@pytest.mark.parametrize(
+    "manifest",
+    [
+        None,
+        "not json",
+        "[]",
+        '{"version": 0}',
+    ],
+)
+def test_read_combine_cache__invalid_manifest(tmp_path, manifest):
+    if manifest is not None:
+        (tmp_path / "manifest.json").write_text(manifest)
+
+    assert (
+        coverage_module.read_combine_cache(cache_dir=tmp_path, config_hash="") is None
+    )
+
+
+def test_read_schema_version__not_a_database(tmp_path):
+    path = tmp_path / ".coverage"
+    path.write_text("foo")
+
+    assert coverage_module.read_schema_version(path) is None
+
+
+def test_combine_with_cache__other_data_file_name(tmp_path, fake_process):
+    # Coverage is configured to write data files elsewhere: nothing to cache
+    fake_process.register(["coverage", "combine"])
+
+    coverage_module.combine_with_cache(coverage_path=tmp_path)
+
+    assert not (tmp_path / coverage_module.COMBINE_CACHE_DIR).exists()
+
+
+NUM_MODULES = 8
+
+
+@pytest.fixture
+def project(tmp_path):
+    for i in range(NUM_MODULES):
+        (tmp_path / f"module_{i}.py").write_text(
+            "def f(x):\n    if x:\n        return 1\n    return 2\n"
+        )
+    (tmp_path / "main.py").write_text(
+        "".join(f"import module_{i}\n" for i in range(NUM_MODULES))
+        + "module_0.f(True)\nmodule_1.f(False)\n"
+    )
+    (tmp_path / ".coveragerc").write_text("[run]\nbranch = true\n")
+
+    def run():
+        (tmp_path / ".coverage").unlink(missing_ok=True)
+        subprocess.run("coverage", "run", "main.py", path=tmp_path)
+        fingerprints = coverage_module.compute_fingerprints(coverage_path=tmp_path)
+        _, full_coverage = coverage_module.get_coverage_info(
+            merge=False, coverage_path=tmp_path
+        )
+        return full_coverage, fingerprints
+
+    return run
+
+
+def without_timestamp(coverage: coverage_module.Coverage):
+    return dataclasses.replace(
+        coverage, meta=dataclasses.replace(coverage.meta, timestamp=None)
+    )
+
+
+def test_compute_fingerprints(tmp_path, project):
+    _, fingerprints = project()
+
+    assert fingerprints is not None
+    assert sorted(fingerprints.files) == ["main.py"] + [
+        f"module_{i}.py" for i in range(NUM_MODULES)
+    ]
+    # The modules that are not called have the same source and measured lines
+    assert fingerprints.files["module_2.py"] == fingerprints.files["module_3.py"]
+    assert fingerprints.files["module_0.py"] != fingerprints.files["module_1.py"]
+    # Stable across runs
+    assert project()[1] == fingerprints
+
+
+def test_compute_fingerprints__no_data_file(tmp_path):
+    assert coverage_module.compute_fingerprints(coverage_path=tmp_path) is None
+
+
+def test_compute_fingerprints__missing_source(tmp_path, project):
+    project()
+    (tmp_path / "module_3.py").unlink()
+
+    assert coverage_module.compute_fingerprints(coverage_path=tmp_path) is None
+
+
+def test_get_incremental_coverage_info(tmp_path, project, get_logs):
+    previous_coverage, previous_fingerprints = project()
+    assert previous_fingerprints
+
+    # module_2 is now executed, module_3 has a new line (in the diff)
+    (tmp_path / "main.py").write_text(
+        (tmp_path / "main.py").read_text() + "module_2.f(True)\n"
+    )
+    (tmp_path / "module_3.py").write_text(
+        (tmp_path / "module_3.py").read_text() + "x = 1\n"
+    )
+    full_coverage, _ = project()
+
+    result = coverage_module.get_incremental_coverage_info(
+        coverage_path=tmp_path,
+        previous_coverage=previous_coverage,
+        previous_fingerprints=previous_fingerprints,
+        added_files=[tmp_path / "module_3.py"],
+    )
+
+    assert get_logs("INFO", "Analysing 3 changed files out of 9")
+    assert result
+    assert without_timestamp(result) == without_timestamp(full_coverage)
+
+
+def test_get_incremental_coverage_info__nothing_changed(tmp_path, project, get_logs):
+    previous_coverage, previous_fingerprints = project()
+    assert previous_fingerprints
+
+    result = coverage_module.get_incremental_coverage_info(
+        coverage_path=tmp_path,
+        previous_coverage=previous_coverage,
+        previous_fingerprints=previous_fingerprints,
+        added_files=[],
+    )
+
+    assert get_logs("INFO", "Analysing 0 changed files out of 9")
+    assert result
+    assert without_timestamp(result) == without_timestamp(previous_coverage)
+    assert result.meta.timestamp != previous_coverage.meta.timestamp
+
+
+def test_get_incremental_coverage_info__too_many_changes(tmp_path, project, get_logs):
+    previous_coverage, previous_fingerprints = project()
+    assert previous_fingerprints
+
+    assert (
+        coverage_module.get_incremental_coverage_info(
+            coverage_path=tmp_path,
+            previous_coverage=previous_coverage,
+            previous_fingerprints=previous_fingerprints,
+            added_files=[tmp_path / f"module_{i}.py" for i in range(5)],
+        )
+        is None
+    )
+    assert get_logs("INFO", "5 files changed, analysing all files")
+
+
+def test_get_incremental_coverage_info__environment_changed(
+    tmp_path, project, get_logs
+):
+    previous_coverage, previous_fingerprints = project()
+    assert previous_fingerprints
+
+    (tmp_path / ".coveragerc").write_text("[run]\nbranch = false\n")
+    project()
+
+    assert (
+        coverage_module.get_incremental_coverage_info(
+            coverage_path=tmp_path,
+            previous_coverage=previous_coverage,
+            previous_fingerprints=previous_fingerprints,
+            added_files=[],
+        )
+        is None
+    )
+    assert get_logs("INFO", "Coverage version or configuration changed")
+
+
+def test_get_incremental_coverage_info__no_fingerprints(tmp_path, project, get_logs):
+    previous_coverage, previous_fingerprints = project()
+    assert previous_fingerprints
+    (tmp_path / ".coverage").unlink()
+
+    assert (
+        coverage_module.get_incremental_coverage_info(
+            coverage_path=tmp_path,
+            previous_coverage=previous_coverage,
+            previous_fingerprints=previous_fingerprints,
+            added_files=[],
+        )
+        is None
+    )
+    assert get_logs("INFO", "Cannot compute fingerprints")
+
+
+def test_get_incremental_coverage_info__comma_in_path(tmp_path, project):
+    previous_coverage, previous_fingerprints = project()
+    assert previous_fingerprints
+    (tmp_path / "a,b.py").write_text("x = 1\n")
+    (tmp_path / "main.py").write_text(
+        (tmp_path / "main.py").read_text() + "import runpy\nrunpy.run_path('a,b.py')\n"
+    )
+    full_coverage, _ = project()
+
+    result = coverage_module.get_incremental_coverage_info(
+        coverage_path=tmp_path,
+        previous_coverage=previous_coverage,
+        previous_fingerprints=previous_fingerprints,
+        added_files=[],
+    )
+
+    assert result
+    assert tmp_path / "a,b.py" in result.files
+    assert without_timestamp(result) == without_timestamp(full_coverage)
+
+
+def test_generate_json_report__parallel__same_as_coverage_json(
+    tmp_path, project, monkeypatch, get_logs
+):
+    project()
+    monkeypatch.setattr(coverage_module, "MIN_FILES_PER_ANALYSIS_WORKER", 2)
+
+    result = coverage_module.generate_json_report(coverage_path=tmp_path, workers=3)
+
+    assert get_logs("INFO", f"Analysing {NUM_MODULES + 1} files with 3 workers")
+    expected = json.loads(subprocess.run("coverage", "json", "-o", "-", path=tmp_path))
+    assert result["files"] == expected["files"]
+    assert list(result["files"]) == list(expected["files"])
+    assert result["meta"].keys() == expected["meta"].keys()
+    assert (
+        coverage_module.extract_info(data=result, coverage_path=tmp_path).info
+        == coverage_module.extract_info(data=expected, coverage_path=tmp_path).info
+    )
+    assert result["totals"] == expected["totals"]
+
+
+def test_generate_json_report__parallel__relative_path(tmp_path, project, monkeypatch):
+    project()
+    monkeypatch.setattr(coverage_module, "MIN_FILES_PER_ANALYSIS_WORKER", 2)
+    # A single worker process analyses all the chunks, one after the other
+    process_pool_executor = concurrent.futures.ProcessPoolExecutor
+    monkeypatch.setattr(
+        concurrent.futures,
+        "ProcessPoolExecutor",
+        lambda max_workers: process_pool_executor(max_workers=1),
+    )
+    monkeypatch.chdir(tmp_path.parent)
+
+    result = coverage_module.generate_json_report(
+        coverage_path=pathlib.Path(tmp_path.name), workers=3
+    )
+
+    expected = json.loads(subprocess.run("coverage", "json", "-o", "-", path=tmp_path))
+    assert result["files"] == expected["files"]
+
+
+def test_generate_json_report__parallel__no_source(tmp_path, project, monkeypatch):
+    project()
+    monkeypatch.setattr(coverage_module, "MIN_FILES_PER_ANALYSIS_WORKER", 2)
+    (tmp_path / "module_3.py").unlink()
+
+    with pytest.raises(coverage.exceptions.NoSource) as exc_info:
+        coverage_module.get_coverage_info(
+            merge=False, coverage_path=tmp_path, analysis_workers=2
+        )
+
+    assert "Cannot read .coverage files because files are absolute" in str(
+        exc_info.value.__notes__
+    )
+
+
+def test_generate_json_report__few_files(tmp_path, project, get_logs):
+    project()
+
+    coverage_module.generate_json_report(coverage_path=tmp_path, workers=4)
+
+    assert not get_logs("INFO", "Analysing")
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_get_coverage(tmp_path, project, monkeypatch, workers):
+    expected, _ = project()
+    monkeypatch.setattr(coverage_module, "MIN_FILES_PER_ANALYSIS_WORKER", 2)
+
+    result = coverage_module.get_coverage(coverage_path=tmp_path, workers=workers)
+
+    assert without_timestamp(result) == without_timestamp(expected)
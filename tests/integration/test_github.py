@@ -75,7 +75,7 @@ def test_download_artifact(gh, session, zip_bytes):
     session.register(
         "GET",
         "/repos/foo/bar/actions/runs/123/artifacts",
-        match_params={"page": "1"},
+        match_params={"name": "foo", "page": "1"},
         json={"artifacts": artifacts, "total_count": 2},
     )
 
@@ -107,13 +107,13 @@ def test_download_artifact_from_page_2(gh, session, zip_bytes):
     session.register(
         "GET",
         "/repos/foo/bar/actions/runs/123/artifacts",
-        match_params={"page": "1"},
+        match_params={"name": "foo", "page": "1"},
         json={"artifacts": artifacts_page_1, "total_count": 3},
     )
     session.register(
         "GET",
         "/repos/foo/bar/actions/runs/123/artifacts",
-        match_params={"page": "2"},
+        match_params={"name": "foo", "page": "2"},
         json={"artifacts": artifacts_page_2, "total_count": 3},
     )
 
@@ -134,6 +134,30 @@ def test_download_artifact_from_page_2(gh, session, zip_bytes):
     assert result == "bar"
 
 
+def test_download_artifact_files(gh, session, zip_bytes):
+    session.register(
+        "GET",
+        "/repos/foo/bar/actions/runs/123/artifacts",
+        match_params={"name": "foo", "page": "1"},
+        json={"artifacts": [{"name": "foo", "id": 789}], "total_count": 1},
+    )
+    session.register(
+        "GET",
+        "/repos/foo/bar/actions/artifacts/789/zip",
+        content=zip_bytes(filename="foo.txt", content="bar"),
+    )
+
+    result = github.download_artifact_files(
+        github=gh,
+        repository="foo/bar",
+        artifact_name="foo",
+        run_id=123,
+        filenames=[pathlib.Path("foo.txt"), pathlib.Path("baz.txt")],
+    )
+
+    assert result == {pathlib.Path("foo.txt"): "bar"}
+
+
 def test_download_artifact__no_artifact(gh, session):
     artifacts = [
         {"name": "bar", "id": 456},
@@ -141,7 +165,7 @@ def test_download_artifact__no_artifact(gh, session):
     session.register(
         "GET",
         "/repos/foo/bar/actions/runs/123/artifacts",
-        match_params={"page": "1"},
+        match_params={"name": "foo", "page": "1"},
         json={"artifacts": artifacts, "total_count": 1},
     )
 
@@ -160,7 +184,7 @@ def test_download_artifact__no_file(gh, session, zip_bytes):
     session.register(
         "GET",
         "/repos/foo/bar/actions/runs/123/artifacts",
-        match_params={"page": "1"},
+        match_params={"name": "foo", "page": "1"},
         json={"artifacts": artifacts},
     )
 
@@ -183,7 +207,7 @@ def test_fetch_artifacts_empty_response(gh, session):
     session.register(
         "GET",
         "/repos/foo/bar/actions/runs/123/artifacts",
-        match_params={"page": "1"},
+        match_params={"name": "bar", "page": "1"},
         json={"artifacts": [], "total_count": 0},
     )
 
@@ -192,6 +216,7 @@ def test_fetch_artifacts_empty_response(gh, session):
     result = github._fetch_artifacts(
         repo_path=repo_path,
         run_id=123,
+        name="bar",
     )
 
     assert not list(result)
@@ -203,7 +228,7 @@ def test_fetch_artifacts_single_page(gh, session):
     session.register(
         "GET",
         "/repos/foo/bar/actions/runs/123/artifacts",
-        match_params={"page": "1"},
+        match_params={"name": "bar", "page": "1"},
         json={"artifacts": artifacts, "total_count": 1},
     )
 
@@ -212,6 +237,7 @@ def test_fetch_artifacts_single_page(gh, session):
     result = github._fetch_artifacts(
         repo_path=repo_path,
         run_id=123,
+        name="bar",
     )
 
     assert list(result) == artifacts
@@ -224,13 +250,13 @@ def test_fetch_artifacts_multiple_pages(gh, session):
     session.register(
         "GET",
         "/repos/foo/bar/actions/runs/123/artifacts",
-        match_params={"page": "1"},
+        match_params={"name": "bar", "page": "1"},
         json={"artifacts": artifacts_page_1, "total_count": 2},
     )
     session.register(
         "GET",
         "/repos/foo/bar/actions/runs/123/artifacts",
-        match_params={"page": "2"},
+        match_params={"name": "bar", "page": "2"},
         json={"artifacts": artifacts_page_2, "total_count": 2},
     )
 
@@ -239,24 +265,23 @@ def test_fetch_artifacts_multiple_pages(gh, session):
     result = github._fetch_artifacts(
         repo_path=repo_path,
         run_id=123,
+        name="bar",
     )
 
     assert list(result) == artifacts_page_1 + artifacts_page_2
 
 
-def test_get_branch_from_workflow_run(gh, session):
+def test_get_workflow_run(gh, session):
     json = {
         "head_branch": "other",
+        "head_sha": "abc123",
         "head_repository": {"owner": {"login": "someone"}},
     }
     session.register("GET", "/repos/foo/bar/actions/runs/123", json=json)
 
-    owner, branch = github.get_branch_from_workflow_run(
-        github=gh, repository="foo/bar", run_id=123
-    )
+    run = github.get_workflow_run(github=gh, repository="foo/bar", run_id=123)
 
-    assert owner == "someone"
-    assert branch == "other"
+    assert run == github.WorkflowRun(owner="someone", branch="other", head_sha="abc123")
 
 
 def test_find_pr_for_branch(gh, session):
@@ -267,14 +292,17 @@ def test_find_pr_for_branch(gh, session):
         "state": "open",
     }
     session.register(
-        "GET", "/repos/foo/bar/pulls", match_params=params, json=[{"number": 456}]
+        "GET",
+        "/repos/foo/bar/pulls",
+        match_params=params,
+        json=[{"number": 456, "head": {"sha": "abc123"}}],
     )
 
     result = github.find_pr_for_branch(
         github=gh, repository="foo/bar", owner="someone", branch="other"
     )
 
-    assert result == 456
+    assert result == github.PullRequest(number=456, head_sha="abc123")
 
 
 def test_find_pr_for_branch__no_open_pr(gh, session):
@@ -290,14 +318,14 @@ def test_find_pr_for_branch__no_open_pr(gh, session):
         "GET",
         "/repos/foo/bar/pulls",
         match_params=params | {"state": "all"},
-        json=[{"number": 456}],
+        json=[{"number": 456, "head": {"sha": "abc123"}}],
     )
 
     result = github.find_pr_for_branch(
         github=gh, repository="foo/bar", owner="someone", branch="other"
     )
 
-    assert result == 456
+    assert result == github.PullRequest(number=456, head_sha="abc123")
 
 
 def test_find_pr_for_branch__no_pr(gh, session):
@@ -334,6 +362,300 @@ def test_get_my_login__github_bot(gh, session):
     assert result == "github-actions[bot]"
 
 
+def graphql_pr(number, state="OPEN", owner="foo", comments=(), head_sha=None):
+    return {
+        "number": number,
+        "state": state,
+        "headRefOid": head_sha,
+        "headRepositoryOwner": {"login": owner},
+        "comments": {"pageInfo": {"hasNextPage": False}, "nodes": list(comments)},
+    }
+
+
+def graphql_repository(**kwargs):
+    return {
+        "defaultBranchRef": {"name": "main"},
+        "visibility": "PUBLIC",
+        **kwargs,
+    }
+
+
+def test_get_pr_context__by_number(gh, session):
+    comments = [
+        {
+            "databaseId": 456,
+            "body": "Hey marker",
+            "author": {"__typename": "Bot", "login": "github-actions"},
+        },
+        {"databaseId": 789, "body": "Hello", "author": None},
+    ]
+    session.register(
+        "POST",
+        "/graphql",
+        match_json={
+            "query": github.PR_CONTEXT_QUERY,
+            "variables": {
+                "withViewer": True,
+                "owner": "foo",
+                "name": "bar",
+                "byNumber": True,
+                "number": 123,
+                "byBranch": False,
+                "branch": "",
+            },
+        },
+        json={
+            "data": {
+                "viewer": {"login": "me"},
+                "repository": graphql_repository(
+                    pullRequest=graphql_pr(123, comments=comments, head_sha="abc123")
+                ),
+            }
+        },
+    )
+
+    result = github.get_pr_context(github=gh, repository="foo/bar", pr_number=123)
+
+    assert result == github.PullRequestContext(
+        repo_info=github.RepositoryInfo(default_branch="main", visibility="public"),
+        me="me",
+        pr_number=123,
+        comments=[
+            github.Comment(id=456, login="github-actions[bot]", body="Hey marker"),
+            github.Comment(id=789, login="", body="Hello"),
+        ],
+        head_sha="abc123",
+    )
+
+
+def test_get_pr_context__paginated_comments(gh, session):
+    def comment(id):
+        return {"databaseId": id, "body": "Hello", "author": None}
+
+    pr = graphql_pr(123, comments=[comment(1)])
+    pr["comments"]["pageInfo"] = {"hasNextPage": True, "endCursor": "cursor1"}
+    session.register(
+        "POST",
+        "/graphql",
+        json={
+            "data": {
+                "viewer": {"login": "me"},
+                "repository": graphql_repository(pullRequest=pr),
+            }
+        },
+    )
+    for cursor, next_cursor, id in [("cursor1", "cursor2", 2), ("cursor2", None, 3)]:
+        session.register(
+            "POST",
+            "/graphql",
+            match_json={
+                "query": github.PR_COMMENTS_QUERY,
+                "variables": {
+                    "owner": "foo",
+                    "name": "bar",
+                    "number": 123,
+                    "after": cursor,
+                },
+            },
+            json={
+                "data": {
+                    "repository": {
+                        "pullRequest": {
+                            "comments": {
+                                "pageInfo": {
+                                    "hasNextPage": next_cursor is not None,
+                                    "endCursor": next_cursor,
+                                },
+                                "nodes": [comment(id)],
+                            }
+                        }
+                    }
+                }
+            },
+        )
+
+    result = github.get_pr_context(github=gh, repository="foo/bar", pr_number=123)
+
+    assert result
+    assert [comment.id for comment in result.comments] == [1, 2, 3]
+
+
+def test_get_pr_context__by_branch(gh, session):
+    session.register(
+        "POST",
+        "/graphql",
+        match_json={
+            "query": github.PR_CONTEXT_QUERY,
+            "variables": {
+                "withViewer": True,
+                "owner": "foo",
+                "name": "bar",
+                "byNumber": False,
+                "number": 0,
+                "byBranch": True,
+                "branch": "baz",
+            },
+        },
+        json={
+            "data": {
+                "viewer": {"login": "me"},
+                "repository": graphql_repository(
+                    pullRequests={
+                        "nodes": [
+                            graphql_pr(1, owner="someone-else"),
+                            graphql_pr(2, state="CLOSED"),
+                            graphql_pr(3),
+                            graphql_pr(4),
+                        ]
+                    }
+                ),
+            }
+        },
+    )
+
+    result = github.get_pr_context(
+        github=gh, repository="foo/bar", owner="foo", branch="baz"
+    )
+
+    assert result
+    assert result.pr_number == 3
+
+
+def test_get_pr_context__by_branch__no_open_pr(gh, session):
+    session.register(
+        "POST",
+        "/graphql",
+        json={
+            "data": {
+                "viewer": {"login": "me"},
+                "repository": graphql_repository(
+                    pullRequests={"nodes": [graphql_pr(2, state="CLOSED")]}
+                ),
+            }
+        },
+    )
+
+    result = github.get_pr_context(
+        github=gh, repository="foo/bar", owner="foo", branch="baz"
+    )
+
+    assert result
+    assert result.pr_number == 2
+
+
+def test_get_pr_context__by_branch__no_pr(gh, session):
+    session.register(
+        "POST",
+        "/graphql",
+        json={
+            "data": {
+                "viewer": {"login": "me"},
+                "repository": graphql_repository(pullRequests={"nodes": []}),
+            }
+        },
+    )
+
+    result = github.get_pr_context(
+        github=gh, repository="foo/bar", owner="foo", branch="baz"
+    )
+
+    assert result
+    assert result.pr_number is None
+    assert result.comments == []
+
+
+def test_get_pr_context__github_bot(gh, session):
+    session.register(
+        "POST",
+        "/graphql",
+        match_json={
+            "query": github.PR_CONTEXT_QUERY,
+            "variables": {
+                "withViewer": True,
+                "owner": "foo",
+                "name": "bar",
+                "byNumber": False,
+                "number": 0,
+                "byBranch": False,
+                "branch": "",
+            },
+        },
+        json={
+            "data": None,
+            "errors": [{"message": "Resource not accessible", "path": ["viewer"]}],
+        },
+    )
+    session.register(
+        "POST",
+        "/graphql",
+        match_json={
+            "query": github.PR_CONTEXT_QUERY,
+            "variables": {
+                "withViewer": False,
+                "owner": "foo",
+                "name": "bar",
+                "byNumber": False,
+                "number": 0,
+                "byBranch": False,
+                "branch": "",
+            },
+        },
+        json={"data": {"repository": graphql_repository()}},
+    )
+
+    result = github.get_pr_context(github=gh, repository="foo/bar")
+
+    assert result == github.PullRequestContext(
+        repo_info=github.RepositoryInfo(default_branch="main", visibility="public"),
+        me="github-actions[bot]",
+        pr_number=None,
+        comments=[],
+    )
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        # e.g. GHES version without some of the fields
+        {"json": {"data": None, "errors": [{"message": "Unknown field"}]}},
+        # e.g. GraphQL not available at all
+        {"status_code": 404},
+    ],
+)
+def test_get_pr_context__graphql_unavailable(gh, session, get_logs, kwargs):
+    session.register("POST", "/graphql", **kwargs)
+
+    result = github.get_pr_context(github=gh, repository="foo/bar", pr_number=123)
+
+    assert result is None
+    assert get_logs("INFO", "falling back to the REST API")
+
+
+def test_get_pr_context__no_repository(gh, session, get_logs):
+    session.register(
+        "POST",
+        "/graphql",
+        json={"data": {"viewer": {"login": "me"}, "repository": None}},
+    )
+
+    result = github.get_pr_context(github=gh, repository="foo/bar", pr_number=123)
+
+    assert result is None
+    assert get_logs("INFO", "falling back to the REST API")
+
+
+def test_list_comments(gh, session):
+    session.register(
+        "GET",
+        "/repos/foo/bar/issues/123/comments",
+        json=[{"user": {"login": "foo"}, "body": "Hey", "id": 456}],
+    )
+
+    result = github.list_comments(github=gh, repository="foo/bar", pr_number=123)
+
+    assert result == [github.Comment(id=456, login="foo", body="Hey")]
+
+
 @pytest.mark.parametrize(
     "existing_comments",
     [
@@ -431,6 +753,38 @@ def test_post_comment__update_error(gh, session):
         )
 
 
+def test_post_comment__known_comments(gh, session, get_logs):
+    session.register(
+        "PATCH", "/repos/foo/bar/issues/comments/456", json={"body": "hi!"}
+    )
+
+    github.post_comment(
+        github=gh,
+        me="foo",
+        repository="foo/bar",
+        pr_number=123,
+        contents="hi!",
+        marker="marker",
+        comments=[github.Comment(id=456, login="foo", body="Hey marker")],
+    )
+
+    assert get_logs("INFO", "Update previous comment")
+
+
+def test_post_comment__up_to_date(gh, session, get_logs):
+    github.post_comment(
+        github=gh,
+        me="foo",
+        repository="foo/bar",
+        pr_number=123,
+        contents="hi! marker",
+        marker="marker",
+        comments=[github.Comment(id=456, login="foo", body="hi! marker")],
+    )
+
+    assert get_logs("INFO", "Previous comment is already up to date")
+
+
 def test_set_output(output_file):
     github.set_output(github_output=output_file, foo=True)
 
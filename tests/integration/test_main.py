@@ -1,11 +1,14 @@
 from __future__ import annotations
 
+import decimal
 import json
+import os
 import pathlib
+import subprocess
 
 import pytest
 
-from coverage_comment import activities, main
+from coverage_comment import activities, comment_file, files, main, settings, tracing
 
 DIFF_STDOUT = """diff --git a/foo.py b/foo.py
 index 6c08c94..b65c612 100644
@@ -78,6 +81,7 @@ def test_action__explicit_activity(
         "/repos/py-cov-action/foobar/actions/runs/123",
         json={
             "head_branch": "branch",
+            "head_sha": "abc123",
             "head_repository": {"owner": {"login": "bar/repo-name"}},
         },
     )
@@ -91,13 +95,13 @@ def test_action__explicit_activity(
             "direction": "desc",
             "state": "open",
         },
-        json=[{"number": 456}],
+        json=[{"number": 456, "head": {"sha": "abc123"}}],
     )
 
     session.register(
         "GET",
         "/repos/py-cov-action/foobar/actions/runs/123/artifacts",
-        match_params={"page": "1"},
+        match_params={"name": "python-coverage-comment-action", "page": "1"},
         json={
             "artifacts": [{"name": "python-coverage-comment-action", "id": 789}],
             "total_count": 1,
@@ -326,6 +330,7 @@ def test_action__pull_request__store_comment_not_targeting_default(
     )
 
 
+@pytest.mark.parametrize("diff_only", [False, True])
 def test_action__pull_request__post_comment(
     pull_request_config,
     session,
@@ -335,6 +340,7 @@ def test_action__pull_request__post_comment(
     git,
     payload,
     fake_process,
+    diff_only,
 ):
     session.register(
         "GET",
@@ -373,7 +379,9 @@ def test_action__pull_request__post_comment(
 
     result = main.action(
         config=pull_request_config(
-            GITHUB_OUTPUT=output_file, GITHUB_STEP_SUMMARY=summary_file
+            GITHUB_OUTPUT=output_file,
+            GITHUB_STEP_SUMMARY=summary_file,
+            DIFF_ONLY=diff_only,
         ),
         github_session=session,
         http_session=session,
@@ -401,8 +409,8 @@ def test_action__pull_request__post_comment(
     assert output == get_expected_output(comment_written=False, reference_coverage=True)
 
 
-def test_action__push__non_default_branch(
-    push_config,
+def test_action__pull_request__summary_index(
+    pull_request_config,
     session,
     in_integration_env,
     output_file,
@@ -411,46 +419,38 @@ def test_action__push__non_default_branch(
     payload,
     fake_process,
 ):
+    data = json.loads(payload)
+    history = [
+        files.HistoryEntry.from_coverage(
+            sha=sha,
+            raw_coverage_data=data["raw_data"],
+            line_rate=decimal.Decimal(rate),
+        )
+        for sha, rate in [("a", "0.2"), ("b", "0.3")]
+    ]
+    summary_index = files.compute_summary_index(
+        raw_coverage_data=data["raw_data"],
+        line_rate=decimal.Decimal(str(data["coverage"])),
+        coverage_path=pathlib.Path(data["coverage_path"]),
+        history=history,
+    )
+
     session.register(
         "GET",
         "/repos/py-cov-action/foobar",
         json={"default_branch": "main", "visibility": "public"},
     )
-
-    # What is the diff of the `other` branch
-    session.register(
-        "GET", "/repos/py-cov-action/foobar/compare/main...other", text=DIFF_STDOUT
-    )
-
-    # There is an existing badge in this test, allowing to test the coverage evolution
+    # The data file is not fetched at all
     session.register(
         "GET",
-        "/repos/py-cov-action/foobar/contents/data.json",
+        "/repos/py-cov-action/foobar/contents/summary-index.json",
         match_params={"ref": "python-coverage-comment-action-data"},
-        text=payload,
+        text=summary_index,
         headers={"content-type": "application/vnd.github.raw+json"},
     )
-
-    session.register(
-        "GET",
-        "/repos/py-cov-action/foobar/pulls",
-        match_params={
-            "state": "open",
-            "head": "py-cov-action:other",
-            "sort": "updated",
-            "direction": "desc",
-        },
-        json=[{"number": 2}],
-    )
-
-    # Who am I
     session.register("GET", "/user", json={"login": "foo"})
-    # Are there already comments
     session.register("GET", "/repos/py-cov-action/foobar/issues/2/comments", json=[])
-
-    comment = None
-
-    # Post a new comment
+    session.register("GET", "/repos/py-cov-action/foobar/pulls/2", text=DIFF_STDOUT)
     session.register(
         "POST",
         "/repos/py-cov-action/foobar/issues/2/comments",
@@ -461,10 +461,10 @@ def test_action__push__non_default_branch(
     fake_process.pass_command(["coverage", "json", "-o", "-"])
 
     result = main.action(
-        config=push_config(
-            GITHUB_REF="refs/heads/other",
-            GITHUB_STEP_SUMMARY=summary_file,
+        config=pull_request_config(
             GITHUB_OUTPUT=output_file,
+            GITHUB_STEP_SUMMARY=summary_file,
+            PREVIOUS_SUMMARY_ONLY=True,
         ),
         github_session=session,
         http_session=session,
@@ -477,48 +477,90 @@ def test_action__push__non_default_branch(
             "POST", "/repos/py-cov-action/foobar/issues/2/comments"
         ).content.decode()
     )["body"]
-
-    assert not pathlib.Path("python-coverage-comment-action.txt").exists()
     assert "Coverage for the whole project went from 30% to 77.77%" in comment
-    assert comment == summary_file.read_text()
-
-    output = {
-        key: value
-        for key, value in (
-            line.split("=") for line in output_file.read_text().strip().splitlines()
-        )
-    }
-    assert output == get_expected_output(comment_written=False, reference_coverage=True)
+    assert "on the default branch, then this PR: ▁▂█" in comment
 
 
-def test_action__push__no_branch(
-    push_config,
+def test_action__pull_request__history(
+    pull_request_config,
     session,
     in_integration_env,
+    output_file,
+    summary_file,
     git,
-    get_logs,
+    payload,
     fake_process,
 ):
+    data = json.loads(payload)
+    history = [
+        files.HistoryEntry.from_coverage(
+            sha=sha,
+            raw_coverage_data=data["raw_data"],
+            line_rate=decimal.Decimal(rate),
+        )
+        for sha, rate in [("a", "0.2"), ("b", "0.3")]
+    ]
+
     session.register(
         "GET",
         "/repos/py-cov-action/foobar",
         json={"default_branch": "main", "visibility": "public"},
     )
+    # With the default settings, the history comes from the data file
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar/contents/data.json",
+        match_params={"ref": "python-coverage-comment-action-data"},
+        text=files.compute_datafile(
+            raw_coverage_data=data["raw_data"],
+            line_rate=decimal.Decimal(str(data["coverage"])),
+            coverage_path=pathlib.Path(data["coverage_path"]),
+            history=history,
+        ),
+        headers={"content-type": "application/vnd.github.raw+json"},
+    )
+    session.register("GET", "/user", json={"login": "foo"})
+    session.register("GET", "/repos/py-cov-action/foobar/issues/2/comments", json=[])
+    session.register("GET", "/repos/py-cov-action/foobar/pulls/2", text=DIFF_STDOUT)
+    session.register(
+        "POST",
+        "/repos/py-cov-action/foobar/issues/2/comments",
+        status_code=200,
+    )
+
+    fake_process.pass_command(["coverage", "combine"])
+    fake_process.pass_command(["coverage", "json", "-o", "-"])
 
     result = main.action(
-        config=push_config(
-            GITHUB_REF="refs/tags/v1.0.0",
+        config=pull_request_config(
+            GITHUB_OUTPUT=output_file, GITHUB_STEP_SUMMARY=summary_file
         ),
         github_session=session,
         http_session=session,
         git=git,
     )
     assert result == 0
-    assert get_logs("INFO", "This worflow is not triggered on a pull_request event")
-
 
-def test_action__push__non_default_branch__no_pr(
-    push_config,
+    comment = json.loads(
+        session.get_request(
+            "POST", "/repos/py-cov-action/foobar/issues/2/comments"
+        ).content.decode()
+    )["body"]
+    assert "Coverage for the whole project went from 30% to 77.77%" in comment
+    assert "on the default branch, then this PR: ▁▂█" in comment
+
+
+@pytest.mark.parametrize("previous_summary_only", [True, False])
+@pytest.mark.parametrize(
+    "has_snapshot, expected",
+    [
+        (True, "Coverage for the whole project went from 20% to 77.77%"),
+        (False, "Coverage for the whole project went from 30% to 77.77%"),
+    ],
+)
+def test_action__pull_request__base_snapshot(
+    pull_request_config,
+    pull_request_event_payload,
     session,
     in_integration_env,
     output_file,
@@ -526,57 +568,86 @@ def test_action__push__non_default_branch__no_pr(
     git,
     payload,
     fake_process,
+    has_snapshot,
+    expected,
+    previous_summary_only,
 ):
+    pull_request_event_payload.write_text(
+        json.dumps({"pull_request": {"base": {"sha": "abc123"}}})
+    )
+    data = json.loads(payload)
+    history = [
+        files.HistoryEntry.from_coverage(
+            sha=sha,
+            raw_coverage_data=data["raw_data"],
+            line_rate=decimal.Decimal(rate),
+        )
+        for sha, rate in [("a", "0.2"), ("b", "0.3")]
+    ]
+
     session.register(
         "GET",
         "/repos/py-cov-action/foobar",
         json={"default_branch": "main", "visibility": "public"},
     )
-    # What is the diff of the `other` branch
-    session.register(
-        "GET", "/repos/py-cov-action/foobar/compare/main...other", text=DIFF_STDOUT
-    )
-
-    # There is an existing badge in this test, allowing to test the coverage evolution
-    session.register(
-        "GET",
-        "/repos/py-cov-action/foobar/contents/data.json",
-        match_params={"ref": "python-coverage-comment-action-data"},
-        text=payload,
-        headers={"content-type": "application/vnd.github.raw+json"},
-    )
-
-    session.register(
-        "GET",
-        "/repos/py-cov-action/foobar/pulls",
-        match_params={
-            "state": "open",
-            "head": "py-cov-action:other",
-            "sort": "updated",
-            "direction": "desc",
-        },
-        json=[],
-    )
+    if has_snapshot:
+        session.register(
+            "GET",
+            "/repos/py-cov-action/foobar/contents/snapshots/ab/abc123.json",
+            match_params={"ref": "python-coverage-comment-action-data"},
+            text=files.compute_summary_index(
+                raw_coverage_data=data["raw_data"],
+                line_rate=decimal.Decimal("20"),
+                coverage_path=pathlib.Path(data["coverage_path"]),
+                history=history,
+            ),
+            headers={"content-type": "application/vnd.github.raw+json"},
+        )
+    else:
+        # Falls back to the latest coverage
+        session.register(
+            "GET",
+            "/repos/py-cov-action/foobar/contents/snapshots/ab/abc123.json",
+            match_params={"ref": "python-coverage-comment-action-data"},
+            status_code=404,
+        )
+        if previous_summary_only:
+            session.register(
+                "GET",
+                "/repos/py-cov-action/foobar/contents/summary-index.json",
+                match_params={"ref": "python-coverage-comment-action-data"},
+                status_code=404,
+            )
+        session.register(
+            "GET",
+            "/repos/py-cov-action/foobar/contents/data.json",
+            match_params={"ref": "python-coverage-comment-action-data"},
+            text=files.compute_datafile(
+                raw_coverage_data=data["raw_data"],
+                line_rate=decimal.Decimal(str(data["coverage"])),
+                coverage_path=pathlib.Path(data["coverage_path"]),
+                history=history,
+            ),
+            headers={"content-type": "application/vnd.github.raw+json"},
+        )
+    session.register("GET", "/user", json={"login": "foo"})
+    session.register("GET", "/repos/py-cov-action/foobar/issues/2/comments", json=[])
+    session.register("GET", "/repos/py-cov-action/foobar/pulls/2", text=DIFF_STDOUT)
     session.register(
-        "GET",
-        "/repos/py-cov-action/foobar/pulls",
-        match_params={
-            "state": "all",
-            "head": "py-cov-action:other",
-            "sort": "updated",
-            "direction": "desc",
-        },
-        json=[],
+        "POST",
+        "/repos/py-cov-action/foobar/issues/2/comments",
+        status_code=200,
     )
 
     fake_process.pass_command(["coverage", "combine"])
     fake_process.pass_command(["coverage", "json", "-o", "-"])
 
     result = main.action(
-        config=push_config(
-            GITHUB_REF="refs/heads/other",
-            GITHUB_STEP_SUMMARY=summary_file,
+        config=pull_request_config(
             GITHUB_OUTPUT=output_file,
+            GITHUB_STEP_SUMMARY=summary_file,
+            GITHUB_EVENT_PATH=pull_request_event_payload,
+            PREVIOUS_SUMMARY_ONLY=previous_summary_only,
         ),
         github_session=session,
         http_session=session,
@@ -584,110 +655,161 @@ def test_action__push__non_default_branch__no_pr(
     )
     assert result == 0
 
-    assert pathlib.Path("python-coverage-comment-action.txt").exists()
-
-    output = {
-        key: value
-        for key, value in (
-            line.split("=") for line in output_file.read_text().strip().splitlines()
-        )
-    }
-    assert output == get_expected_output(comment_written=True, reference_coverage=True)
+    comment = json.loads(
+        session.get_request(
+            "POST", "/repos/py-cov-action/foobar/issues/2/comments"
+        ).content.decode()
+    )["body"]
+    assert expected in comment
+    # Whichever file the previous coverage comes from, it has the history
+    assert "on the default branch, then this PR: ▁▂█" in comment
 
 
-def test_action__pull_request__force_store_comment(
+def test_action__pull_request__incremental_analysis(
     pull_request_config,
     session,
     in_integration_env,
     output_file,
+    summary_file,
     git,
     payload,
     fake_process,
+    get_logs,
 ):
+    # Fingerprints stored by a run with a different coverage configuration
+    data = json.loads(payload)
+    data["fingerprints"] = {"environment": "other", "files": {"foo.py": "abc"}}
+
     session.register(
         "GET",
         "/repos/py-cov-action/foobar",
         json={"default_branch": "main", "visibility": "public"},
     )
-
-    # There is an existing badge in this test, allowing to test the coverage evolution
     session.register(
         "GET",
         "/repos/py-cov-action/foobar/contents/data.json",
         match_params={"ref": "python-coverage-comment-action-data"},
-        text=payload,
+        text=json.dumps(data),
         headers={"content-type": "application/vnd.github.raw+json"},
     )
-
-    # What is the diff of the PR
+    session.register("GET", "/user", json={"login": "foo"})
+    session.register("GET", "/repos/py-cov-action/foobar/issues/2/comments", json=[])
     session.register("GET", "/repos/py-cov-action/foobar/pulls/2", text=DIFF_STDOUT)
+    session.register(
+        "POST",
+        "/repos/py-cov-action/foobar/issues/2/comments",
+        status_code=200,
+    )
 
     fake_process.pass_command(["coverage", "combine"])
     fake_process.pass_command(["coverage", "json", "-o", "-"])
 
     result = main.action(
-        config=pull_request_config(FORCE_WORKFLOW_RUN=True, GITHUB_OUTPUT=output_file),
+        config=pull_request_config(
+            GITHUB_OUTPUT=output_file,
+            GITHUB_STEP_SUMMARY=summary_file,
+            INCREMENTAL_ANALYSIS=True,
+        ),
         github_session=session,
         http_session=session,
         git=git,
     )
     assert result == 0
 
-    assert pathlib.Path("python-coverage-comment-action.txt").exists()
-
-    output = {
-        key: value
-        for key, value in (
-            line.split("=") for line in output_file.read_text().strip().splitlines()
-        )
-    }
-    assert output == get_expected_output(comment_written=True, reference_coverage=True)
+    assert get_logs("INFO", "Coverage version or configuration changed")
+    comment = json.loads(
+        session.get_request(
+            "POST", "/repos/py-cov-action/foobar/issues/2/comments"
+        ).content.decode()
+    )["body"]
+    assert "Coverage for the whole project went from 30% to 77.77%" in comment
 
 
-def test_action__pull_request__post_comment__no_marker(
+def test_action__pull_request__post_comment__graphql(
     pull_request_config,
     session,
     in_integration_env,
-    get_logs,
+    output_file,
+    summary_file,
     git,
+    payload,
     fake_process,
 ):
+    # Repository, viewer & comments in one go
     session.register(
-        "GET",
-        "/repos/py-cov-action/foobar",
-        json={"default_branch": "main", "visibility": "public"},
+        "POST",
+        "/graphql",
+        json={
+            "data": {
+                "viewer": {"login": "foo"},
+                "repository": {
+                    "defaultBranchRef": {"name": "main"},
+                    "visibility": "PUBLIC",
+                    "pullRequest": {
+                        "number": 2,
+                        "state": "OPEN",
+                        "headRepositoryOwner": {"login": "py-cov-action"},
+                        "comments": {
+                            "pageInfo": {"hasNextPage": False},
+                            "nodes": [
+                                {
+                                    "databaseId": 456,
+                                    "body": "<!-- This comment was produced by python-coverage-comment-action -->",
+                                    "author": {"__typename": "User", "login": "foo"},
+                                }
+                            ],
+                        },
+                    },
+                },
+            }
+        },
     )
 
-    # No existing badge in this test
     session.register(
         "GET",
         "/repos/py-cov-action/foobar/contents/data.json",
         match_params={"ref": "python-coverage-comment-action-data"},
-        status_code=404,
+        text=payload,
+        headers={"content-type": "application/vnd.github.raw+json"},
     )
-
-    # What is the diff of the PR
     session.register("GET", "/repos/py-cov-action/foobar/pulls/2", text=DIFF_STDOUT)
 
+    # Update the existing comment
+    session.register(
+        "PATCH", "/repos/py-cov-action/foobar/issues/comments/456", status_code=200
+    )
+
     fake_process.pass_command(["coverage", "combine"])
     fake_process.pass_command(["coverage", "json", "-o", "-"])
 
     result = main.action(
-        config=pull_request_config(COMMENT_TEMPLATE="""foo"""),
+        config=pull_request_config(
+            GITHUB_OUTPUT=output_file,
+            GITHUB_STEP_SUMMARY=summary_file,
+            USE_GRAPHQL_API=True,
+        ),
         github_session=session,
         http_session=session,
         git=git,
     )
-    assert result == 1
-    assert get_logs("ERROR", "Marker not found")
+    assert result == 0
+
+    comment = json.loads(
+        session.get_request(
+            "PATCH", "/repos/py-cov-action/foobar/issues/comments/456"
+        ).content.decode()
+    )["body"]
+    assert "Coverage for the whole project went from 30% to 77.77%" in comment
 
 
-def test_action__pull_request__annotations(
-    pull_request_config,
+def test_action__push__non_default_branch(
+    push_config,
     session,
     in_integration_env,
-    capsys,
+    output_file,
+    summary_file,
     git,
+    payload,
     fake_process,
 ):
     session.register(
@@ -695,18 +817,357 @@ def test_action__pull_request__annotations(
         "/repos/py-cov-action/foobar",
         json={"default_branch": "main", "visibility": "public"},
     )
-    # No existing badge in this test
+
+    # What is the diff of the `other` branch
+    session.register(
+        "GET", "/repos/py-cov-action/foobar/compare/main...other", text=DIFF_STDOUT
+    )
+
+    # There is an existing badge in this test, allowing to test the coverage evolution
     session.register(
         "GET",
         "/repos/py-cov-action/foobar/contents/data.json",
         match_params={"ref": "python-coverage-comment-action-data"},
-        status_code=404,
+        text=payload,
+        headers={"content-type": "application/vnd.github.raw+json"},
     )
 
-    # What is the diff of the PR
-    session.register("GET", "/repos/py-cov-action/foobar/pulls/2", text=DIFF_STDOUT)
-
-    # Who am I
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar/pulls",
+        match_params={
+            "state": "open",
+            "head": "py-cov-action:other",
+            "sort": "updated",
+            "direction": "desc",
+        },
+        json=[{"number": 2, "head": {"sha": "abc123"}}],
+    )
+
+    # Who am I
+    session.register("GET", "/user", json={"login": "foo"})
+    # Are there already comments
+    session.register("GET", "/repos/py-cov-action/foobar/issues/2/comments", json=[])
+
+    comment = None
+
+    # Post a new comment
+    session.register(
+        "POST",
+        "/repos/py-cov-action/foobar/issues/2/comments",
+        status_code=200,
+    )
+
+    fake_process.pass_command(["coverage", "combine"])
+    fake_process.pass_command(["coverage", "json", "-o", "-"])
+
+    result = main.action(
+        config=push_config(
+            GITHUB_REF="refs/heads/other",
+            GITHUB_STEP_SUMMARY=summary_file,
+            GITHUB_OUTPUT=output_file,
+        ),
+        github_session=session,
+        http_session=session,
+        git=git,
+    )
+    assert result == 0
+
+    comment = json.loads(
+        session.get_request(
+            "POST", "/repos/py-cov-action/foobar/issues/2/comments"
+        ).content.decode()
+    )["body"]
+
+    assert not pathlib.Path("python-coverage-comment-action.txt").exists()
+    assert "Coverage for the whole project went from 30% to 77.77%" in comment
+    assert comment == summary_file.read_text()
+
+    output = {
+        key: value
+        for key, value in (
+            line.split("=") for line in output_file.read_text().strip().splitlines()
+        )
+    }
+    assert output == get_expected_output(comment_written=False, reference_coverage=True)
+
+
+def test_action__push__no_branch(
+    push_config,
+    session,
+    in_integration_env,
+    git,
+    get_logs,
+    fake_process,
+):
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar",
+        json={"default_branch": "main", "visibility": "public"},
+    )
+
+    result = main.action(
+        config=push_config(
+            GITHUB_REF="refs/tags/v1.0.0",
+        ),
+        github_session=session,
+        http_session=session,
+        git=git,
+    )
+    assert result == 0
+    assert get_logs("INFO", "This worflow is not triggered on a pull_request event")
+
+
+def test_action__push__non_default_branch__no_pr(
+    push_config,
+    session,
+    in_integration_env,
+    output_file,
+    summary_file,
+    git,
+    payload,
+    fake_process,
+):
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar",
+        json={"default_branch": "main", "visibility": "public"},
+    )
+    # What is the diff of the `other` branch
+    session.register(
+        "GET", "/repos/py-cov-action/foobar/compare/main...other", text=DIFF_STDOUT
+    )
+
+    # There is an existing badge in this test, allowing to test the coverage evolution
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar/contents/data.json",
+        match_params={"ref": "python-coverage-comment-action-data"},
+        text=payload,
+        headers={"content-type": "application/vnd.github.raw+json"},
+    )
+
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar/pulls",
+        match_params={
+            "state": "open",
+            "head": "py-cov-action:other",
+            "sort": "updated",
+            "direction": "desc",
+        },
+        json=[],
+    )
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar/pulls",
+        match_params={
+            "state": "all",
+            "head": "py-cov-action:other",
+            "sort": "updated",
+            "direction": "desc",
+        },
+        json=[],
+    )
+
+    fake_process.pass_command(["coverage", "combine"])
+    fake_process.pass_command(["coverage", "json", "-o", "-"])
+
+    result = main.action(
+        config=push_config(
+            GITHUB_REF="refs/heads/other",
+            GITHUB_STEP_SUMMARY=summary_file,
+            GITHUB_OUTPUT=output_file,
+        ),
+        github_session=session,
+        http_session=session,
+        git=git,
+    )
+    assert result == 0
+
+    assert pathlib.Path("python-coverage-comment-action.txt").exists()
+
+    output = {
+        key: value
+        for key, value in (
+            line.split("=") for line in output_file.read_text().strip().splitlines()
+        )
+    }
+    assert output == get_expected_output(comment_written=True, reference_coverage=True)
+
+
+def test_action__push__non_default_branch__no_pr__graphql(
+    push_config,
+    session,
+    in_integration_env,
+    output_file,
+    summary_file,
+    git,
+    payload,
+    fake_process,
+):
+    # Whether the push is on the default branch is known first
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar",
+        json={"default_branch": "main", "visibility": "public"},
+    )
+    session.register(
+        "POST",
+        "/graphql",
+        json={
+            "data": {
+                "viewer": {"login": "foo"},
+                "repository": {
+                    "defaultBranchRef": {"name": "main"},
+                    "visibility": "PUBLIC",
+                    "pullRequests": {"nodes": []},
+                },
+            }
+        },
+    )
+    session.register(
+        "GET", "/repos/py-cov-action/foobar/compare/main...other", text=DIFF_STDOUT
+    )
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar/contents/data.json",
+        match_params={"ref": "python-coverage-comment-action-data"},
+        text=payload,
+        headers={"content-type": "application/vnd.github.raw+json"},
+    )
+
+    fake_process.pass_command(["coverage", "combine"])
+    fake_process.pass_command(["coverage", "json", "-o", "-"])
+
+    result = main.action(
+        config=push_config(
+            GITHUB_REF="refs/heads/other",
+            GITHUB_STEP_SUMMARY=summary_file,
+            GITHUB_OUTPUT=output_file,
+            USE_GRAPHQL_API=True,
+        ),
+        github_session=session,
+        http_session=session,
+        git=git,
+    )
+    assert result == 0
+
+    assert pathlib.Path("python-coverage-comment-action.txt").exists()
+
+
+def test_action__pull_request__force_store_comment(
+    pull_request_config,
+    session,
+    in_integration_env,
+    output_file,
+    git,
+    payload,
+    fake_process,
+):
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar",
+        json={"default_branch": "main", "visibility": "public"},
+    )
+
+    # There is an existing badge in this test, allowing to test the coverage evolution
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar/contents/data.json",
+        match_params={"ref": "python-coverage-comment-action-data"},
+        text=payload,
+        headers={"content-type": "application/vnd.github.raw+json"},
+    )
+
+    # What is the diff of the PR
+    session.register("GET", "/repos/py-cov-action/foobar/pulls/2", text=DIFF_STDOUT)
+
+    fake_process.pass_command(["coverage", "combine"])
+    fake_process.pass_command(["coverage", "json", "-o", "-"])
+
+    result = main.action(
+        config=pull_request_config(FORCE_WORKFLOW_RUN=True, GITHUB_OUTPUT=output_file),
+        github_session=session,
+        http_session=session,
+        git=git,
+    )
+    assert result == 0
+
+    assert pathlib.Path("python-coverage-comment-action.txt").exists()
+
+    output = {
+        key: value
+        for key, value in (
+            line.split("=") for line in output_file.read_text().strip().splitlines()
+        )
+    }
+    assert output == get_expected_output(comment_written=True, reference_coverage=True)
+
+
+def test_action__pull_request__post_comment__no_marker(
+    pull_request_config,
+    session,
+    in_integration_env,
+    get_logs,
+    git,
+    fake_process,
+):
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar",
+        json={"default_branch": "main", "visibility": "public"},
+    )
+
+    # No existing badge in this test
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar/contents/data.json",
+        match_params={"ref": "python-coverage-comment-action-data"},
+        status_code=404,
+    )
+
+    # What is the diff of the PR
+    session.register("GET", "/repos/py-cov-action/foobar/pulls/2", text=DIFF_STDOUT)
+
+    fake_process.pass_command(["coverage", "combine"])
+    fake_process.pass_command(["coverage", "json", "-o", "-"])
+
+    result = main.action(
+        config=pull_request_config(COMMENT_TEMPLATE="""foo"""),
+        github_session=session,
+        http_session=session,
+        git=git,
+    )
+    assert result == 1
+    assert get_logs("ERROR", "Marker not found")
+
+
+def test_action__pull_request__annotations(
+    pull_request_config,
+    session,
+    in_integration_env,
+    capsys,
+    git,
+    fake_process,
+):
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar",
+        json={"default_branch": "main", "visibility": "public"},
+    )
+    # No existing badge in this test
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar/contents/data.json",
+        match_params={"ref": "python-coverage-comment-action-data"},
+        status_code=404,
+    )
+
+    # What is the diff of the PR
+    session.register("GET", "/repos/py-cov-action/foobar/pulls/2", text=DIFF_STDOUT)
+
+    # Who am I
     session.register("GET", "/user", json={"login": "foo"})
     # Are there already comments
     session.register("GET", "/repos/py-cov-action/foobar/issues/2/comments", json=[])
@@ -791,6 +1252,18 @@ def test_action__push__default_branch(
         "https://img.shields.io/static/v1?label=Coverage&message=77%25&color=orange",
         text="<this is a svg badge>",
     )
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar/contents/content-hash.txt",
+        match_params={"ref": "python-coverage-comment-action-data"},
+        status_code=404,
+    )
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar/contents/history.csv",
+        match_params={"ref": "python-coverage-comment-action-data"},
+        status_code=404,
+    )
 
     git.register("branch --show-current", stdout="foo")
     git.register("reset --hard")
@@ -800,9 +1273,13 @@ def test_action__push__default_branch(
     git.register("switch python-coverage-comment-action-data")
     git.register("add endpoint.json")
     git.register("add data.json")
+    git.register("add summary-index.json")
+    git.register("add history.csv")
+    git.register("add snapshots")
     git.register("add badge.svg")
     git.register("add htmlcov")
     git.register("add README.md")
+    git.register("add content-hash.txt")
     git.register("diff --staged --exit-code", returncode=1)
     git.register("commit --message 'ci: Update coverage data'")
     git.register(
@@ -820,7 +1297,11 @@ def test_action__push__default_branch(
     )
 
     result = main.action(
-        config=push_config(GITHUB_STEP_SUMMARY=summary_file),
+        config=push_config(
+            GITHUB_STEP_SUMMARY=summary_file,
+            INCREMENTAL_ANALYSIS=True,
+            GITHUB_SHA="abc123",
+        ),
         github_session=session,
         http_session=session,
         git=git,
@@ -829,6 +1310,15 @@ def test_action__push__default_branch(
 
     assert not get_logs("INFO", "Skipping badge")
     assert get_logs("INFO", "Saving coverage files")
+    datafile = json.loads(pathlib.Path("data.json").read_text())
+    assert list(datafile["fingerprints"]["files"]) == ["foo.py"]
+    (history_entry,) = files.parse_history(pathlib.Path("history.csv").read_text())
+    assert history_entry.sha == "abc123"
+    assert history_entry.coverage == decimal.Decimal("77.78")
+    assert datafile["history"] == [77.78]
+    assert pathlib.Path("snapshots/ab/abc123.json").read_text() == (
+        pathlib.Path("summary-index.json").read_text()
+    )
 
     log = get_logs("INFO", "Badge SVG available at")[0]
     expected = """You can browse the full coverage report at:
@@ -857,6 +1347,124 @@ See more details and ready-to-copy-paste-markdown at:
     assert "Missing" in summary_content
 
 
+def test_action__push__default_branch__unchanged(
+    push_config,
+    session,
+    in_integration_env,
+    get_logs,
+    git,
+    summary_file,
+    fake_process,
+):
+    def run(content_hash, sha=""):
+        session.register(
+            "GET",
+            "/repos/py-cov-action/foobar",
+            json={"default_branch": "main", "visibility": "public"},
+        )
+        session.register(
+            "GET",
+            "/repos/py-cov-action/foobar/contents/content-hash.txt",
+            match_params={"ref": "python-coverage-comment-action-data"},
+            text=content_hash,
+            headers={"content-type": "application/vnd.github.raw+json"},
+        )
+        fake_process.pass_command(["coverage", "json", "-o", "-"])
+        fake_process.pass_command(
+            ["coverage", "report", "--format=markdown", "--show-missing"]
+        )
+
+        return main.action(
+            config=push_config(GITHUB_STEP_SUMMARY=summary_file, GITHUB_SHA=sha),
+            github_session=session,
+            http_session=session,
+            git=git,
+        )
+
+    # A first run saves the files, along with their content hash
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar/contents/history.csv",
+        match_params={"ref": "python-coverage-comment-action-data"},
+        status_code=404,
+    )
+    session.register(
+        "GET",
+        "https://img.shields.io/static/v1?label=Coverage&message=77%25&color=orange",
+        text="<this is a svg badge>",
+    )
+    git.register("branch --show-current", stdout="foo")
+    git.register("reset --hard")
+    git.register(
+        "--config-env=http.extraheader=GIT_EXTRA_HEADER fetch origin python-coverage-comment-action-data"
+    )
+    git.register("switch python-coverage-comment-action-data")
+    for path in [
+        "endpoint.json",
+        "data.json",
+        "summary-index.json",
+        "history.csv",
+        "badge.svg",
+        "htmlcov",
+        "README.md",
+        "content-hash.txt",
+    ]:
+        git.register(f"add {path}")
+    git.register("diff --staged --exit-code", returncode=1)
+    git.register("commit --message 'ci: Update coverage data'")
+    git.register(
+        "--config-env=http.extraheader=GIT_EXTRA_HEADER push origin python-coverage-comment-action-data"
+    )
+    git.register("switch foo")
+    fake_process.pass_command(["coverage", "combine"])
+    fake_process.pass_command(
+        ["coverage", "html", "--skip-empty", "--directory", fake_process.any()]
+    )
+
+    assert run(content_hash="outdated") == 0
+    assert get_logs("INFO", "Saving coverage files")
+
+    # The second run finds the same hash: no badge, no HTML, no git
+    content_hash = pathlib.Path("content-hash.txt").read_text()
+    # The coverage files were already combined by the first run
+    fake_process.register(["coverage", "combine"])
+    assert run(content_hash=content_hash) == 0
+    assert get_logs("INFO", "Coverage data didn't change since it was last saved")
+    assert "## Coverage report" in summary_file.read_text()
+
+    # A new commit with the same coverage only gets its snapshot
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar/contents/snapshots/de/def456.json",
+        match_params={"ref": "python-coverage-comment-action-data"},
+        status_code=404,
+    )
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar/contents/summary-index.json",
+        match_params={"ref": "python-coverage-comment-action-data"},
+        text="{}",
+        headers={"content-type": "application/vnd.github.raw+json"},
+    )
+    git.register("branch --show-current", stdout="foo")
+    git.register("reset --hard")
+    git.register(
+        "--config-env=http.extraheader=GIT_EXTRA_HEADER fetch origin python-coverage-comment-action-data"
+    )
+    git.register("switch python-coverage-comment-action-data")
+    git.register("add snapshots")
+    git.register("diff --staged --exit-code", returncode=1)
+    git.register("commit --message 'ci: Update coverage data'")
+    git.register(
+        "--config-env=http.extraheader=GIT_EXTRA_HEADER push origin python-coverage-comment-action-data"
+    )
+    git.register("switch foo")
+    fake_process.register(["coverage", "combine"])
+    assert run(content_hash=content_hash, sha="def456") == 0
+    assert get_logs("INFO", "Saved the coverage snapshot of def456")
+    assert pathlib.Path("snapshots/de/def456.json").read_text() == "{}"
+
+
 def test_action__pull_request_closed_merged(
     pull_request_config,
     session,
@@ -877,6 +1485,18 @@ def test_action__pull_request_closed_merged(
         "https://img.shields.io/static/v1?label=Coverage&message=77%25&color=orange",
         text="<this is a svg badge>",
     )
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar/contents/content-hash.txt",
+        match_params={"ref": "python-coverage-comment-action-data"},
+        status_code=404,
+    )
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar/contents/history.csv",
+        match_params={"ref": "python-coverage-comment-action-data"},
+        status_code=404,
+    )
 
     git.register("branch --show-current", stdout="foo")
     git.register("reset --hard")
@@ -886,9 +1506,12 @@ def test_action__pull_request_closed_merged(
     git.register("switch python-coverage-comment-action-data")
     git.register("add endpoint.json")
     git.register("add data.json")
+    git.register("add summary-index.json")
+    git.register("add history.csv")
     git.register("add badge.svg")
     git.register("add htmlcov")
     git.register("add README.md")
+    git.register("add content-hash.txt")
     git.register("diff --staged --exit-code", returncode=1)
     git.register("commit --message 'ci: Update coverage data'")
     git.register(
@@ -941,6 +1564,18 @@ def test_action__push__default_branch__private(
         "https://img.shields.io/static/v1?label=Coverage&message=77%25&color=orange",
         text="<this is a svg badge>",
     )
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar/contents/content-hash.txt",
+        match_params={"ref": "python-coverage-comment-action-data"},
+        status_code=404,
+    )
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar/contents/history.csv",
+        match_params={"ref": "python-coverage-comment-action-data"},
+        status_code=404,
+    )
 
     git.register("branch --show-current", stdout="foo")
     git.register("reset --hard")
@@ -950,8 +1585,11 @@ def test_action__push__default_branch__private(
     git.register("switch python-coverage-comment-action-data")
     git.register("add endpoint.json")
     git.register("add data.json")
+    git.register("add summary-index.json")
+    git.register("add history.csv")
     git.register("add badge.svg")
     git.register("add README.md")
+    git.register("add content-hash.txt")
     git.register("diff --staged --exit-code", returncode=1)
     git.register("commit --message 'ci: Update coverage data'")
     git.register(
@@ -1024,6 +1662,7 @@ def test_action__workflow_run__no_pr(
         "/repos/py-cov-action/foobar/actions/runs/123",
         json={
             "head_branch": "branch",
+            "head_sha": "abc123",
             "head_repository": {"owner": {"login": "bar/repo-name"}},
         },
     )
@@ -1052,131 +1691,355 @@ def test_action__workflow_run__no_pr(
     )
 
     result = main.action(
-        config=workflow_run_config(),
+        config=workflow_run_config(),
+        github_session=session,
+        http_session=session,
+        git=None,
+    )
+
+    assert result == 1
+    assert get_logs("ERROR", "The PR cannot be found")
+
+
+def test_action__workflow_run__no_artifact(
+    workflow_run_config, session, in_integration_env, get_logs
+):
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar",
+        json={"default_branch": "main", "visibility": "public"},
+    )
+    session.register("GET", "/user", json={"login": "foo"})
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar/actions/runs/123",
+        json={
+            "head_branch": "branch",
+            "head_sha": "abc123",
+            "head_repository": {"owner": {"login": "bar/repo-name"}},
+        },
+    )
+
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar/pulls",
+        match_params={
+            "head": "bar/repo-name:branch",
+            "sort": "updated",
+            "direction": "desc",
+            "state": "open",
+        },
+        json=[{"number": 456, "head": {"sha": "abc123"}}],
+    )
+
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar/actions/runs/123/artifacts",
+        match_params={"name": "python-coverage-comment-action", "page": "1"},
+        json={"artifacts": [{"name": "wrong_name"}], "total_count": 1},
+    )
+
+    result = main.action(
+        config=workflow_run_config(),
+        github_session=session,
+        http_session=session,
+        git=None,
+    )
+
+    assert result == 0
+    assert get_logs("INFO", "Artifact was not found")
+
+
+def test_action__workflow_run__post_comment(
+    workflow_run_config, session, in_integration_env, get_logs, zip_bytes, summary_file
+):
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar",
+        json={"default_branch": "main", "visibility": "public"},
+    )
+    session.register("GET", "/user", json={"login": "foo"})
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar/actions/runs/123",
+        json={
+            "head_branch": "branch",
+            "head_sha": "abc123",
+            "head_repository": {"owner": {"login": "bar/repo-name"}},
+        },
+    )
+
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar/pulls",
+        match_params={
+            "head": "bar/repo-name:branch",
+            "sort": "updated",
+            "direction": "desc",
+            "state": "open",
+        },
+        json=[{"number": 456, "head": {"sha": "abc123"}}],
+    )
+
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar/actions/runs/123/artifacts",
+        match_params={"name": "python-coverage-comment-action", "page": "1"},
+        json={
+            "artifacts": [{"name": "python-coverage-comment-action", "id": 789}],
+            "total_count": 1,
+        },
+    )
+
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar/actions/artifacts/789/zip",
+        content=zip_bytes(
+            filename="python-coverage-comment-action.txt", content="Hey!"
+        ),
+    )
+
+    session.register("GET", "/repos/py-cov-action/foobar/issues/456/comments", json=[])
+
+    session.register(
+        "POST",
+        "/repos/py-cov-action/foobar/issues/456/comments",
+        json={"body": "Hey!"},
+    )
+
+    result = main.action(
+        config=workflow_run_config(GITHUB_STEP_SUMMARY=summary_file),
+        github_session=session,
+        http_session=session,
+        git=None,
+    )
+
+    assert result == 0
+    assert get_logs("INFO", "Comment file found in artifact, posting to PR")
+    assert get_logs("INFO", "Comment posted in PR")
+    assert summary_file.read_text() == ""
+
+
+def test_action__workflow_run__post_comment__graphql(
+    workflow_run_config, session, in_integration_env, get_logs, zip_bytes, summary_file
+):
+    repository = {"defaultBranchRef": {"name": "main"}, "visibility": "PUBLIC"}
+    # From action(), which doesn't look for a PR
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar",
+        json={"default_branch": "main", "visibility": "public"},
+    )
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar/actions/runs/123",
+        json={
+            "head_branch": "branch",
+            "head_sha": "abc123",
+            "head_repository": {"owner": {"login": "bar"}},
+        },
+    )
+    # From post_comment(), looking for the PR of the workflow run
+    session.register(
+        "POST",
+        "/graphql",
+        json={
+            "data": {
+                "viewer": {"login": "foo"},
+                "repository": repository
+                | {
+                    "pullRequests": {
+                        "nodes": [
+                            {
+                                "number": 456,
+                                "state": "OPEN",
+                                "headRefOid": "abc123",
+                                "headRepositoryOwner": {"login": "bar"},
+                                "comments": {
+                                    "pageInfo": {"hasNextPage": False},
+                                    "nodes": [],
+                                },
+                            }
+                        ]
+                    }
+                },
+            }
+        },
+    )
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar/actions/runs/123/artifacts",
+        match_params={"name": "python-coverage-comment-action", "page": "1"},
+        json={
+            "artifacts": [{"name": "python-coverage-comment-action", "id": 789}],
+            "total_count": 1,
+        },
+    )
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar/actions/artifacts/789/zip",
+        content=zip_bytes(
+            filename="python-coverage-comment-action.txt", content="Hey!"
+        ),
+    )
+    session.register(
+        "POST",
+        "/repos/py-cov-action/foobar/issues/456/comments",
+        json={"body": "Hey!"},
+    )
+
+    result = main.action(
+        config=workflow_run_config(
+            GITHUB_STEP_SUMMARY=summary_file, USE_GRAPHQL_API=True
+        ),
         github_session=session,
         http_session=session,
         git=None,
     )
 
-    assert result == 1
-    assert get_logs("ERROR", "The PR cannot be found")
+    assert result == 0
+    assert get_logs("INFO", "Comment posted in PR")
 
 
-def test_action__workflow_run__no_artifact(
+def test_action__workflow_run__post_comment__outdated_run(
     workflow_run_config, session, in_integration_env, get_logs
 ):
+    repository = {"defaultBranchRef": {"name": "main"}, "visibility": "PUBLIC"}
     session.register(
         "GET",
         "/repos/py-cov-action/foobar",
         json={"default_branch": "main", "visibility": "public"},
     )
-    session.register("GET", "/user", json={"login": "foo"})
     session.register(
         "GET",
         "/repos/py-cov-action/foobar/actions/runs/123",
         json={
             "head_branch": "branch",
-            "head_repository": {"owner": {"login": "bar/repo-name"}},
+            "head_sha": "abc123",
+            "head_repository": {"owner": {"login": "bar"}},
         },
     )
-
+    # A newer commit was pushed on the PR since the run: its artifact isn't
+    # even downloaded
     session.register(
-        "GET",
-        "/repos/py-cov-action/foobar/pulls",
-        match_params={
-            "head": "bar/repo-name:branch",
-            "sort": "updated",
-            "direction": "desc",
-            "state": "open",
+        "POST",
+        "/graphql",
+        json={
+            "data": {
+                "viewer": {"login": "foo"},
+                "repository": repository
+                | {
+                    "pullRequests": {
+                        "nodes": [
+                            {
+                                "number": 456,
+                                "state": "OPEN",
+                                "headRefOid": "def456",
+                                "headRepositoryOwner": {"login": "bar"},
+                                "comments": {
+                                    "pageInfo": {"hasNextPage": False},
+                                    "nodes": [],
+                                },
+                            }
+                        ]
+                    }
+                },
+            }
         },
-        json=[{"number": 456}],
-    )
-
-    session.register(
-        "GET",
-        "/repos/py-cov-action/foobar/actions/runs/123/artifacts",
-        match_params={"page": "1"},
-        json={"artifacts": [{"name": "wrong_name"}], "total_count": 1},
     )
 
     result = main.action(
-        config=workflow_run_config(),
+        config=workflow_run_config(USE_GRAPHQL_API=True),
         github_session=session,
         http_session=session,
         git=None,
     )
 
     assert result == 0
-    assert get_logs("INFO", "Artifact was not found")
+    assert get_logs("INFO", "Not posting an outdated comment")
 
 
-def test_action__workflow_run__post_comment(
-    workflow_run_config, session, in_integration_env, get_logs, zip_bytes, summary_file
+def test_action__workflow_run__post_comment__outdated_run__rest(
+    workflow_run_config, session, in_integration_env, get_logs
 ):
     session.register(
         "GET",
         "/repos/py-cov-action/foobar",
         json={"default_branch": "main", "visibility": "public"},
     )
-    session.register("GET", "/user", json={"login": "foo"})
     session.register(
         "GET",
         "/repos/py-cov-action/foobar/actions/runs/123",
         json={
             "head_branch": "branch",
-            "head_repository": {"owner": {"login": "bar/repo-name"}},
+            "head_sha": "abc123",
+            "head_repository": {"owner": {"login": "bar"}},
         },
     )
-
+    session.register("GET", "/user", json={"login": "foo"})
+    # A newer commit was pushed on the PR since the run: its artifact isn't
+    # even downloaded
     session.register(
         "GET",
         "/repos/py-cov-action/foobar/pulls",
         match_params={
-            "head": "bar/repo-name:branch",
+            "head": "bar:branch",
             "sort": "updated",
             "direction": "desc",
             "state": "open",
         },
-        json=[{"number": 456}],
+        json=[{"number": 456, "head": {"sha": "def456"}}],
     )
 
-    session.register(
-        "GET",
-        "/repos/py-cov-action/foobar/actions/runs/123/artifacts",
-        match_params={"page": "1"},
-        json={
-            "artifacts": [{"name": "python-coverage-comment-action", "id": 789}],
-            "total_count": 1,
-        },
+    result = main.action(
+        config=workflow_run_config(),
+        github_session=session,
+        http_session=session,
+        git=None,
     )
 
+    assert result == 0
+    assert get_logs("INFO", "Not posting an outdated comment")
+
+
+def test_action__workflow_run__no_pr__graphql(
+    workflow_run_config, session, in_integration_env, get_logs
+):
+    empty = {
+        "data": {
+            "viewer": {"login": "foo"},
+            "repository": {
+                "defaultBranchRef": {"name": "main"},
+                "visibility": "PUBLIC",
+                "pullRequests": {"nodes": []},
+            },
+        }
+    }
     session.register(
         "GET",
-        "/repos/py-cov-action/foobar/actions/artifacts/789/zip",
-        content=zip_bytes(
-            filename="python-coverage-comment-action.txt", content="Hey!"
-        ),
+        "/repos/py-cov-action/foobar",
+        json={"default_branch": "main", "visibility": "public"},
     )
-
-    session.register("GET", "/repos/py-cov-action/foobar/issues/456/comments", json=[])
-
     session.register(
-        "POST",
-        "/repos/py-cov-action/foobar/issues/456/comments",
-        json={"body": "Hey!"},
+        "GET",
+        "/repos/py-cov-action/foobar/actions/runs/123",
+        json={
+            "head_branch": "branch",
+            "head_sha": "abc123",
+            "head_repository": {"owner": {"login": "bar"}},
+        },
     )
+    session.register("POST", "/graphql", json=empty)
 
     result = main.action(
-        config=workflow_run_config(GITHUB_STEP_SUMMARY=summary_file),
+        config=workflow_run_config(USE_GRAPHQL_API=True),
         github_session=session,
         http_session=session,
         git=None,
     )
 
-    assert result == 0
-    assert get_logs("INFO", "Comment file found in artifact, posting to PR")
-    assert get_logs("INFO", "Comment posted in PR")
-    assert summary_file.read_text() == ""
+    assert result == 1
+    assert get_logs("ERROR", "The PR cannot be found")
 
 
 def test_action__pull_request__diff_too_large(
@@ -1263,3 +2126,323 @@ def test_action__pull_request__diff_too_large(
     assert "[!WARNING]" in comment
     # Check the N/A badge is shown for PR coverage (URL-encoded in badge URL)
     assert "PR%20Coverage-N/A-grey" in comment
+
+
+@pytest.fixture
+def subprojects(in_integration_env, file_path):
+    # Requested before fake_process, which would intercept `coverage run`.
+    # Each subproject gets its own copy of foo.py, and its own coverage data
+    result = []
+    for subproject_id in ["api", "web"]:
+        path = in_integration_env / subproject_id
+        path.mkdir()
+        (path / file_path.name).write_text(file_path.read_text())
+        subprocess.check_call(
+            ["coverage", "run", "--parallel", file_path.name],
+            cwd=path,
+            env=os.environ | {"A": "1", "C": "1"},
+        )
+        result.append(
+            settings.Subproject(id=subproject_id, coverage_path=pathlib.Path(path.name))
+        )
+    return result
+
+
+def test_action__pull_request__subprojects(
+    pull_request_config,
+    session,
+    in_integration_env,
+    subprojects,
+    output_file,
+    summary_file,
+    git,
+    fake_process,
+):
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar",
+        json={"default_branch": "main", "visibility": "public"},
+    )
+    for subproject in subprojects:
+        branch = f"python-coverage-comment-action-data-{subproject.id}"
+        session.register(
+            "GET",
+            "/repos/py-cov-action/foobar/contents/data.json",
+            match_params={"ref": branch},
+            status_code=404,
+        )
+        session.register(
+            "POST", "/repos/py-cov-action/foobar/issues/2/comments", status_code=200
+        )
+
+    # Fetched once for all the subprojects
+    session.register("GET", "/user", json={"login": "foo"})
+    session.register("GET", "/repos/py-cov-action/foobar/issues/2/comments", json=[])
+    session.register("GET", "/repos/py-cov-action/foobar/pulls/2", text=DIFF_STDOUT)
+
+    fake_process.pass_command(["coverage", "combine"], occurrences=2)
+    fake_process.pass_command(["coverage", "json", "-o", "-"], occurrences=2)
+
+    span_recorder = tracing.SpanRecorder()
+    with tracing.recording_spans(span_recorder):
+        result = main.action(
+            config=pull_request_config(
+                GITHUB_OUTPUT=output_file,
+                GITHUB_STEP_SUMMARY=summary_file,
+                SUBPROJECTS=subprojects,
+            ),
+            github_session=session,
+            http_session=session,
+            git=git,
+        )
+    assert result == 0
+    paths = {record.path for record in span_recorder.records}
+    assert ("process_subprojects_pr",) in paths
+    assert ("process_subprojects_pr", "process_pr") in paths
+
+    comments = sorted(
+        json.loads(request.content)["body"]
+        for request in session.get_requests(
+            "POST", "/repos/py-cov-action/foobar/issues/2/comments"
+        )
+    )
+    assert len(comments) == 2
+    assert comments[0].endswith(comment_file.get_marker(marker_id="api"))
+    assert comments[1].endswith(comment_file.get_marker(marker_id="web"))
+
+    output = dict(
+        line.split("=", 1) for line in output_file.read_text().strip().splitlines()
+    )
+    assert output["api_activity_run"] == output["web_activity_run"] == '"process_pr"'
+    assert output["api_new_percent_covered"] == "0.7777777777777778"
+    assert output["activity_run"] == '"process_pr"'
+
+
+def test_action__push__default_branch__subprojects(
+    push_config,
+    session,
+    in_integration_env,
+    subprojects,
+    get_logs,
+    git,
+    summary_file,
+    fake_process,
+):
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar",
+        json={"default_branch": "main", "visibility": "public"},
+    )
+    for subproject in subprojects:
+        branch = f"python-coverage-comment-action-data-{subproject.id}"
+        session.register(
+            "GET",
+            "https://img.shields.io/static/v1?label=Coverage&message=77%25&color=orange",
+            text="<this is a svg badge>",
+        )
+        session.register(
+            "GET",
+            "/repos/py-cov-action/foobar/contents/content-hash.txt",
+            match_params={"ref": branch},
+            status_code=404,
+        )
+        session.register(
+            "GET",
+            "/repos/py-cov-action/foobar/contents/history.csv",
+            match_params={"ref": branch},
+            status_code=404,
+        )
+
+    git.register("branch --show-current", stdout="foo")
+    git.register("reset --hard")
+    # A single fetch...
+    git.register(
+        "--config-env=http.extraheader=GIT_EXTRA_HEADER fetch origin "
+        "python-coverage-comment-action-data-api "
+        "python-coverage-comment-action-data-web"
+    )
+    for subproject in subprojects:
+        git.register(f"switch python-coverage-comment-action-data-{subproject.id}")
+        for path in [
+            "endpoint.json",
+            "data.json",
+            "summary-index.json",
+            "history.csv",
+            "snapshots",
+            "badge.svg",
+            "htmlcov",
+            "README.md",
+            "content-hash.txt",
+        ]:
+            git.register(f"add {path}")
+        git.register("diff --staged --exit-code", returncode=1)
+        git.register("commit --message 'ci: Update coverage data'")
+    # ...and a single push
+    git.register(
+        "--config-env=http.extraheader=GIT_EXTRA_HEADER push origin "
+        "python-coverage-comment-action-data-api "
+        "python-coverage-comment-action-data-web"
+    )
+    git.register("switch foo")
+
+    fake_process.pass_command(["coverage", "combine"], occurrences=2)
+    fake_process.pass_command(["coverage", "json", "-o", "-"], occurrences=2)
+    fake_process.pass_command(
+        ["coverage", "html", "--skip-empty", "--directory", fake_process.any()],
+        occurrences=2,
+    )
+    fake_process.pass_command(
+        ["coverage", "report", "--format=markdown", "--show-missing"],
+        occurrences=2,
+    )
+
+    result = main.action(
+        config=push_config(
+            GITHUB_STEP_SUMMARY=summary_file,
+            GITHUB_SHA="abc123",
+            SUBPROJECTS=subprojects,
+        ),
+        github_session=session,
+        http_session=session,
+        git=git,
+    )
+    assert result == 0
+
+    assert len(get_logs("INFO", "Badge SVG available at")) == 2
+
+
+def test_action__workflow_run__post_comment__subprojects(
+    workflow_run_config, session, in_integration_env, get_logs, zip_bytes
+):
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar",
+        json={"default_branch": "main", "visibility": "public"},
+    )
+    session.register("GET", "/user", json={"login": "foo"})
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar/actions/runs/123",
+        json={
+            "head_branch": "branch",
+            "head_sha": "abc123",
+            "head_repository": {"owner": {"login": "bar/repo-name"}},
+        },
+    )
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar/pulls",
+        match_params={
+            "head": "bar/repo-name:branch",
+            "sort": "updated",
+            "direction": "desc",
+            "state": "open",
+        },
+        json=[{"number": 456, "head": {"sha": "abc123"}}],
+    )
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar/actions/runs/123/artifacts",
+        match_params={"name": "python-coverage-comment-action", "page": "1"},
+        json={
+            "artifacts": [{"name": "python-coverage-comment-action", "id": 789}],
+            "total_count": 1,
+        },
+    )
+    # Only the api subproject stored a comment
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar/actions/artifacts/789/zip",
+        content=zip_bytes(
+            filename="python-coverage-comment-action-api.txt", content="Hey!"
+        ),
+    )
+    session.register("GET", "/repos/py-cov-action/foobar/issues/456/comments", json=[])
+    session.register(
+        "POST",
+        "/repos/py-cov-action/foobar/issues/456/comments",
+        json={"body": "Hey!"},
+    )
+
+    result = main.action(
+        config=workflow_run_config(
+            SUBPROJECTS=[
+                settings.Subproject(id="api", coverage_path=pathlib.Path("api")),
+                settings.Subproject(id="web", coverage_path=pathlib.Path("web")),
+            ]
+        ),
+        github_session=session,
+        http_session=session,
+        git=None,
+    )
+
+    assert result == 0
+    assert get_logs("INFO", "No comment file for subproject web")
+    assert len(get_logs("INFO", "Comment posted in PR")) == 1
+
+
+def test_action__pull_request__subprojects__combined_comment(
+    pull_request_config,
+    session,
+    in_integration_env,
+    subprojects,
+    output_file,
+    summary_file,
+    git,
+    fake_process,
+):
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar",
+        json={"default_branch": "main", "visibility": "public"},
+    )
+    for subproject in subprojects:
+        branch = f"python-coverage-comment-action-data-{subproject.id}"
+        session.register(
+            "GET",
+            "/repos/py-cov-action/foobar/contents/data.json",
+            match_params={"ref": branch},
+            status_code=404,
+        )
+
+    session.register("GET", "/user", json={"login": "foo"})
+    session.register("GET", "/repos/py-cov-action/foobar/issues/2/comments", json=[])
+    session.register("GET", "/repos/py-cov-action/foobar/pulls/2", text=DIFF_STDOUT)
+    # A single comment for all the subprojects
+    session.register(
+        "POST", "/repos/py-cov-action/foobar/issues/2/comments", status_code=200
+    )
+
+    fake_process.pass_command(["coverage", "combine"], occurrences=2)
+    fake_process.pass_command(["coverage", "json", "-o", "-"], occurrences=2)
+
+    result = main.action(
+        config=pull_request_config(
+            GITHUB_OUTPUT=output_file,
+            GITHUB_STEP_SUMMARY=summary_file,
+            SUBPROJECTS=subprojects,
+            COMBINED_COMMENT=True,
+        ),
+        github_session=session,
+        http_session=session,
+        git=git,
+    )
+    assert result == 0
+
+    comment = json.loads(
+        session.get_request(
+            "POST", "/repos/py-cov-action/foobar/issues/2/comments"
+        ).content.decode()
+    )["body"]
+    assert comment.index("## Coverage report (api)") < comment.index(
+        "## Coverage report (web)"
+    )
+    assert comment.count("<!-- This comment was produced") == 1
+    assert comment.endswith(comment_file.get_marker(marker_id=None))
+
+    output = dict(
+        line.split("=", 1) for line in output_file.read_text().strip().splitlines()
+    )
+    assert output["api_new_percent_covered"] == "0.7777777777777778"
+    assert output["activity_run"] == '"process_pr"'
+    assert output["comment_file_written"] == "false"
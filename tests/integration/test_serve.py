@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from coverage_comment import comment_file, main, serve
+from tests.benchmarks import replay, stub_github
+
+
+@pytest.fixture
+def stub(tmp_path):
+    comment_path = tmp_path / "python-coverage-comment-action.txt"
+    comment_path.write_text(f"Coverage\n{comment_file.get_marker(marker_id=None)}")
+    calls = replay.post_comment_calls(artifact=replay.make_artifact(comment_path))
+    with stub_github.StubGitHub(calls=calls) as server:
+        yield server
+
+
+@pytest.fixture
+def server_url(stub, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    service = serve.Service(
+        workers=2,
+        queue_size=2,
+        action=main.action,
+        transport=replay.LocalTransport(url=stub.url),
+    )
+    server = serve.JobServer(("127.0.0.1", 0), service)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    yield f"http://{host!s}:{port}"
+    server.shutdown()
+    server.server_close()
+    service.close()
+
+
+def request(url, payload=None):
+    data = json.dumps(payload).encode() if payload is not None else None
+    try:
+        with urllib.request.urlopen(url, data=data) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as exc:
+        with exc:
+            return exc.code, json.load(exc)
+
+
+def wait_for_job(url, job_id):
+    for _ in range(100):
+        status, job = request(f"{url}/jobs/{job_id}")
+        assert status == 200
+        if job["status"] in {"done", "failed"}:
+            return job
+        time.sleep(0.1)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+
+def test_serve(server_url, stub, tmp_path):
+    (tmp_path / "jobs").mkdir()
+    payload = {
+        "workspace": "jobs",
+        "env": {
+            "GITHUB_TOKEN": "foo",
+            "GITHUB_REPOSITORY": replay.REPOSITORY,
+            "GITHUB_BASE_URL": stub.url,
+            "GITHUB_REF": "refs/heads/main",
+            "GITHUB_EVENT_NAME": "workflow_run",
+            "GITHUB_PR_RUN_ID": str(replay.RUN_ID),
+            "ACTIVITY": "post_comment",
+        },
+    }
+
+    for _ in range(2):
+        status, job = request(f"{server_url}/jobs", payload)
+        assert status == 202
+        assert job["exit_code"] is None
+
+        job = wait_for_job(server_url, job["id"])
+        assert job["status"] == "done"
+        assert job["exit_code"] == 0
+
+    # The second job revalidated the repository, the run, its artifacts and the
+    # artifact zip
+    assert stub.not_modified == 4
+    assert (tmp_path / "jobs" / "coverage-comment-output.txt").read_text()
+
+
+def test_serve__process_pr(server_url, stub, tmp_path):
+    (tmp_path / "jobs").mkdir()
+    replay.make_project(path=tmp_path / "jobs", modules=2)
+    stub.set_calls(replay.process_pr_calls(modules=2))
+    payload = {
+        "workspace": "jobs/project",
+        "env": {
+            "GITHUB_TOKEN": "foo",
+            "GITHUB_REPOSITORY": replay.REPOSITORY,
+            "GITHUB_BASE_URL": stub.url,
+            "GITHUB_REF": f"refs/pull/{replay.PR_NUMBER}/merge",
+            "GITHUB_BASE_REF": "main",
+            "GITHUB_EVENT_NAME": "pull_request",
+            "ACTIVITY": "process_pr",
+            # The comment is written to a file, for `post_comment`
+            "FORCE_WORKFLOW_RUN": "true",
+        },
+    }
+
+    status, job = request(f"{server_url}/jobs", payload)
+    assert status == 202
+    job = wait_for_job(server_url, job["id"])
+    assert job["status"] == "done"
+
+    # The paths of the coverage report are relative to the workspace, like
+    # the paths of the diff
+    workspace = tmp_path / "jobs" / "project"
+    output = dict(
+        line.split("=", 1)
+        for line in (workspace / "coverage-comment-output.txt").read_text().splitlines()
+    )
+    assert int(output["diff_total_num_lines"]) > 0
+    comment = (workspace / "python-coverage-comment-action.txt").read_text()
+    assert "module_0.py" in comment
+
+
+def test_serve__invalid_job(server_url):
+    status, body = request(f"{server_url}/jobs", {"env": {}})
+
+    assert status == 400
+    assert "ACTIVITY" in body["error"]
+
+
+def test_serve__unknown_job(server_url):
+    status, body = request(f"{server_url}/jobs/foo")
+
+    assert status == 404
+    assert body == {"error": "Not found"}
+
+
+def test_serve__unknown_path(server_url):
+    status, body = request(f"{server_url}/foo", {})
+
+    assert status == 404
+    assert body == {"error": "Not found"}
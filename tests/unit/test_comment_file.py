@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import pytest
+
 from coverage_comment import comment_file
 
 
@@ -8,3 +10,17 @@ def test_comment_file(tmp_path):
     comment_file.store_file(filename=path, content="foo")
 
     assert path.read_text() == "foo"
+
+
+@pytest.mark.parametrize(
+    "marker_id, result",
+    [
+        (None, "<!-- This comment was produced by python-coverage-comment-action -->"),
+        (
+            "foo",
+            "<!-- This comment was produced by python-coverage-comment-action (id: foo) -->",
+        ),
+    ],
+)
+def test_get_marker(marker_id, result):
+    assert comment_file.get_marker(marker_id=marker_id) == result
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import dataclasses
 import decimal
 import json
 import pathlib
@@ -72,6 +73,19 @@ def test_get_coverage_info(fake_process, coverage_json, coverage_obj):
     assert raw_coverage_information == coverage_json
 
 
+def test_get_coverage_info__merge_cache(
+    fake_process, coverage_json, tmp_path, get_logs
+):
+    fake_process.register(["coverage", "combine"])
+    fake_process.register(
+        ["coverage", "json", "-o", "-"], stdout=json.dumps(coverage_json)
+    )
+
+    coverage.get_coverage_info(merge=True, coverage_path=tmp_path, merge_cache=True)
+
+    assert get_logs("INFO", "No usable cache of combined coverage data")
+
+
 def test_get_coverage_info__no_merge(fake_process, coverage_json):
     fake_process.register(
         ["coverage", "json", "-o", "-"], stdout=json.dumps(coverage_json)
@@ -104,6 +118,82 @@ def test_get_coverage_info__error_no_source(fake_process, get_logs):
     )
 
 
+def test_get_coverage(fake_process, coverage_json, coverage_obj):
+    fake_process.register(
+        ["coverage", "json", "-o", "-"], stdout=json.dumps(coverage_json)
+    )
+
+    result = coverage.get_coverage(coverage_path=pathlib.Path("."))
+
+    assert result == coverage_obj
+
+
+def test_get_coverage__error_no_source(fake_process):
+    fake_process.register(
+        ["coverage", "json", "-o", "-"], returncode=1, stderr="No source for code: bla"
+    )
+
+    with pytest.raises(subprocess.SubProcessError) as exc_info:
+        coverage.get_coverage(coverage_path=pathlib.Path("."))
+
+    assert "Cannot read .coverage files because files are absolute" in str(
+        exc_info.value.__notes__
+    )
+
+
+def test_get_coverage__keep_file(fake_process, coverage_json, coverage_obj):
+    fake_process.register(
+        ["coverage", "json", "-o", "-"], stdout=json.dumps(coverage_json)
+    )
+
+    result = coverage.get_coverage(
+        coverage_path=pathlib.Path("."), keep_file=lambda path, info: False
+    )
+
+    assert result.files == {}
+    assert result.file_summaries == {
+        path: file.info for path, file in coverage_obj.files.items()
+    }
+    assert result.info == coverage_obj.info
+
+
+def test_extract_info__keep_file(coverage_json, coverage_obj):
+    (path, file), *_ = coverage_obj.files.items()
+
+    result = coverage.extract_info(
+        data=coverage_json,
+        coverage_path=pathlib.Path("."),
+        keep_file=lambda path, info: path == file.path,
+    )
+
+    assert result.files == {path: file}
+    assert path not in result.file_summaries
+    assert len(result.files) + len(result.file_summaries) == len(coverage_obj.files)
+
+
+def test_get_diff_only_filter(coverage_obj_more_files):
+    keep_file = coverage.get_diff_only_filter(
+        added_lines=[pathlib.Path("codebase/added.py")],
+        previous_coverage=coverage_obj_more_files,
+    )
+    info = coverage_obj_more_files.files[pathlib.Path("codebase/other.py")].info
+
+    assert keep_file(pathlib.Path("codebase/added.py"), info)
+    assert not keep_file(pathlib.Path("codebase/other.py"), info)
+    assert keep_file(
+        pathlib.Path("codebase/other.py"),
+        dataclasses.replace(info, covered_lines=info.covered_lines + 1),
+    )
+    # Not in the previous coverage: cannot have changed
+    assert not keep_file(pathlib.Path("codebase/new.py"), info)
+
+
+def test_get_diff_only_filter__no_previous_coverage(coverage_obj):
+    keep_file = coverage.get_diff_only_filter(added_lines=[], previous_coverage=None)
+
+    assert not keep_file(pathlib.Path("codebase/code.py"), coverage_obj.info)
+
+
 def test_generate_coverage_html_files(fake_process):
     fake_process.register(
         ["coverage", "html", "--skip-empty", "--directory", "/tmp/foo"],
@@ -345,3 +435,101 @@ index 1f1d9a4..e69de29 100644
     git.register("diff --unified=0 FETCH_HEAD...HEAD", stdout=diff)
     with pytest.raises(ValueError):
         coverage.get_added_lines(diff=diff)
+
+
+def test_info_from_row():
+    summary = {
+        "covered_lines": 4,
+        "num_statements": 10,
+        "missing_lines": 6,
+        "excluded_lines": 1,
+        "covered_branches": 1,
+        "num_branches": 2,
+        "percent_covered": 41.66,
+    }
+
+    row = coverage.summary_to_row(summary)
+
+    assert row == [4, 10, 6, 1, 2, 0, 1, 0]
+    assert coverage.info_from_row(row) == coverage._make_coverage_info(summary)
+
+
+def test_sum_coverage_info():
+    result = coverage.sum_coverage_info(
+        [
+            coverage._make_coverage_info(
+                {
+                    "covered_lines": 4,
+                    "num_statements": 10,
+                    "missing_lines": 6,
+                    "excluded_lines": 1,
+                    "covered_branches": 1,
+                    "num_branches": 2,
+                }
+            ),
+            coverage._make_coverage_info(
+                {
+                    "covered_lines": 6,
+                    "num_statements": 10,
+                    "missing_lines": 4,
+                    "excluded_lines": 0,
+                }
+            ),
+        ]
+    )
+
+    assert result == coverage._make_coverage_info(
+        {
+            "covered_lines": 10,
+            "num_statements": 20,
+            "missing_lines": 10,
+            "excluded_lines": 1,
+            "covered_branches": 1,
+            "num_branches": 2,
+        }
+    )
+
+
+@pytest.mark.parametrize(
+    "path, expected",
+    [
+        ("/foo/bar/baz.py", "bar/baz.py"),
+        ("/other/baz.py", "/other/baz.py"),
+        ("bar/baz.py", "bar/baz.py"),
+    ],
+)
+def test_get_report_path(path, expected):
+    assert (
+        coverage.get_report_path(path=path, coverage_path=pathlib.Path("/foo"))
+        == expected
+    )
+
+
+def test_merge_json_reports():
+    def report(path, statements, missing):
+        return {
+            "meta": {"branch_coverage": False},
+            "files": {path: {}},
+            "totals": {
+                "covered_lines": statements - missing,
+                "num_statements": statements,
+                "percent_covered": 0.0,
+                "percent_covered_display": "0.00",
+                "missing_lines": missing,
+                "excluded_lines": 0,
+            },
+        }
+
+    result = coverage.merge_json_reports(
+        reports=[report("b.py", 2, 1), report("a.py", 1, 0)]
+    )
+
+    assert list(result["files"]) == ["a.py", "b.py"]
+    assert result["totals"] == {
+        "covered_lines": 2,
+        "num_statements": 3,
+        "percent_covered": 200 / 3,
+        "percent_covered_display": "66.67",
+        "missing_lines": 1,
+        "excluded_lines": 0,
+    }
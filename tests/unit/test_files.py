@@ -4,7 +4,9 @@ import decimal
 import json
 import pathlib
 
-from coverage_comment import files
+import pytest
+
+from coverage_comment import coverage, files
 
 
 def test_write_file(tmp_path):
@@ -27,7 +29,7 @@ def test_replace_dir(tmp_path):
     assert not (tmp_path / "bar/barfile").exists()
 
 
-def test_compute_files(session):
+def test_compute_files(session, coverage_json):
     session.register(
         "GET",
         "https://img.shields.io/static/v1?label=Coverage&message=12%25&color=red",
@@ -36,7 +38,7 @@ def test_compute_files(session):
 
     result = files.compute_files(
         line_rate=decimal.Decimal("0.1234"),
-        raw_coverage_data={"foo": ["bar", "bar2"]},
+        raw_coverage_data=coverage_json,
         coverage_path=pathlib.Path("."),
         minimum_green=decimal.Decimal("25"),
         minimum_orange=decimal.Decimal("70"),
@@ -49,7 +51,19 @@ def test_compute_files(session):
         ),
         files.WriteFile(
             path=pathlib.Path("data.json"),
-            contents='{"coverage": 12.34, "raw_data": {"foo": ["bar", "bar2"]}, "coverage_path": "."}',
+            contents=files.compute_datafile(
+                raw_coverage_data=coverage_json,
+                line_rate=decimal.Decimal("12.34"),
+                coverage_path=pathlib.Path("."),
+            ),
+        ),
+        files.WriteFile(
+            path=pathlib.Path("summary-index.json"),
+            contents=files.compute_summary_index(
+                raw_coverage_data=coverage_json,
+                line_rate=decimal.Decimal("12.34"),
+                coverage_path=pathlib.Path("."),
+            ),
         ),
         files.WriteFile(path=pathlib.Path("badge.svg"), contents="foo"),
     ]
@@ -67,6 +81,20 @@ def test_compute_datafile():
     )
 
 
+def test_compute_datafile__fingerprints():
+    result = files.compute_datafile(
+        line_rate=decimal.Decimal("12.34"),
+        raw_coverage_data={"meta": {"version": "5.5"}},
+        coverage_path=pathlib.Path("."),
+        fingerprints=coverage.Fingerprints(environment="abc", files={"foo.py": "def"}),
+    )
+
+    assert json.loads(result)["fingerprints"] == {
+        "environment": "abc",
+        "files": {"foo.py": "def"},
+    }
+
+
 def test_parse_datafile():
     assert files.parse_datafile(contents="""{"coverage": 12.34}""") == (
         None,
@@ -88,6 +116,250 @@ def test_parse_datafile__previous(coverage_json, coverage_obj):
     assert result == (coverage_obj, decimal.Decimal("0.1234"))
 
 
+@pytest.mark.parametrize(
+    "fingerprints, expected",
+    [
+        (
+            {"environment": "abc", "files": {"foo.py": "def"}},
+            coverage.Fingerprints(environment="abc", files={"foo.py": "def"}),
+        ),
+        (None, None),
+        ({"environment": "abc"}, None),
+    ],
+)
+def test_load_datafile__fingerprints(coverage_json, fingerprints, expected):
+    result = files.load_datafile(
+        contents=json.dumps(
+            {
+                "coverage": 12.34,
+                "raw_data": coverage_json,
+                "coverage_path": ".",
+                "fingerprints": fingerprints,
+            }
+        )
+    )
+
+    assert result.fingerprints == expected
+
+
+def test_compute_summary_index(coverage_json):
+    result = json.loads(
+        files.compute_summary_index(
+            raw_coverage_data=coverage_json,
+            line_rate=decimal.Decimal("12.34"),
+            coverage_path=pathlib.Path("."),
+        )
+    )
+
+    assert result["version"] == files.SUMMARY_INDEX_VERSION
+    assert result["coverage"] == 12.34
+    assert result["files"]["codebase/code.py"] == coverage.summary_to_row(
+        coverage_json["files"]["codebase/code.py"]["summary"]
+    )
+
+
+def test_load_summary_index(coverage_json, coverage_obj):
+    result = files.load_summary_index(
+        contents=files.compute_summary_index(
+            raw_coverage_data=coverage_json,
+            line_rate=decimal.Decimal("12.34"),
+            coverage_path=pathlib.Path("."),
+        )
+    )
+
+    assert result
+    assert result.coverage_rate == decimal.Decimal("0.1234")
+    assert result.coverage
+    assert result.coverage.meta == coverage_obj.meta
+    assert result.coverage.info == coverage_obj.info
+    assert result.coverage.files == {}
+    assert result.coverage.file_summaries == {
+        path: file.info for path, file in coverage_obj.files.items()
+    }
+
+
+def test_load_summary_index__other_version():
+    assert files.load_summary_index(contents='{"version": 0}') is None
+
+
+def history_entry(sha, coverage="50"):
+    return files.HistoryEntry(
+        sha=sha,
+        timestamp="2021-12-26T22:27:40.683570",
+        coverage=decimal.Decimal(coverage),
+        num_statements=10,
+        covered_lines=5,
+        num_branches=0,
+        covered_branches=0,
+    )
+
+
+def test_history_entry__from_coverage(coverage_json):
+    result = files.HistoryEntry.from_coverage(
+        sha="abc",
+        raw_coverage_data=coverage_json,
+        line_rate=decimal.Decimal("0.123456"),
+    )
+
+    assert result == files.HistoryEntry(
+        sha="abc",
+        timestamp=coverage_json["meta"]["timestamp"],
+        coverage=decimal.Decimal("12.35"),
+        num_statements=coverage_json["totals"]["num_statements"],
+        covered_lines=coverage_json["totals"]["covered_lines"],
+        num_branches=coverage_json["totals"]["num_branches"],
+        covered_branches=coverage_json["totals"]["covered_branches"],
+    )
+
+
+def test_compute_history():
+    result = files.compute_history(entries=[history_entry("a"), history_entry("b")])
+
+    assert result == (
+        "sha,timestamp,coverage,num_statements,covered_lines,num_branches,covered_branches\n"
+        "a,2021-12-26T22:27:40.683570,50,10,5,0,0\n"
+        "b,2021-12-26T22:27:40.683570,50,10,5,0,0\n"
+    )
+    assert files.parse_history(result) == [history_entry("a"), history_entry("b")]
+
+
+def test_parse_history__invalid_lines():
+    contents = files.compute_history(entries=[history_entry("a")]) + "b,c\n"
+
+    assert files.parse_history(contents) == [history_entry("a")]
+
+
+def test_append_history():
+    contents = files.compute_history(
+        entries=[history_entry("a"), history_entry("b"), history_entry("c")]
+    )
+
+    result = files.append_history(
+        contents=contents, entry=history_entry("d"), max_entries=3
+    )
+
+    assert [entry.sha for entry in result] == ["b", "c", "d"]
+
+
+def test_append_history__empty():
+    result = files.append_history(contents=None, entry=history_entry("a"))
+
+    assert result == [history_entry("a")]
+
+
+@pytest.mark.parametrize(
+    "sha, expected",
+    [
+        ("a", ["a"]),
+        # Without a SHA, runs can't be told apart
+        ("", ["", ""]),
+    ],
+)
+def test_append_history__same_commit(sha, expected):
+    contents = files.compute_history(entries=[history_entry(sha)])
+
+    result = files.append_history(contents=contents, entry=history_entry(sha, "60"))
+
+    assert [entry.sha for entry in result] == expected
+    assert result[-1].coverage == decimal.Decimal("60")
+
+
+def test_summary_index__history(coverage_json):
+    history = [history_entry(str(i), coverage=str(i)) for i in range(30)]
+
+    result = files.load_summary_index(
+        contents=files.compute_summary_index(
+            raw_coverage_data=coverage_json,
+            line_rate=decimal.Decimal("12.34"),
+            coverage_path=pathlib.Path("."),
+            history=history,
+        )
+    )
+
+    assert result
+    assert result.history == [
+        decimal.Decimal(i) / 100 for i in range(30 - files.HISTORY_RECENT_ENTRIES, 30)
+    ]
+
+
+def test_datafile__history(coverage_json):
+    history = [history_entry(str(i), coverage=str(i)) for i in range(30)]
+
+    result = files.load_datafile(
+        contents=files.compute_datafile(
+            raw_coverage_data=coverage_json,
+            line_rate=decimal.Decimal("12.34"),
+            coverage_path=pathlib.Path("."),
+            history=history,
+        )
+    )
+
+    assert result.history == [
+        decimal.Decimal(i) / 100 for i in range(30 - files.HISTORY_RECENT_ENTRIES, 30)
+    ]
+
+
+def test_get_snapshot_path():
+    assert files.get_snapshot_path(sha="abc123") == pathlib.Path("ab/abc123.json")
+
+
+def test_write_snapshot(in_tmp_path):
+    for sha in ["aa1", "aa2", "bb1"]:
+        files.WriteSnapshot(sha=sha, contents=f"{sha} data", max_count=2).apply()
+
+    # The oldest snapshot was deleted
+    assert not pathlib.Path("snapshots/aa/aa1.json").exists()
+    assert pathlib.Path("snapshots/aa/aa2.json").read_text() == "aa2 data"
+    assert pathlib.Path("snapshots/bb/bb1.json").read_text() == "bb1 data"
+    index = json.loads(pathlib.Path("snapshots/index.json").read_text())
+    assert index == {"snapshots": ["aa2", "bb1"]}
+
+    # Saving the same commit again makes it the most recent one
+    files.WriteSnapshot(sha="aa2", contents="new data", max_count=2).apply()
+    files.WriteSnapshot(sha="cc1", contents="cc1 data", max_count=2).apply()
+
+    assert pathlib.Path("snapshots/aa/aa2.json").read_text() == "new data"
+    # Empty shards are deleted
+    assert not pathlib.Path("snapshots/bb").exists()
+    index = json.loads(pathlib.Path("snapshots/index.json").read_text())
+    assert index == {"snapshots": ["aa2", "cc1"]}
+
+
+def test_compute_content_hash(coverage_json):
+    fingerprints = coverage.Fingerprints(environment="env", files={"foo.py": "abc"})
+
+    def content_hash(raw_coverage_data=coverage_json, settings=None):
+        return files.compute_content_hash(
+            raw_coverage_data=raw_coverage_data,
+            fingerprints=fingerprints,
+            settings=settings or {"a": 1},
+        )
+
+    result = content_hash()
+
+    # The timestamp changes on every run
+    other_run = coverage_json | {
+        "meta": coverage_json["meta"] | {"timestamp": "2000-01-01T00:00:00"}
+    }
+    assert content_hash(raw_coverage_data=other_run) == result
+    # The order of the keys doesn't matter
+    reordered = dict(reversed(coverage_json.items()))
+    assert content_hash(raw_coverage_data=reordered) == result
+
+    assert content_hash(settings={"a": 2}) != result
+    other_totals = coverage_json | {
+        "totals": coverage_json["totals"] | {"covered_lines": 0}
+    }
+    assert content_hash(raw_coverage_data=other_totals) != result
+
+
+def test_compute_content_hash__no_fingerprints(coverage_json):
+    result = files.compute_content_hash(
+        raw_coverage_data=coverage_json, fingerprints=None, settings={}
+    )
+    assert result is None
+
+
 def test_get_urls():
     def getter(path):
         return f"https://{path}"
@@ -1,5 +1,8 @@
 from __future__ import annotations
 
+import io
+
+import httpx
 import pytest
 
 from coverage_comment import github_client
@@ -104,12 +107,77 @@ def test_github_client__post_non_json(session, gh):
     gh.repos("a/b").issues().post(a=1)
 
 
+def test_github_client__download(session, gh):
+    session.register(
+        "GET",
+        "/repos/a/b/zip",
+        match_params={"a": "1"},
+        content=b"foo" * 100_000,
+        headers={"content-type": "application/zip"},
+    )
+    file = io.BytesIO()
+
+    gh.repos("a/b").zip.download(file=file, a=1)
+
+    # Ready to be read
+    assert file.tell() == 0
+    assert file.read() == b"foo" * 100_000
+
+
+def test_github_client__download__error(session, gh):
+    session.register("GET", "/repos/a/b/zip", text="nope", status_code=404)
+
+    with pytest.raises(github_client.NotFound) as exc_info:
+        gh.repos("a/b").zip.download(file=io.BytesIO())
+
+    assert str(exc_info.value) == "nope"
+
+
+def test_github_client__get_fields(session, gh):
+    session.register(
+        "GET",
+        "/repos/a/b/issues/comments",
+        json=[
+            {"id": 1, "body": "foo", "user": {"login": "bar", "type": "User"}},
+            {"id": 3, "body": "baz", "user": None, "reactions": {"total_count": 0}},
+        ],
+    )
+
+    result = gh.repos("a/b").issues.comments.get(fields={"id", "user", "login"})
+
+    assert result == [
+        {"id": 1, "user": {"login": "bar"}},
+        {"id": 3, "user": None},
+    ]
+    assert result[0].user.login == "bar"
+
+
+def test_github_client__get_fields__error(session, gh):
+    session.register(
+        "GET",
+        "/repos",
+        json={"message": "Not Found", "status": "404"},
+        status_code=404,
+    )
+
+    with pytest.raises(github_client.NotFound) as exc_info:
+        gh.repos.get(fields={"id"})
+
+    assert str(exc_info.value) == "{'message': 'Not Found', 'status': '404'}"
+
+
 def test_json_object():
     obj = github_client.JsonObject({"a": 1})
 
     assert obj.a == 1
 
 
+def test_json_object__no_dict():
+    obj = github_client.JsonObject({"a": 1})
+
+    assert not hasattr(obj, "__dict__")
+
+
 def test_json_object__error():
     obj = github_client.JsonObject({"a": 1})
 
@@ -147,3 +215,112 @@ def test_github_client__get_error_non_json(session, gh):
         "Response is requested as JSON but doesn't have proper content type. "
         "Response: {foobar"
     )
+
+
+def test_github_client__graphql(session, gh):
+    session.register(
+        "POST",
+        "/graphql",
+        match_json={"query": "query { a }", "variables": {"b": 1}},
+        json={"data": {"a": "foo"}},
+    )
+
+    assert gh.graphql("query { a }", b=1) == {"a": "foo"}
+
+
+def test_github_client__graphql__error(session, gh):
+    session.register(
+        "POST",
+        "/graphql",
+        json={"data": None, "errors": [{"message": "nope", "path": ["a"]}]},
+    )
+
+    with pytest.raises(github_client.GraphQLError) as exc_info:
+        gh.graphql("query { a }")
+
+    assert exc_info.value.errors == [{"message": "nope", "path": ["a"]}]
+
+
+@pytest.mark.parametrize(
+    "api_url, expected",
+    [
+        ("https://api.github.com", "https://api.github.com/graphql"),
+        ("https://api.github.com/", "https://api.github.com/graphql"),
+        ("https://my-ghe.company.com/api/v3", "https://my-ghe.company.com/api/graphql"),
+        (
+            "https://my-ghe.company.com/api/v3/",
+            "https://my-ghe.company.com/api/graphql",
+        ),
+    ],
+)
+def test_get_graphql_url(api_url, expected):
+    assert github_client.get_graphql_url(api_url=api_url) == expected
+
+
+def test_caching_transport(httpx_mock):
+    url = "https://example.com/repos/a/b"
+    httpx_mock.add_response(url=url, headers={"ETag": '"abc"'}, json={"foo": "bar"})
+    httpx_mock.add_response(
+        url=url, match_headers={"If-None-Match": '"abc"'}, status_code=304
+    )
+
+    transport = github_client.CachingTransport(transport=httpx.HTTPTransport())
+    with httpx.Client(transport=transport) as client:
+        assert client.get(url).json() == {"foo": "bar"}
+        response = client.get(url)
+
+    assert response.status_code == 200
+    assert response.json() == {"foo": "bar"}
+
+
+def test_caching_transport__keyed_on_authorization(httpx_mock):
+    url = "https://example.com/repos/a/b"
+    httpx_mock.add_response(url=url, headers={"ETag": '"abc"'}, json={"foo": "bar"})
+    httpx_mock.add_response(url=url, headers={"ETag": '"def"'}, json={"foo": "baz"})
+
+    transport = github_client.CachingTransport(transport=httpx.HTTPTransport())
+    with httpx.Client(transport=transport) as client:
+        client.get(url, headers={"Authorization": "token a"})
+        response = client.get(url, headers={"Authorization": "token b"})
+
+    assert "If-None-Match" not in httpx_mock.get_requests()[1].headers
+    assert response.json() == {"foo": "baz"}
+
+
+@pytest.mark.parametrize(
+    "method, headers",
+    [
+        ("GET", {}),
+        ("POST", {"ETag": '"abc"'}),
+        ("GET", {"ETag": '"abc"', "Content-Length": "10000000"}),
+    ],
+)
+def test_caching_transport__not_cached(httpx_mock, method, headers):
+    url = "https://example.com/repos/a/b"
+    httpx_mock.add_response(url=url, headers=headers, content=b"foo")
+    httpx_mock.add_response(url=url, content=b"bar")
+
+    transport = github_client.CachingTransport(transport=httpx.HTTPTransport())
+    with httpx.Client(transport=transport) as client:
+        client.request(method, url)
+        response = client.request(method, url)
+
+    assert "If-None-Match" not in httpx_mock.get_requests()[1].headers
+    assert response.content == b"bar"
+    assert transport.cache == {}
+
+
+def test_caching_transport__max_entries(httpx_mock):
+    httpx_mock.add_response(headers={"ETag": '"abc"'}, content=b"foo", is_reusable=True)
+
+    transport = github_client.CachingTransport(
+        transport=httpx.HTTPTransport(), max_entries=2
+    )
+    with httpx.Client(transport=transport) as client:
+        for path in ["a", "b", "c"]:
+            client.get(f"https://example.com/{path}")
+
+    assert [key[0] for key in transport.cache] == [
+        "https://example.com/b",
+        "https://example.com/c",
+    ]
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import io
+
 import pytest
 
 from coverage_comment import json
@@ -27,3 +29,60 @@ def test_loads_dict():
 def test_loads_dict__error():
     with pytest.raises(json.UnexpectedType):
         json.loads_dict("[]")
+
+
+def test_load_streamed_dict(monkeypatch):
+    # Values are split across chunks
+    monkeypatch.setattr(json, "CHUNK_SIZE", 3)
+    files = []
+
+    result = json.load_streamed_dict(
+        stream=io.StringIO(
+            '{"meta": {"version": "7.0"}, "files": {"a.py": {"lines": [1, 12345]}, '
+            '"b.py": {}}, "empty": {}, "totals": 12345}'
+        ),
+        callbacks={
+            "files": lambda key, value: files.append((key, value)),
+            "empty": lambda key, value: files.append((key, value)),
+        },
+    )
+
+    assert result == {"meta": {"version": "7.0"}, "totals": 12345}
+    assert files == [("a.py", {"lines": [1, 12345]}), ("b.py", {})]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 4, 5])
+def test_load_streamed_dict__numbers(monkeypatch, chunk_size):
+    # Numbers cut after their "." or in their exponent
+    monkeypatch.setattr(json, "CHUNK_SIZE", chunk_size)
+    serialized = '{"meta": 12.5, "a": 1e+5, "b": -2.5E-3, "files": {}}'
+
+    result = json.load_streamed_dict(stream=io.StringIO(serialized), callbacks={})
+
+    assert result == {"meta": 12.5, "a": 1e5, "b": -2.5e-3, "files": {}}
+
+
+@pytest.mark.parametrize(
+    "serialized",
+    [
+        '{"a": 1,}',
+        '{"a" 1}',
+        '{"a": 1 "b": 2}',
+        '{"a": 1} 2',
+        '{"a": 1',
+        '{"a": tru}',
+        '{"a": 1.}',
+        '{"files": [1]}',
+    ],
+)
+def test_load_streamed_dict__error(serialized):
+    with pytest.raises(json.JSONDecodeError):
+        json.load_streamed_dict(
+            stream=io.StringIO(serialized), callbacks={"files": print}
+        )
+
+
+@pytest.mark.parametrize("serialized", ["[]", ""])
+def test_load_streamed_dict__not_a_dict(serialized):
+    with pytest.raises(json.UnexpectedType):
+        json.load_streamed_dict(stream=io.StringIO(serialized), callbacks={})
@@ -1,12 +1,15 @@
 from __future__ import annotations
 
 import os
+import pathlib
+import pstats
+import sys
 from typing import Any
 
 import httpx
 import pytest
 
-from coverage_comment import main, settings, subprocess
+from coverage_comment import json, main, settings, subprocess, tracing
 
 
 def test_main(get_logs):
@@ -47,6 +50,64 @@ def test_main(get_logs):
     assert get_logs("INFO", "Ending action")
 
 
+def test_main__serve(monkeypatch):
+    from coverage_comment import serve
+
+    received = {}
+    monkeypatch.setattr(serve, "main", lambda **kwargs: received.update(kwargs))
+
+    main.main(argv=["serve", "--port", "8080"])
+
+    assert received == {"action": main.action, "argv": ["--port", "8080"]}
+
+
+def test_main__profile(monkeypatch, in_tmp_path):
+    for key, value in {
+        "GITHUB_REPOSITORY": "foo/bar",
+        "GITHUB_PR_RUN_ID": "",
+        "GITHUB_REF": "ref",
+        "GITHUB_TOKEN": "token",
+        "GITHUB_BASE_REF": "",
+        "GITHUB_EVENT_NAME": "push",
+        "GITHUB_STEP_SUMMARY": "step_summary",
+        "GITHUB_OUTPUT": "output",
+        "PROFILE": "true",
+    }.items():
+        monkeypatch.setenv(key, value)
+
+    @tracing.span("some phase")
+    def action(**kwargs: Any):
+        return 0
+
+    with pytest.raises(SystemExit) as exc_data:
+        main.main(_action=action)
+
+    assert exc_data.value.code == 0
+    assert pstats.Stats("coverage-comment-profile.pstats").total_calls
+    trace = json.loads((in_tmp_path / "coverage-comment-trace.json").read_text())
+    assert [event["name"] for event in trace["traceEvents"]] == ["some phase"]
+    assert "| some phase | 1 |" in (in_tmp_path / "step_summary").read_text()
+    assert (in_tmp_path / "output").read_text() == (
+        'profile_file="coverage-comment-profile.pstats"\n'
+        'trace_file="coverage-comment-trace.json"\n'
+    )
+
+
+def test_main__lazy_imports():
+    # In a new interpreter, so that the modules imported by the other tests
+    # don't count
+    modules = subprocess.run(
+        sys.executable,
+        "-c",
+        "import sys, coverage_comment.main; print(*sys.modules)",
+        path=pathlib.Path("."),
+    ).split()
+
+    assert "jinja2" not in modules
+    assert "coverage" not in modules
+    assert "coverage_comment.template" not in modules
+
+
 def test_main__exception(get_logs):
     # This test simulates an exception in the main part of the action. This should be catched and logged.
 
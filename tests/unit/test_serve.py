@@ -0,0 +1,359 @@
+from __future__ import annotations
+
+import pathlib
+import threading
+import time
+
+import httpx
+import pytest
+
+from coverage_comment import activities, serve
+
+
+def test_get_job_environ():
+    environ = serve.get_job_environ(
+        workspace=pathlib.Path("jobs/1"),
+        environ={
+            "GITHUB_REPOSITORY": "foo/bar",
+            "COVERAGE_PATH": "src",
+            "GITHUB_EVENT_PATH": "",
+            "SUBPROJECTS": "api: api\nweb:",
+        },
+    )
+
+    assert environ == {
+        "GITHUB_REPOSITORY": "foo/bar",
+        "COVERAGE_PATH": "jobs/1/src",
+        "COMMENT_FILENAME": "jobs/1/python-coverage-comment-action.txt",
+        "GITHUB_EVENT_PATH": "",
+        "GITHUB_OUTPUT": "jobs/1/coverage-comment-output.txt",
+        "GITHUB_STEP_SUMMARY": "jobs/1/coverage-comment-summary.md",
+        "SUBPROJECTS": "api:jobs/1/api\nweb:jobs/1",
+        "WORKSPACE": "jobs/1",
+    }
+
+
+def test_get_job_environ__post_comment():
+    environ = serve.get_job_environ(
+        workspace=pathlib.Path("jobs/1"), environ={"ACTIVITY": "post_comment"}
+    )
+
+    assert environ["COMMENT_FILENAME"] == "python-coverage-comment-action.txt"
+    assert environ["GITHUB_OUTPUT"] == "jobs/1/coverage-comment-output.txt"
+
+
+def test_parse_job(in_tmp_path):
+    config = serve.parse_job(
+        {
+            "workspace": "jobs/1",
+            "env": {
+                "GITHUB_TOKEN": "foo",
+                "GITHUB_REPOSITORY": "foo/bar",
+                "GITHUB_REF": "refs/heads/main",
+                "GITHUB_EVENT_NAME": "workflow_run",
+                "GITHUB_PR_RUN_ID": "123",
+                "ACTIVITY": "process_pr",
+            },
+        }
+    )
+
+    assert config.GITHUB_REPOSITORY == "foo/bar"
+    assert config.GITHUB_PR_RUN_ID == 123
+    assert config.COMMENT_FILENAME == pathlib.Path(
+        "jobs/1/python-coverage-comment-action.txt"
+    )
+    assert config.WORKSPACE == pathlib.Path("jobs/1")
+    assert config.REPOSITORY_COVERAGE_PATH == pathlib.Path(".")
+
+
+@pytest.mark.parametrize(
+    "payload, error",
+    [
+        ([], "Expected a JSON object"),
+        ({}, "`env` should be an object of strings"),
+        ({"env": {"GITHUB_PR_RUN_ID": 123}}, "`env` should be an object of strings"),
+        ({"env": {}}, "`env.ACTIVITY` should be one of"),
+        ({"env": {"ACTIVITY": "save_coverage_data_files"}}, "`env.ACTIVITY`"),
+        (
+            {"workspace": 1, "env": {"ACTIVITY": "process_pr"}},
+            "`workspace` should be a string",
+        ),
+        (
+            {"workspace": "..", "env": {"ACTIVITY": "process_pr"}},
+            "Path needs to be relative and below the current directory",
+        ),
+        ({"env": {"ACTIVITY": "process_pr"}}, "missing environment variable"),
+    ],
+)
+def test_parse_job__invalid(in_tmp_path, payload, error):
+    with pytest.raises(serve.InvalidJob, match=error):
+        serve.parse_job(payload)
+
+
+@pytest.mark.parametrize(
+    "key, value",
+    [
+        ("GITHUB_OUTPUT", "/etc/passwd"),
+        ("GITHUB_OUTPUT", "../2/coverage-comment-output.txt"),
+        ("GITHUB_STEP_SUMMARY", "/tmp/summary.md"),
+        ("GITHUB_STEP_SUMMARY", "../../summary.md"),
+        ("GITHUB_EVENT_PATH", "/etc/passwd"),
+        ("GITHUB_EVENT_PATH", "foo/../../event.json"),
+        ("COVERAGE_PATH", ".."),
+        ("SUBPROJECTS", "api: ../api"),
+    ],
+)
+def test_parse_job__outside_workspace(in_tmp_path, key, value):
+    with pytest.raises(serve.InvalidJob, match=f"`env.{key}` needs to be relative"):
+        serve.parse_job(
+            {
+                "workspace": "jobs/1",
+                "env": {"ACTIVITY": "process_pr", key: value},
+            }
+        )
+
+
+@pytest.fixture
+def make_service():
+    services = []
+
+    def _(action, workers=1, queue_size=1):
+        service = serve.Service(
+            workers=workers,
+            queue_size=queue_size,
+            transport=httpx.MockTransport(lambda request: httpx.Response(200)),
+            action=action,
+        )
+        services.append(service)
+        return service
+
+    yield _
+    for service in services:
+        service.close()
+
+
+def wait_for_jobs(service):
+    for _ in range(500):
+        if all(
+            job.status not in {"queued", "running"} for job in service.jobs.values()
+        ):
+            return
+        time.sleep(0.01)
+    raise AssertionError("Jobs did not finish")
+
+
+def test_service(make_service, workflow_run_config):
+    received = {}
+
+    def action(config, github_session, http_session, git):
+        received.update(config=config, github_session=github_session)
+        return 0
+
+    service = make_service(action=action)
+    config = workflow_run_config()
+    job = service.submit(config)
+    wait_for_jobs(service)
+
+    assert service.get(job.id) is job
+    assert job.as_json() == {
+        "id": job.id,
+        "status": "done",
+        "exit_code": 0,
+        "duration": job.duration,
+        "superseded_by": None,
+    }
+    assert received["config"] is config
+    assert received["github_session"].headers["Authorization"] == "token foo"
+
+
+def test_service__failed(make_service, workflow_run_config, get_logs):
+    def action(**kwargs):
+        raise ValueError("boom")
+
+    service = make_service(action=action)
+    job = service.submit(workflow_run_config())
+    wait_for_jobs(service)
+
+    assert job.status == "failed"
+    assert job.exit_code == 1
+    assert get_logs("ERROR", f"Job {job.id} failed")
+
+
+def test_service__queue_full(make_service, workflow_run_config):
+    release = threading.Event()
+
+    def action(**kwargs):
+        release.wait()
+        return 0
+
+    service = make_service(action=action, workers=1, queue_size=1)
+    service.submit(workflow_run_config())
+    service.submit(workflow_run_config())
+    try:
+        with pytest.raises(serve.QueueFull):
+            service.submit(workflow_run_config())
+    finally:
+        release.set()
+
+    wait_for_jobs(service)
+    assert all(job.status == "done" for job in service.jobs.values())
+
+
+def test_service__max_finished_jobs(make_service, workflow_run_config, monkeypatch):
+    monkeypatch.setattr(serve, "MAX_FINISHED_JOBS", 1)
+    service = make_service(action=lambda **kwargs: 0, queue_size=3)
+
+    jobs = []
+    for _ in range(3):
+        jobs.append(service.submit(workflow_run_config()))
+        wait_for_jobs(service)
+
+    assert service.get(jobs[0].id) is None
+    assert list(service.jobs) == [jobs[1].id, jobs[2].id]
+
+
+def wait_for_running(action, count):
+    for _ in range(500):
+        if len(action.running) == count:
+            return
+        time.sleep(0.01)
+    raise AssertionError("Jobs did not start")
+
+
+@pytest.fixture
+def blocking_action():
+    running = []
+    release = threading.Event()
+
+    def action(config, **kwargs):
+        running.append(config.GITHUB_REPOSITORY)
+        release.wait()
+        return 0
+
+    action.running = running
+    action.release = release
+    yield action
+    release.set()
+
+
+def test_service__parallel(make_service, workflow_run_config, blocking_action):
+    service = make_service(action=blocking_action, workers=2, queue_size=1)
+
+    first = service.submit(workflow_run_config(GITHUB_REPOSITORY="a/a"))
+    second = service.submit(workflow_run_config(GITHUB_REPOSITORY="a/a"))
+    third = service.submit(workflow_run_config(GITHUB_REPOSITORY="b/b"))
+    wait_for_running(blocking_action, count=2)
+
+    # Jobs of the same repository run in parallel, the third one waits for a
+    # thread
+    assert blocking_action.running == ["a/a", "a/a"]
+    assert (first.status, second.status, third.status) == (
+        "running",
+        "running",
+        "queued",
+    )
+    assert list(service.queue) == [third]
+
+    blocking_action.release.set()
+    wait_for_jobs(service)
+    assert blocking_action.running == ["a/a", "a/a", "b/b"]
+    assert not service.queue
+
+
+def test_service__coalesced(make_service, pull_request_config, blocking_action):
+    service = make_service(action=blocking_action, workers=1, queue_size=2)
+
+    def config(ref):
+        return pull_request_config(
+            GITHUB_REF=ref, ACTIVITY=activities.Activity.PROCESS_PR
+        )
+
+    service.submit(config("refs/pull/2/merge"))
+    # Only the jobs still in the queue are superseded
+    wait_for_running(blocking_action, count=1)
+    superseded = service.submit(config("refs/pull/2/merge"))
+    other_pr = service.submit(config("refs/pull/3/merge"))
+    latest = service.submit(config("refs/pull/2/merge"))
+
+    assert superseded.as_json() | {"id": None} == {
+        "id": None,
+        "status": "superseded",
+        "exit_code": None,
+        "duration": None,
+        "superseded_by": latest.id,
+    }
+    # The latest job took the place of the superseded one, and its slot
+    assert list(service.queue) == [latest, other_pr]
+    with pytest.raises(serve.QueueFull):
+        service.submit(config("refs/pull/4/merge"))
+
+    blocking_action.release.set()
+    wait_for_jobs(service)
+    assert len(blocking_action.running) == 3
+
+
+def test_service__close(make_service, workflow_run_config, blocking_action):
+    service = make_service(action=blocking_action)
+    service.submit(workflow_run_config())
+    wait_for_running(blocking_action, count=1)
+    pending = service.submit(workflow_run_config())
+
+    closing = threading.Thread(target=service.close)
+    closing.start()
+    for _ in range(500):
+        if service.closing:
+            break
+        time.sleep(0.01)
+    blocking_action.release.set()
+    closing.join()
+
+    assert pending.status == "queued"
+    assert list(service.queue) == [pending]
+
+
+@pytest.mark.parametrize(
+    "kwargs, expected",
+    [
+        ({}, None),
+        (
+            {"ACTIVITY": activities.Activity.POST_COMMENT},
+            None,
+        ),
+        (
+            {"ACTIVITY": activities.Activity.PROCESS_PR},
+            ("py-cov-action/foobar", "python-coverage-comment-action-data", 2, None),
+        ),
+        (
+            {
+                "ACTIVITY": activities.Activity.PROCESS_PR,
+                "GITHUB_REF": "refs/heads/feature",
+                "SUBPROJECT_ID": "api",
+            },
+            (
+                "py-cov-action/foobar",
+                "python-coverage-comment-action-data-api",
+                None,
+                "feature",
+            ),
+        ),
+    ],
+)
+def test_get_coalescing_key(pull_request_config, kwargs, expected):
+    config = pull_request_config(**kwargs)
+
+    assert serve.get_coalescing_key(config) == expected
+
+
+def test_main(monkeypatch, get_logs):
+    received = {}
+
+    def serve_forever(self):
+        received.update(workers=self.service.executor._max_workers)
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(serve.JobServer, "serve_forever", serve_forever)
+
+    serve.main(action=lambda **kwargs: 0, argv=["--port", "0", "--workers", "2"])
+
+    assert received == {"workers": 2}
+    assert get_logs("INFO", "Serving on http://127.0.0.1:")
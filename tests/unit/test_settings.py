@@ -5,6 +5,7 @@ import json
 import pathlib
 from collections.abc import Callable
 
+import httpx
 import pytest
 
 from coverage_comment import activities, settings
@@ -47,6 +48,9 @@ def test_config__from_environ__ok():
             "MINIMUM_GREEN": "90",
             "MINIMUM_ORANGE": "50.8",
             "MERGE_COVERAGE_FILES": "true",
+            "MERGE_COVERAGE_CACHE": "true",
+            "INCREMENTAL_ANALYSIS": "true",
+            "DIFF_ONLY": "true",
             "ANNOTATE_MISSING_LINES": "false",
             "ANNOTATION_TYPE": "error",
             "VERBOSE": "false",
@@ -72,6 +76,9 @@ def test_config__from_environ__ok():
         MINIMUM_GREEN=decimal.Decimal("90"),
         MINIMUM_ORANGE=decimal.Decimal("50.8"),
         MERGE_COVERAGE_FILES=True,
+        MERGE_COVERAGE_CACHE=True,
+        INCREMENTAL_ANALYSIS=True,
+        DIFF_ONLY=True,
         ANNOTATE_MISSING_LINES=False,
         ANNOTATION_TYPE="error",
         VERBOSE=False,
@@ -158,6 +165,136 @@ def test_config__GITHUB_BRANCH_NAME(config, github_ref, github_branch_name):
     assert config(GITHUB_REF=github_ref).GITHUB_BRANCH_NAME == github_branch_name
 
 
+def test_config__from_environ__http_settings():
+    config_obj = settings.Config.from_environ(
+        {
+            "GITHUB_TOKEN": "foo",
+            "GITHUB_REPOSITORY": "owner/repo",
+            "GITHUB_REF": "master",
+            "GITHUB_EVENT_NAME": "pull",
+            "GITHUB_STEP_SUMMARY": "step_summary",
+            "HTTP2": "false",
+            "HTTP_MAX_CONNECTIONS": "4",
+            "HTTP_MAX_KEEPALIVE_CONNECTIONS": "2",
+            "HTTP_KEEPALIVE_EXPIRY": "12.5",
+        }
+    )
+
+    assert config_obj.HTTP2 is False
+    assert config_obj.HTTP_LIMITS == httpx.Limits(
+        max_connections=4, max_keepalive_connections=2, keepalive_expiry=12.5
+    )
+
+
+def test_config__http_limits__default(config):
+    assert config().HTTP_LIMITS == httpx.Limits(
+        max_connections=10, max_keepalive_connections=10, keepalive_expiry=60.0
+    )
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("", None),
+        ("trace.json", pathlib.Path("trace.json")),
+    ],
+)
+def test_config__from_environ__trace_file(value, expected):
+    config_obj = settings.Config.from_environ(
+        {
+            "GITHUB_TOKEN": "foo",
+            "GITHUB_REPOSITORY": "owner/repo",
+            "GITHUB_REF": "master",
+            "GITHUB_EVENT_NAME": "pull",
+            "GITHUB_STEP_SUMMARY": "step_summary",
+            "TRACE_FILE": value,
+        }
+    )
+
+    assert config_obj.TRACE_FILE == expected
+
+
+def test_config__from_environ__trace_file__outside():
+    with pytest.raises(ValueError, match="TRACE_FILE"):
+        settings.Config.from_environ(
+            {
+                "GITHUB_TOKEN": "foo",
+                "GITHUB_REPOSITORY": "owner/repo",
+                "GITHUB_REF": "master",
+                "GITHUB_EVENT_NAME": "pull",
+                "GITHUB_STEP_SUMMARY": "step_summary",
+                "TRACE_FILE": "/tmp/trace.json",
+            }
+        )
+
+
+@pytest.mark.parametrize("value, expected", [("", None), ("4", 4)])
+def test_config__from_environ__merge_coverage_workers(value, expected):
+    config_obj = settings.Config.from_environ(
+        {
+            "GITHUB_TOKEN": "foo",
+            "GITHUB_REPOSITORY": "owner/repo",
+            "GITHUB_REF": "master",
+            "GITHUB_EVENT_NAME": "pull",
+            "GITHUB_STEP_SUMMARY": "step_summary",
+            "MERGE_COVERAGE_WORKERS": value,
+        }
+    )
+
+    assert config_obj.MERGE_COVERAGE_WORKERS == expected
+
+
+@pytest.mark.parametrize("value, expected", [("", None), ("4", 4)])
+def test_config__from_environ__analysis_workers(value, expected):
+    config_obj = settings.Config.from_environ(
+        {
+            "GITHUB_TOKEN": "foo",
+            "GITHUB_REPOSITORY": "owner/repo",
+            "GITHUB_REF": "master",
+            "GITHUB_EVENT_NAME": "pull",
+            "GITHUB_STEP_SUMMARY": "step_summary",
+            "ANALYSIS_WORKERS": value,
+        }
+    )
+
+    assert config_obj.ANALYSIS_WORKERS == expected
+
+
+def test_config__from_environ__subprojects():
+    config_obj = settings.Config.from_environ(
+        {
+            "GITHUB_TOKEN": "foo",
+            "GITHUB_REPOSITORY": "owner/repo",
+            "GITHUB_REF": "master",
+            "GITHUB_EVENT_NAME": "pull",
+            "GITHUB_STEP_SUMMARY": "step_summary",
+            "SUBPROJECTS": "api: services/api\n\nroot:\n",
+            "COMBINED_COMMENT": "true",
+        }
+    )
+
+    assert config_obj.COMBINED_COMMENT is True
+
+    assert config_obj.SUBPROJECTS == [
+        settings.Subproject(id="api", coverage_path=pathlib.Path("services/api")),
+        settings.Subproject(id="root", coverage_path=pathlib.Path(".")),
+    ]
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "api",
+        ":services/api",
+        "api:/services/api",
+        "api:services/api\napi:services/other",
+    ],
+)
+def test_config__from_environ__subprojects__error(value):
+    with pytest.raises(ValueError):
+        settings.Config.from_environ({"SUBPROJECTS": value})
+
+
 def test_config__from_environ__error():
     with pytest.raises(ValueError):
         settings.Config.from_environ({"COMMENT_FILENAME": "/a"})
@@ -194,6 +331,41 @@ def test_final_comment_filename(config):
     assert config_obj.FINAL_COMMENT_FILENAME == pathlib.Path("foo-bar.txt")
 
 
+@pytest.mark.parametrize(
+    "kwargs, expected",
+    [
+        ({}, None),
+        ({"PROFILE": True}, pathlib.Path("coverage-comment-profile.pstats")),
+        (
+            {"PROFILE": True, "SUBPROJECT_ID": "bar"},
+            pathlib.Path("coverage-comment-profile-bar.pstats"),
+        ),
+    ],
+)
+def test_profile_file(config, kwargs, expected):
+    assert config(**kwargs).PROFILE_FILE == expected
+
+
+@pytest.mark.parametrize(
+    "kwargs, expected",
+    [
+        ({}, None),
+        ({"TRACE_FILE": pathlib.Path("foo.json")}, pathlib.Path("foo.json")),
+        (
+            {"TRACE_FILE": pathlib.Path("foo.json"), "PROFILE": True},
+            pathlib.Path("foo.json"),
+        ),
+        ({"PROFILE": True}, pathlib.Path("coverage-comment-trace.json")),
+        (
+            {"PROFILE": True, "SUBPROJECT_ID": "bar"},
+            pathlib.Path("coverage-comment-trace-bar.json"),
+        ),
+    ],
+)
+def test_final_trace_file(config, kwargs, expected):
+    assert config(**kwargs).FINAL_TRACE_FILE == expected
+
+
 def test_final_coverage_data_branch(config):
     config_obj = config(
         COVERAGE_DATA_BRANCH="foo",
@@ -202,6 +374,54 @@ def test_final_coverage_data_branch(config):
     assert config_obj.FINAL_COVERAGE_DATA_BRANCH == "foo-bar"
 
 
+@pytest.mark.parametrize(
+    "kwargs, expected",
+    [
+        ({}, pathlib.Path(".")),
+        ({"COVERAGE_PATH": pathlib.Path("src")}, pathlib.Path("src")),
+        (
+            {
+                "COVERAGE_PATH": pathlib.Path("jobs/1/src"),
+                "WORKSPACE": pathlib.Path("jobs/1"),
+            },
+            pathlib.Path("src"),
+        ),
+        (
+            {
+                "COVERAGE_PATH": pathlib.Path("jobs/1"),
+                "WORKSPACE": pathlib.Path("jobs/1"),
+            },
+            pathlib.Path("."),
+        ),
+    ],
+)
+def test_repository_coverage_path(config, kwargs, expected):
+    assert config(**kwargs).REPOSITORY_COVERAGE_PATH == expected
+
+
+def test_subproject_configs(config):
+    config_obj = config(
+        COVERAGE_DATA_BRANCH="foo",
+        SUBPROJECTS=[
+            settings.Subproject(id="api", coverage_path=pathlib.Path("api")),
+            settings.Subproject(id="web", coverage_path=pathlib.Path("web")),
+        ],
+    )
+
+    api, web = config_obj.SUBPROJECT_CONFIGS
+
+    assert api.SUBPROJECT_ID == "api"
+    assert api.COVERAGE_PATH == pathlib.Path("api")
+    assert api.FINAL_COVERAGE_DATA_BRANCH == "foo-api"
+    assert api.OUTPUT_PREFIX == "api_"
+    assert api.SUBPROJECTS == []
+    assert web.FINAL_COVERAGE_DATA_BRANCH == "foo-web"
+
+
+def test_subproject_configs__no_subprojects(config):
+    assert config().SUBPROJECT_CONFIGS == []
+
+
 @pytest.mark.parametrize("merged", [True, False])
 def test_is_pr_merged(tmp_path, config, merged):
     path = tmp_path / "event.json"
@@ -219,3 +439,18 @@ def test_is_pr_merged__other_payload(tmp_path, config):
     config_obj = config(GITHUB_EVENT_PATH=path)
 
     assert config_obj.IS_PR_MERGED is False
+
+
+@pytest.mark.parametrize(
+    "payload, expected",
+    [
+        ({"pull_request": {"base": {"sha": "abc"}}}, "abc"),
+        ({"action": "other"}, None),
+    ],
+)
+def test_github_base_sha(tmp_path, config, payload, expected):
+    path = tmp_path / "event.json"
+    path.write_text(json.dumps(payload))
+    config_obj = config(GITHUB_EVENT_PATH=path)
+
+    assert config_obj.GITHUB_BASE_SHA == expected
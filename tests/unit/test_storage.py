@@ -137,6 +137,70 @@ def test_commit_operations(git, in_tmp_path):
     )
 
 
+def test_checked_out_branches(git):
+    git.register("branch --show-current", stdout="bar")
+    git.register("reset --hard")
+    git.register(
+        "--config-env=http.extraheader=GIT_EXTRA_HEADER fetch origin foo baz",
+        returncode=1,
+    )
+    git.register("--config-env=http.extraheader=GIT_EXTRA_HEADER fetch origin")
+    git.register("rev-parse --verify origin/foo")
+    git.register("rev-parse --verify origin/baz", returncode=1)
+
+    with storage.checked_out_branches(
+        git=git, branches=["foo", "baz"], token="secret"
+    ) as switch:
+        git.register("switch foo")
+        switch("foo")
+        git.register("switch --orphan baz")
+        switch("baz")
+        git.register("switch bar")
+
+
+def test_commit_operations_on_branches(git, in_tmp_path):
+    foo_operations = [files.WriteFile(path=pathlib.Path("a.txt"), contents="a")]
+    baz_operations = [files.WriteFile(path=pathlib.Path("b.txt"), contents="b")]
+    qux_operations = [files.WriteFile(path=pathlib.Path("c.txt"), contents="c")]
+
+    # checked_out_branches
+    git.register("branch --show-current", stdout="bar")
+    git.register("reset --hard")
+    git.register(
+        "--config-env=http.extraheader=GIT_EXTRA_HEADER fetch origin foo baz qux"
+    )
+
+    git.register("switch foo")
+    git.register("add a.txt")
+    git.register("diff --staged --exit-code", returncode=1)  # diff!
+    git.register("commit --message 'ci: Update coverage data'")
+
+    git.register("switch baz")
+    git.register("add b.txt")
+    git.register("diff --staged --exit-code")  # no diff
+
+    git.register("switch qux")
+    git.register("add c.txt")
+    git.register("diff --staged --exit-code", returncode=1)  # diff!
+    git.register("commit --message 'ci: Update coverage data'")
+
+    # A single push, of the branches that changed
+    git.register("--config-env=http.extraheader=GIT_EXTRA_HEADER push origin foo qux")
+
+    # __exit__ of checked_out_branches
+    git.register("switch bar")
+
+    storage.commit_operations_on_branches(
+        operations_by_branch={
+            "foo": foo_operations,
+            "baz": baz_operations,
+            "qux": qux_operations,
+        },
+        git=git,
+        token="secret",
+    )
+
+
 def test_get_datafile_contents__not_found(gh, session):
     session.register(
         "GET",
@@ -170,6 +234,65 @@ def test_get_datafile_contents(gh, session):
     assert result == "yay"
 
 
+def test_get_snapshot_contents(gh, session):
+    session.register(
+        "GET",
+        "/repos/foo/bar/contents/snapshots/ab/abc123.json",
+        match_params={"ref": "baz"},
+        text="yay",
+        headers={"content-type": "application/vnd.github.raw+json"},
+    )
+
+    result = storage.get_snapshot_contents(
+        github=gh,
+        repository="foo/bar",
+        branch="baz",
+        sha="abc123",
+    )
+    assert result == "yay"
+
+
+def test_get_summary_index_contents(gh, session):
+    session.register(
+        "GET",
+        "/repos/foo/bar/contents/summary-index.json",
+        match_params={"ref": "baz"},
+        text="yay",
+        headers={"content-type": "application/vnd.github.raw+json"},
+    )
+
+    result = storage.get_summary_index_contents(
+        github=gh,
+        repository="foo/bar",
+        branch="baz",
+    )
+    assert result == "yay"
+
+
+@pytest.mark.parametrize(
+    "response, expected",
+    [
+        ({"text": "abc\n"}, "abc"),
+        ({"status_code": 404}, None),
+    ],
+)
+def test_get_content_hash(gh, session, response, expected):
+    session.register(
+        "GET",
+        "/repos/foo/bar/contents/content-hash.txt",
+        match_params={"ref": "baz"},
+        headers={"content-type": "application/vnd.github.raw+json"},
+        **response,
+    )
+
+    result = storage.get_content_hash(
+        github=gh,
+        repository="foo/bar",
+        branch="baz",
+    )
+    assert result == expected
+
+
 @pytest.mark.parametrize(
     "github_host, is_public, expected",
     [
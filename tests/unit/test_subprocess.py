@@ -25,6 +25,38 @@ def test_run__error():
         subprocess.run("false", path=pathlib.Path("."))
 
 
+def test_stream__ok():
+    with subprocess.stream("echo", "yay", path=pathlib.Path(".")) as stdout:
+        assert stdout.read().strip() == "yay"
+
+
+def test_stream__error():
+    with pytest.raises(subprocess.SubProcessError) as exc_info:
+        with subprocess.stream(
+            "sh", "-c", "echo foo; echo bar >&2; exit 1", path=pathlib.Path(".")
+        ) as stdout:
+            stdout.readline()
+
+    assert exc_info.value.returncode == 1
+    assert exc_info.value.stderr == "bar\n"
+
+
+def test_stream__error_while_reading():
+    # The process error explains the reading error
+    with pytest.raises(subprocess.SubProcessError) as exc_info:
+        with subprocess.stream("sh", "-c", "exit 1", path=pathlib.Path(".")) as stdout:
+            if not stdout.read():
+                raise ValueError
+
+    assert isinstance(exc_info.value.__cause__, ValueError)
+
+
+def test_stream__reading_error():
+    with pytest.raises(ValueError):
+        with subprocess.stream("echo", "yay", path=pathlib.Path(".")):
+            raise ValueError
+
+
 def test_git(fake_process, monkeypatch):
     git = subprocess.Git()
     git.cwd = pathlib.Path("/tmp")
@@ -1,8 +1,10 @@
 from __future__ import annotations
 
+import dataclasses
 import decimal
 import pathlib
 
+import jinja2
 import pytest
 
 from coverage_comment import coverage, template
@@ -245,6 +247,32 @@ This report was generated by [python-coverage-comment-action](https://github.com
     assert result == expected
 
 
+def test_template__coverage_history(coverage_obj_no_branch, diff_coverage_obj):
+    result = template.get_comment_markdown(
+        coverage=coverage_obj_no_branch,
+        diff_coverage=diff_coverage_obj,
+        previous_coverage_rate=decimal.Decimal("0.6"),
+        previous_coverage=None,
+        files=[],
+        count_files=0,
+        max_files=25,
+        minimum_green=decimal.Decimal("100"),
+        minimum_orange=decimal.Decimal("70"),
+        marker="<!-- foo -->",
+        github_host="https://github.com",
+        repo_name="org/repo",
+        pr_number=3,
+        branch_name=None,
+        base_template=template.read_template_file("comment.md.j2"),
+        coverage_history=[decimal.Decimal("0.4"), decimal.Decimal("0.6")],
+    )
+
+    assert (
+        "Coverage trend over the last 2 runs on the default branch, then this PR: ▁█▅\n"
+        in result
+    )
+
+
 def test_template__no_previous(coverage_obj_no_branch, diff_coverage_obj):
     files, total = template.select_files(
         coverage=coverage_obj_no_branch,
@@ -436,6 +464,17 @@ def test_template__no_marker(coverage_obj, diff_coverage_obj):
         )
 
 
+def test_get_combined_comment_markdown():
+    result = template.get_combined_comment_markdown(
+        sections=["## Coverage report (api)\n\nfoo\n", "## Coverage report (web)\n"],
+        marker="<!-- foo -->",
+    )
+
+    assert result == (
+        "## Coverage report (api)\n\nfoo\n\n## Coverage report (web)\n\n<!-- foo -->"
+    )
+
+
 def test_template__broken_template(coverage_obj, diff_coverage_obj):
     with pytest.raises(template.TemplateError):
         template.get_comment_markdown(
@@ -558,20 +597,6 @@ def test_uptodate():
     assert template.uptodate() is True
 
 
-@pytest.mark.parametrize(
-    "marker_id, result",
-    [
-        (None, "<!-- This comment was produced by python-coverage-comment-action -->"),
-        (
-            "foo",
-            "<!-- This comment was produced by python-coverage-comment-action (id: foo) -->",
-        ),
-    ],
-)
-def test_get_marker(marker_id, result):
-    assert template.get_marker(marker_id=marker_id) == result
-
-
 @pytest.mark.parametrize(
     "previous_code, current_code_and_diff, max_files, expected_files, expected_total",
     [
@@ -779,6 +804,43 @@ def test_select_files__no_previous(
     assert total == 1
 
 
+def test_select_files__previous_summaries_only(make_coverage, make_coverage_and_diff):
+    previous_cov = make_coverage(
+        """
+        # file: a.py
+        1 covered
+        2 covered
+        # file: b.py
+        1 covered
+        """
+    )
+    previous_cov = dataclasses.replace(
+        previous_cov,
+        files={},
+        file_summaries={path: file.info for path, file in previous_cov.files.items()},
+    )
+    cov, diff_cov = make_coverage_and_diff(
+        """
+        # file: a.py
+        1 covered
+        2 missing
+        # file: b.py
+        1 covered
+        """
+    )
+
+    files, total = template.select_files(
+        coverage=cov,
+        diff_coverage=diff_cov,
+        previous_coverage=previous_cov,
+        max_files=None,
+    )
+    assert [str(e.path) for e in files] == ["a.py"]
+    assert total == 1
+    assert files[0].previous is None
+    assert files[0].previous_info == previous_cov.file_summaries[pathlib.Path("a.py")]
+
+
 @pytest.mark.parametrize(
     "previous_code, current_code_and_diff, expected_new_missing, expected_added, expected_new_covered",
     [
@@ -890,6 +952,20 @@ def test_get_log_message():
     assert result.startswith("Coverage info for foo:")
 
 
+@pytest.mark.parametrize(
+    "values, expected",
+    [
+        ([], ""),
+        ([decimal.Decimal("0.5")], "▅"),
+        ([decimal.Decimal("0.5"), decimal.Decimal("0.5")], "▅▅"),
+        ([decimal.Decimal("0"), decimal.Decimal("0.5"), decimal.Decimal("1")], "▁▅█"),
+        ([decimal.Decimal("0.8"), decimal.Decimal("0.7")], "█▁"),
+    ],
+)
+def test_sparkline(values, expected):
+    assert template.sparkline(values) == expected
+
+
 @pytest.mark.parametrize(
     "value, expected",
     [
@@ -905,3 +981,132 @@ def test_get_log_message():
 )
 def test_compact(value, expected):
     assert template.compact(value) == expected
+
+
+@pytest.fixture
+def compiled_templates(tmp_path, monkeypatch):
+    monkeypatch.setattr(template, "COMPILED_TEMPLATES_PATH", tmp_path / "compiled")
+    return tmp_path / "compiled"
+
+
+def render_full_comment(coverage_obj, diff_coverage_obj, custom_template=None):
+    files, total = template.select_files(
+        coverage=coverage_obj,
+        diff_coverage=diff_coverage_obj,
+        previous_coverage=coverage_obj,
+        max_files=25,
+    )
+    return template.get_comment_markdown(
+        coverage=coverage_obj,
+        previous_coverage=coverage_obj,
+        diff_coverage=diff_coverage_obj,
+        files=files,
+        count_files=total,
+        max_files=25,
+        previous_coverage_rate=decimal.Decimal("0.92"),
+        minimum_green=decimal.Decimal("100"),
+        minimum_orange=decimal.Decimal("70"),
+        marker="<!-- foo -->",
+        github_host="https://github.com",
+        repo_name="org/repo",
+        pr_number=1,
+        branch_name=None,
+        base_template=template.read_template_file("comment.md.j2"),
+        custom_template=custom_template,
+    )
+
+
+def render_readme():
+    return template.get_readme_markdown(
+        is_public=True,
+        readme_url="https://example.com/readme",
+        markdown_report="| report |",
+        direct_image_url="https://example.com/badge.svg",
+        html_report_url="https://example.com/htmlcov",
+        dynamic_image_url="https://example.com/dynamic",
+        endpoint_image_url="https://example.com/endpoint",
+    )
+
+
+def test_compile_templates(compiled_templates, coverage_obj, diff_coverage_obj):
+    custom_template = (
+        """{% extends "base" %}{% block coverage_badges %}Foo{% endblock %}"""
+    )
+    expected = [
+        render_full_comment(coverage_obj, diff_coverage_obj),
+        render_full_comment(coverage_obj, diff_coverage_obj, custom_template),
+        render_readme(),
+    ]
+    assert "Foo" in expected[1]
+
+    template.compile_templates()
+
+    assert len(list(compiled_templates.iterdir())) == len(template.TEMPLATE_NAMES)
+    loader = template.get_packaged_template_loader("comment.md.j2")
+    assert isinstance(loader, jinja2.ChoiceLoader)
+    assert [
+        render_full_comment(coverage_obj, diff_coverage_obj),
+        render_full_comment(coverage_obj, diff_coverage_obj, custom_template),
+        render_readme(),
+    ] == expected
+
+
+def test_with_compiled_template__not_compiled(compiled_templates):
+    loader = jinja2.DictLoader({"base": "foo"})
+
+    assert template.with_compiled_template(loader, name="base", source="foo") is loader
+
+
+def test_with_compiled_template__outdated(compiled_templates):
+    template.compile_templates()
+    loader = jinja2.DictLoader({"base": "foo"})
+
+    # Compiled from another source
+    assert template.with_compiled_template(loader, name="base", source="foo") is loader
+
+
+def test_bytecode_cache(compiled_templates, monkeypatch):
+    monkeypatch.setattr(template, "BYTECODE_CACHE", template.MemoryBytecodeCache())
+    compile = jinja2.sandbox.SandboxedEnvironment.compile
+    calls = []
+
+    def compile_spy(self, *args, **kwargs):
+        calls.append(args)
+        return compile(self, *args, **kwargs)
+
+    monkeypatch.setattr(jinja2.sandbox.SandboxedEnvironment, "compile", compile_spy)
+
+    for _ in range(2):
+        template.get_log_message(
+            is_public=True,
+            readme_url="https://example.com",
+            direct_image_url="https://example.com/direct.png",
+            html_report_url="https://example.com/report.html",
+            dynamic_image_url="https://example.com/dynamic.png",
+            endpoint_image_url="https://example.com/endpoint.png",
+            subproject_id="foo",
+        )
+
+    assert len(calls) == 1
+    assert len(template.BYTECODE_CACHE.cache) == 1
+
+
+def test_bytecode_cache__max_entries():
+    cache = template.MemoryBytecodeCache(max_entries=2)
+    env = jinja2.Environment(
+        loader=jinja2.DictLoader({"a": "a", "b": "b", "c": "c"}),
+        bytecode_cache=cache,
+    )
+
+    env.get_template("a")
+    env.get_template("b")
+    # Loaded from the cache: "a" is now the most recently used
+    env.cache.clear()
+    env.get_template("a")
+    env.get_template("c")
+
+    assert len(cache.cache) == 2
+    assert [key for key in cache.cache] == [
+        cache.get_cache_key("a"),
+        cache.get_cache_key("c"),
+    ]
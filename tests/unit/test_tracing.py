@@ -0,0 +1,309 @@
+from __future__ import annotations
+
+import concurrent.futures
+import json
+
+import httpx
+import pytest
+
+from coverage_comment import tracing
+
+
+@pytest.mark.parametrize(
+    "path, expected",
+    [
+        ("/user", "/user"),
+        ("/repos/foo/bar", "/repos/{owner}/{repo}"),
+        ("/api/v3/repos/foo/bar", "/repos/{owner}/{repo}"),
+        ("/repos/foo/bar/pulls/12", "/repos/{owner}/{repo}/pulls/{id}"),
+        (
+            "/repos/foo/bar/issues/12/comments",
+            "/repos/{owner}/{repo}/issues/{id}/comments",
+        ),
+        (
+            "/repos/foo/bar/actions/runs/123/artifacts",
+            "/repos/{owner}/{repo}/actions/runs/{id}/artifacts",
+        ),
+        (
+            "/repos/foo/bar/contents/a/data.json",
+            "/repos/{owner}/{repo}/contents/{path}",
+        ),
+        (
+            "/repos/foo/bar/compare/main...feature",
+            "/repos/{owner}/{repo}/compare/{basehead}",
+        ),
+        ("/static/v1", "/static/v1"),
+    ],
+)
+def test_template_path(path, expected):
+    assert tracing.template_path(path) == expected
+
+
+@pytest.fixture
+def recorder():
+    return tracing.RequestRecorder()
+
+
+@pytest.fixture
+def client(recorder):
+    # Responses are built from a stream, like the ones coming from the network
+    # (responses built from `content` are never closed by the client)
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/repos/foo/bar/pulls/404":
+            return httpx.Response(404, stream=httpx.ByteStream(b"{}"))
+        return httpx.Response(
+            200,
+            stream=httpx.ByteStream(b"x" * 2048),
+            headers={"x-ratelimit-remaining": "4990", "x-ratelimit-limit": "5000"},
+        )
+
+    transport = tracing.RecordingTransport(
+        transport=httpx.MockTransport(handler), recorder=recorder
+    )
+    with httpx.Client(base_url="https://api.github.com", transport=transport) as client:
+        yield client
+
+
+def test_recording_transport(client, recorder):
+    client.get("/repos/foo/bar/pulls/1")
+    client.get("/repos/foo/bar/pulls/404")
+
+    first, second = recorder.records
+    assert first.method == "GET"
+    assert first.host == "api.github.com"
+    assert first.path == "/repos/{owner}/{repo}/pulls/{id}"
+    assert first.status == 200
+    assert first.size == 2048
+    assert first.rate_limit_remaining == 4990
+    assert first.rate_limit_limit == 5000
+    assert first.start >= 0
+    assert first.duration >= 0
+
+    assert second.status == 404
+    assert second.rate_limit_remaining is None
+    assert second.start >= first.start
+
+
+def test_recording_transport__stream(client, recorder):
+    with client.stream("GET", "/repos/foo/bar/pulls/1") as response:
+        # Not recorded until the body has been read and the response closed
+        assert recorder.records == []
+        assert b"".join(response.iter_bytes()) == b"x" * 2048
+
+    (record,) = recorder.records
+    assert record.size == 2048
+
+
+def test_recording_transport__closed_twice(recorder):
+    transport = tracing.RecordingTransport(
+        transport=httpx.MockTransport(
+            lambda request: httpx.Response(200, stream=httpx.ByteStream(b""))
+        ),
+        recorder=recorder,
+    )
+    response = transport.handle_request(httpx.Request("GET", "https://example.com"))
+    assert isinstance(response.stream, httpx.SyncByteStream)
+
+    response.stream.close()
+    response.stream.close()
+
+    assert len(recorder.records) == 1
+
+
+def test_recording_transport__close(recorder):
+    closed = []
+
+    class Transport(httpx.BaseTransport):
+        def close(self):
+            closed.append(True)
+
+    tracing.RecordingTransport(transport=Transport(), recorder=recorder).close()
+
+    assert closed == [True]
+
+
+def test_get_summary_markdown(client, recorder):
+    client.get("/repos/foo/bar/pulls/1")
+    client.get("/repos/foo/bar/pulls/2")
+    client.get("/repos/foo/bar/pulls/404")
+    client.patch("/repos/foo/bar/issues/comments/3")
+
+    summary = recorder.get_summary_markdown()
+
+    assert summary.startswith("<details><summary>4 HTTP calls, ")
+    assert (
+        "| GET | api.github.com | `/repos/{owner}/{repo}/pulls/{id}` | 3 | 200, 404 |"
+        in summary
+    )
+    assert "| 4.0 KiB |" in summary
+    assert (
+        "| PATCH | api.github.com | `/repos/{owner}/{repo}/issues/comments/{id}` | 1 | 200 |"
+        in summary
+    )
+    assert "GitHub API rate limit remaining: 4990/5000" in summary
+    assert summary.endswith("</details>\n")
+
+
+def test_get_summary_markdown__no_rate_limit(client, recorder):
+    client.get("/repos/foo/bar/pulls/404")
+
+    assert "rate limit" not in recorder.get_summary_markdown()
+
+
+def test_get_chrome_trace(client, recorder):
+    client.get("/repos/foo/bar/pulls/1")
+
+    trace = recorder.get_chrome_trace()
+
+    (event,) = trace["traceEvents"]
+    assert event["name"] == "GET /repos/{owner}/{repo}/pulls/{id}"
+    assert event["ph"] == "X"
+    assert isinstance(event["ts"], int)
+    assert isinstance(event["dur"], int)
+    assert event["args"] == {
+        "host": "api.github.com",
+        "status": 200,
+        "size": 2048,
+        "rate_limit_remaining": 4990,
+    }
+
+
+def test_report(client, recorder, tmp_path):
+    client.get("/repos/foo/bar/pulls/1")
+    summary_file = tmp_path / "step_summary"
+    trace_file = tmp_path / "trace.json"
+
+    tracing.report(
+        recorder=recorder, github_step_summary=summary_file, trace_file=trace_file
+    )
+
+    assert "1 HTTP calls" in summary_file.read_text()
+    assert len(json.loads(trace_file.read_text())["traceEvents"]) == 1
+
+
+def test_report__nothing_recorded(recorder, tmp_path):
+    summary_file = tmp_path / "step_summary"
+
+    tracing.report(recorder=recorder, github_step_summary=summary_file, trace_file=None)
+
+    assert not summary_file.exists()
+
+
+@pytest.fixture
+def span_recorder():
+    recorder = tracing.SpanRecorder()
+    with tracing.recording_spans(recorder):
+        yield recorder
+
+
+def test_span__not_recording():
+    with tracing.span("foo"):
+        pass
+
+
+def test_span(span_recorder):
+    @tracing.span("inner")
+    def inner():
+        pass
+
+    with tracing.span("outer"):
+        inner()
+        inner()
+
+    assert [record.path for record in span_recorder.records] == [
+        ("outer", "inner"),
+        ("outer", "inner"),
+        ("outer",),
+    ]
+    outer = span_recorder.records[-1]
+    assert all(record.start >= outer.start for record in span_recorder.records)
+    assert all(record.duration <= outer.duration for record in span_recorder.records)
+
+
+def test_span__exception(span_recorder):
+    with pytest.raises(ZeroDivisionError), tracing.span("foo"):
+        1 / 0
+    with tracing.span("bar"):
+        pass
+
+    assert [record.path for record in span_recorder.records] == [("foo",), ("bar",)]
+
+
+def test_in_current_context(span_recorder):
+    @tracing.span("inner")
+    def inner(value):
+        return value * 2
+
+    with tracing.span("outer"):
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+            results = list(executor.map(tracing.in_current_context(inner), [1, 2]))
+        # Without the context, the spans of the workers are not recorded
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+            list(executor.map(inner, [1, 2]))
+
+    assert results == [2, 4]
+    assert [record.path for record in span_recorder.records] == [
+        ("outer", "inner"),
+        ("outer", "inner"),
+        ("outer",),
+    ]
+
+
+def test_span_recorder__get_summary_markdown():
+    recorder = tracing.SpanRecorder()
+    recorder.records = [
+        tracing.SpanRecord(path=("a", "b"), start=0.1, duration=0.1),
+        tracing.SpanRecord(path=("a", "b"), start=0.3, duration=0.2),
+        tracing.SpanRecord(path=("a",), start=0.0, duration=0.5),
+        tracing.SpanRecord(path=("c",), start=0.5, duration=0.5),
+    ]
+
+    assert recorder.get_summary_markdown() == (
+        "<details><summary>Timings, 1000ms</summary>\n"
+        "\n"
+        "| Phase | Calls | Total time | Share |\n"
+        "|---|--:|--:|--:|\n"
+        "| a | 1 | 500ms | 50% |\n"
+        "| a / b | 2 | 300ms | 30% |\n"
+        "| c | 1 | 500ms | 50% |\n"
+        "\n"
+        "</details>\n"
+    )
+
+
+def test_span_recorder__get_trace_events():
+    recorder = tracing.SpanRecorder()
+    recorder.records = [
+        tracing.SpanRecord(path=("a", "b"), start=0.1, duration=0.25),
+    ]
+
+    assert recorder.get_trace_events() == [
+        {
+            "name": "b",
+            "cat": "span",
+            "ph": "X",
+            "pid": 1,
+            "tid": 0,
+            "ts": 100_000,
+            "dur": 250_000,
+        }
+    ]
+
+
+def test_report__spans(client, recorder, span_recorder, tmp_path):
+    with tracing.span("foo"):
+        client.get("/repos/foo/bar/pulls/1")
+    summary_file = tmp_path / "step_summary"
+    trace_file = tmp_path / "trace.json"
+
+    tracing.report(
+        recorder=recorder,
+        span_recorder=span_recorder,
+        github_step_summary=summary_file,
+        trace_file=trace_file,
+    )
+
+    summary = summary_file.read_text()
+    assert summary.index("| foo | 1 |") < summary.index("1 HTTP calls")
+    events = json.loads(trace_file.read_text())["traceEvents"]
+    assert [event["cat"] for event in events] == ["span", "http"]